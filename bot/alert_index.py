@@ -0,0 +1,100 @@
+from bisect import bisect_left, insort
+
+ABOVE = "above"   # fires when price >= target
+BELOW = "below"   # fires when price <= target
+
+
+class ThresholdIndex:
+    """
+    One pair's alert targets in two sorted lists, arranged so the alerts a
+    price crosses always sit at the tail: "above" targets are kept as
+    negated keys (highest target first), "below" targets ascending.
+    Evaluating a price is one bisect per side plus popping the crossed tail.
+    """
+
+    def __init__(self):
+        self._above = []   # sorted (-target, seq, uid, alert)
+        self._below = []   # sorted (target, seq, uid, alert)
+        self._seq = 0      # tie-breaker so equal targets never compare dicts
+
+    def __len__(self):
+        return len(self._above) + len(self._below)
+
+    def add(self, uid: str, alert: dict):
+        self._seq += 1
+        target = float(alert["target"])
+        if alert.get("direction", ABOVE) == BELOW:
+            insort(self._below, (target, self._seq, uid, alert))
+        else:
+            insort(self._above, (-target, self._seq, uid, alert))
+
+    def crossed(self, price: float) -> list:
+        """Remove and return [(uid, alert)] for every alert `price` has crossed."""
+        fired = []
+        # Above: -target >= -price  <=>  target <= price
+        i = bisect_left(self._above, (-price,))
+        fired.extend((uid, alert) for _, _, uid, alert in self._above[i:])
+        del self._above[i:]
+        # Below: target >= price
+        j = bisect_left(self._below, (price,))
+        fired.extend((uid, alert) for _, _, uid, alert in self._below[j:])
+        del self._below[j:]
+        return fired
+
+    def nearest(self, price: float) -> float:
+        """Closest untriggered target to `price`, or None if empty."""
+        candidates = []
+        if self._above:
+            candidates.append(-self._above[-1][0])
+        if self._below:
+            candidates.append(self._below[-1][0])
+        return min(candidates, key=lambda t: abs(t - price)) if candidates else None
+
+    def drain(self) -> list:
+        """Remove and return every alert in the index."""
+        entries = [(uid, alert) for _, _, uid, alert in self._above + self._below]
+        self._above, self._below = [], []
+        return entries
+
+
+class AlertIndex:
+    """Alerts grouped by pair, so each polled price is checked once per pair."""
+
+    def __init__(self):
+        self._pairs = {}
+
+    @classmethod
+    def build(cls, alerts: dict) -> "AlertIndex":
+        """From the stored {user_id: [alert, ...]} mapping."""
+        index = cls()
+        for uid, user_alerts in alerts.items():
+            for alert in user_alerts:
+                index.add(uid, alert)
+        return index
+
+    def add(self, uid: str, alert: dict):
+        self._pairs.setdefault(alert["pair"], ThresholdIndex()).add(uid, alert)
+
+    def pairs(self) -> list:
+        return list(self._pairs)
+
+    def __len__(self):
+        return sum(len(t) for t in self._pairs.values())
+
+    def crossed(self, pair: str, price: float) -> list:
+        thresholds = self._pairs.get(pair)
+        if thresholds is None:
+            return []
+        fired = thresholds.crossed(price)
+        if not thresholds:
+            del self._pairs[pair]
+        return fired
+
+    def nearest(self, pair: str, price: float) -> float:
+        thresholds = self._pairs.get(pair)
+        return thresholds.nearest(price) if thresholds else None
+
+    def drop(self, pair: str) -> list:
+        """Remove every alert on `pair` (e.g. a delisted market)."""
+        thresholds = self._pairs.pop(pair, None)
+        return thresholds.drain() if thresholds else []
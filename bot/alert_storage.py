@@ -1,9 +1,9 @@
 import json
 import os
-from pathlib import Path
+
+from storage import connect
 
 PAIR_FILE  = "pairs.json"
-ALERTS_FILE = Path("alerts.json")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Helper Functions
@@ -23,14 +23,74 @@ def get_pairs() -> list[str]:
     return pairs
 
 
+_version = 0   # bumped on every write so the alert monitor knows to rebuild its index
+
+
+def alerts_version() -> int:
+    return _version
+
+
+def _bump():
+    global _version
+    _version += 1
+
+
+def _row_to_alert(row) -> dict:
+    return {
+        "id": row["id"],
+        "pair": row["pair"],
+        "target": row["target"],
+        "percent": row["percent"],
+        "direction": row["direction"],
+    }
+
+
 def load_alerts() -> dict:
-    try:
-        return json.loads(ALERTS_FILE.read_text())
-    except FileNotFoundError:
-        return {}
-    except json.JSONDecodeError:
-        return {}
+    """Every alert as {user_id: [alert, ...]} (alerts keep their row `id`)."""
+    alerts = {}
+    for row in connect().execute("SELECT * FROM alerts ORDER BY id"):
+        alerts.setdefault(row["user_id"], []).append(_row_to_alert(row))
+    return alerts
+
+
+def get_user_alerts(user_id: str) -> list:
+    rows = connect().execute("SELECT * FROM alerts WHERE user_id = ? ORDER BY id", (str(user_id),))
+    return [_row_to_alert(row) for row in rows]
+
+
+def add_alert(user_id: str, alert: dict) -> int:
+    conn = connect()
+    with conn:
+        cur = conn.execute(
+            "INSERT INTO alerts (user_id, pair, target, percent, direction) VALUES (?, ?, ?, ?, ?)",
+            (str(user_id), alert["pair"], float(alert["target"]), alert.get("percent"),
+             alert.get("direction", "above")),
+        )
+    _bump()
+    return cur.lastrowid
+
 
 def save_alerts(alerts: dict):
-    ALERTS_FILE.write_text(json.dumps(alerts, indent=2))
+    """Replace all stored alerts with {user_id: [alert, ...]}."""
+    conn = connect()
+    with conn:
+        conn.execute("DELETE FROM alerts")
+        for uid, user_alerts in alerts.items():
+            for alert in user_alerts:
+                conn.execute(
+                    "INSERT INTO alerts (user_id, pair, target, percent, direction) VALUES (?, ?, ?, ?, ?)",
+                    (str(uid), alert["pair"], float(alert["target"]), alert.get("percent"),
+                     alert.get("direction", "above")),
+                )
+    _bump()
+
 
+def remove_alerts(entries: list):
+    """Remove [(user_id, alert)] by row id."""
+    conn = connect()
+    with conn:
+        conn.executemany(
+            "DELETE FROM alerts WHERE id = ? AND user_id = ?",
+            [(alert["id"], str(uid)) for uid, alert in entries],
+        )
+    _bump()
@@ -0,0 +1,92 @@
+import asyncio
+import bisect
+import os
+import time
+from collections import Counter
+from dotenv import load_dotenv
+
+from singleflight import SingleFlight
+
+# Imported by bot.py before it loads .env, so load it here first
+load_dotenv()
+ANALYZE_CACHE_TTL = float(os.getenv("ANALYZE_CACHE_TTL", 60))   # seconds a result is served
+PREWARM_PAIRS = int(os.getenv("ANALYZE_PREWARM_PAIRS", 5))       # most-requested keys kept warm
+PREWARM_INTERVAL = 10      # seconds between prewarm sweeps
+DEMAND_DECAY = 0.9         # request counts fade by this much per sweep
+
+# Horizons are cached per bucket: a result is built for the bucket's upper
+# edge and the linear prediction is shifted to the exact horizon on render.
+HORIZON_BUCKETS = (15 * 60, 3600, 4 * 3600, 24 * 3600)
+
+
+def horizon_bucket(seconds_ahead: float) -> int:
+    i = bisect.bisect_left(HORIZON_BUCKETS, seconds_ahead)
+    return HORIZON_BUCKETS[i] if i < len(HORIZON_BUCKETS) else int(seconds_ahead)
+
+
+class AnalysisCache:
+    """
+    Short-TTL cache of `!analyze` results keyed by (pair, horizon bucket).
+
+    A miss runs the build once; concurrent misses for the same key await
+    that build through SingleFlight. Request counts are kept per key so a
+    background task can rebuild the most-requested entries before they
+    expire, keeping popular coins warm while they trend.
+    """
+
+    def __init__(self, ttl: float = ANALYZE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}          # (pair, bucket) -> (result, built_at)
+        self._flight = SingleFlight()
+        self.demand = Counter()     # (pair, bucket) -> decayed request count
+        self.stats = {"hits": 0, "misses": 0, "prewarmed": 0}
+
+    async def _build(self, key: tuple, build):
+        result = await build(*key)
+        self._entries[key] = (result, time.time())
+        return self._entries[key]
+
+    async def get(self, pair: str, seconds_ahead: float, build) -> tuple:
+        """
+        (result, age in seconds) for `pair` at `seconds_ahead`'s bucket;
+        `build(pair, bucket_seconds)` is awaited on a miss. Failures are
+        raised to every waiting caller and not cached.
+        """
+        key = (pair, horizon_bucket(seconds_ahead))
+        self.demand[key] += 1
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            entry = await self._flight.do(("analyze",) + key, lambda: self._build(key, build))
+        result, built_at = entry
+        return result, time.time() - built_at
+
+    async def prewarm(self, build):
+        """Background task: rebuild the most-requested entries before they expire."""
+        while True:
+            await asyncio.sleep(PREWARM_INTERVAL)
+            now = time.time()
+            for key, _ in self.demand.most_common(PREWARM_PAIRS):
+                entry = self._entries.get(key)
+                # Refresh once past half the TTL so callers never see a miss
+                if entry is None or now - entry[1] >= self.ttl / 2:
+                    try:
+                        await self._flight.do(("analyze",) + key, lambda key=key: self._build(key, build))
+                        self.stats["prewarmed"] += 1
+                    except Exception as e:
+                        print(f"[AnalysisCache] Prewarm of {key[0]} failed: {e}")
+
+            for key in list(self.demand):
+                self.demand[key] *= DEMAND_DECAY
+                if self.demand[key] < 0.5:
+                    del self.demand[key]
+            for key in [k for k, (_, at) in self._entries.items() if now - at >= self.ttl and k not in self.demand]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+from collections import deque
+from dotenv import load_dotenv
+
+from client_registry import clients
+from indodax_api import round_amount
+from pending_storage import add_pending_order
+from request_scheduler import CRITICAL
+
+# Config may come from .env; don't rely on bot.py having loaded it before this import
+load_dotenv()
+
+# Sell this far below the trigger price so the limit order crosses the book at once
+AUTO_SELL_SLIPPAGE_PCT = float(os.getenv("AUTO_SELL_SLIPPAGE_PCT", 1.0))
+KEEP_WARM_INTERVAL = 30   # seconds; under the session's 60s keep-alive timeout
+LATENCY_SAMPLES = 200
+
+
+class AutoExecutor:
+    """
+    Sends the sell order for an auto-executing stop or take-profit the
+    moment it fires. Each user's registry client (with its pre-keyed HMAC
+    signer) is built ahead of time and the shared keep-alive connection is
+    kept warm, so the trigger-to-exchange path is one signed POST. Every
+    execution records wall-clock trigger, submit and ack timestamps.
+    """
+
+    def __init__(self):
+        self.latency = deque(maxlen=LATENCY_SAMPLES)   # (trigger->submit ms, submit->ack ms)
+        self.stats = {"executed": 0, "failed": 0}
+
+    async def keep_warm(self, auto_users):
+        """Background task: pre-build clients and keep the connection warm while auto stops are armed."""
+        while True:
+            warm = None
+            for user_id in auto_users():
+                try:
+                    # Touching the registry also keeps these clients from idling out
+                    warm = clients.get(user_id)
+                except RuntimeError as e:
+                    print(f"[AutoExec] {user_id}: {e}")
+            if warm is not None:
+                try:
+                    # One request warms the shared pool every user's POST goes through
+                    await warm.warm()
+                except Exception as e:
+                    print(f"[AutoExec] Keep-warm failed: {e}")
+            await asyncio.sleep(KEEP_WARM_INTERVAL)
+
+    async def execute(self, user_id, stop: dict, price: float, triggered_at: float) -> dict:
+        """
+        Sell `stop["amount"]`, clamped to the free balance now and rounded
+        down to the pair's precision, at a marketable limit under `price`;
+        returns order, amount and timings.
+        """
+        timings = {"trigger": triggered_at}
+        limit = price * (1 - AUTO_SELL_SLIPPAGE_PCT / 100.0)
+        try:
+            client = clients.get(user_id)
+            # The balance armed with may since have been sold or moved
+            free, decimals = await asyncio.gather(
+                client.get_balance(stop["coin"], priority=CRITICAL),
+                client.amount_decimals(stop["pair"], priority=CRITICAL),
+            )
+            amount = round_amount(min(float(stop["amount"]), free), decimals)
+            if amount <= 0:
+                raise RuntimeError(f"No free {stop['coin']} balance left to sell")
+            resp = await client.create_sell_order(stop["pair"], limit, amount, timings=timings)
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+
+        self.stats["executed"] += 1
+        to_submit = (timings["submit"] - timings["trigger"]) * 1000
+        to_ack = (timings["ack"] - timings["submit"]) * 1000
+        self.latency.append((to_submit, to_ack))
+        print(f"[AutoExec] {stop['pair']} sell for {user_id}: trigger→submit {to_submit:.1f} ms, "
+              f"submit→ack {to_ack:.1f} ms")
+
+        order_id = resp["return"]["order_id"]
+        add_pending_order(user_id, {
+            "order_id": order_id,
+            "pair": stop["pair"],
+            "type": "sell",
+            "price": limit,
+            "amount": amount,
+            "total": limit * amount,
+            "account": client.account,
+            "stop_id": stop["id"],
+            "timings": timings,
+        })
+        return {"order_id": order_id, "price": limit, "amount": amount, "timings": timings}
+
+    def latency_stats(self) -> dict:
+        if not self.latency:
+            return None
+        submit = sorted(s for s, _ in self.latency)
+        total = sorted(s + a for s, a in self.latency)
+        return {
+            "samples": len(total),
+            "submit_p50": submit[len(submit) // 2],
+            "total_p50": total[len(total) // 2],
+            "total_max": total[-1],
+        }
+
+
+executor = AutoExecutor()
@@ -5,11 +5,8 @@ import time
 import discord
 from discord.ext import commands
 from discord import Embed
-from discord.ext import tasks
-from indodax_api import IndodaxClient
 from prettytable import PrettyTable
 from dotenv import load_dotenv
-import numpy as np
 from functools import wraps
 import asyncio
 import requests
@@ -17,10 +14,30 @@ import aiohttp
 import math
 
 
-from alert_storage import load_alerts, save_alerts, get_pairs
-from pending_storage import load_pending_orders, save_pending_orders, add_pending_order, remove_pending_order_by_user
-from price_fetcher import get_last_price
-from indodax_api      import IndodaxClient
+from alert_storage import load_alerts, get_user_alerts, add_alert, remove_alerts, alerts_version, get_pairs
+from alert_index import ABOVE, BELOW
+from trigger_engine import engine, ALERT, STOP, TAKE_PROFIT
+from pending_storage import (
+    add_pending_order, get_user_orders, get_user_order,
+    remove_pending_order_by_user, add_stoploss, get_active_stoplosses, deactivate_stoploss, raise_stoploss
+)
+from credential_storage import set_credentials
+from market_snapshot import snapshot, REFRESH_INTERVAL, MAX_STALENESS
+from order_book import books
+from market_analysis import analyze_trades, from_columns
+from indicators import indicators, LOOKBACK, MIN_TRADES
+from analysis_cache import analysis_cache
+from market_scanner import load_matrix, last_prices, top_pairs, SCAN_TRADES, SCAN_MAX_AGE
+from compute_pool import compute
+from indodax_api      import AsyncIndodaxClient, public_flight
+from request_scheduler import scheduler, POLLING
+from trade_tape import tape, RECORD_INTERVAL, PAIR_NAME
+from market_stream import MarketStream, WS_TOKEN
+from notifier import Notifier
+from auto_executor import executor
+from client_registry import clients
+from order_reconciler import OrderReconciler
+from poll_cadence import cadence, MIN_INTERVAL, MAX_INTERVAL
 from news_fetcher   import fetch_crypto_news
 from paginator      import NewsPaginator, PairsPaginator, PricesPaginator
 from coingecko import fetch_trending_coins
@@ -32,7 +49,7 @@ from quota_calculator import (
     get_coin_balance
 )
 
-CRED_FILE = "user_credentials.json"
+ANALYZE_LOOKBACK = LOOKBACK  # seconds of recorded trades analyze reads from the tape
 
 MAINTENANCE_MODE = False  # Change to False to disable
 BOT_OWNERS = [527832667845033994, 1402691770545995796,577029761910439962]
@@ -48,6 +65,22 @@ def find_pair(symbol: str) -> str:
             return p
     return None
 
+async def is_listed(pair: str) -> bool:
+    """
+    True if Indodax lists `pair`. Checked against the live ticker snapshot and
+    pair list, since the bundled pairs.json lags new listings; the name
+    pattern also keeps the pair safe to use as a tape directory.
+    """
+    if not PAIR_NAME.match(pair):
+        return False
+    if snapshot.tickers.get(pair) is not None:
+        return True
+    try:
+        return bool(await dex_client.get_pair_rules(pair))
+    except Exception as e:
+        print(f"[Pairs] Live pair list unavailable, using pairs.json: {e}")
+        return pair in PAIRS
+
 def is_owner():
     async def predicate(ctx):
         if ctx.author.id not in BOT_OWNERS:
@@ -76,16 +109,6 @@ def maintenance_check():
         return True
     return commands.check(predicate)
 
-def load_credentials():
-    if not os.path.isfile(CRED_FILE):
-        return {}
-    with open(CRED_FILE, "r") as f:
-        return json.load(f)
-
-def save_credentials(creds):
-    with open(CRED_FILE, "w") as f:
-        json.dump(creds, f, indent=2)
-
 def with_typing(func):
     @wraps(func)
     async def wrapped(ctx, *args, **kwargs):
@@ -95,119 +118,223 @@ def with_typing(func):
             return await func(ctx, *args, **kwargs)
     return wrapped
 
-# Stoploss background task
-async def stoploss_monitor():
+# Market snapshot refresher
+# Keeps the shared all-pairs ticker snapshot warm so price lookups stay in memory
+
+async def snapshot_refresher():
     await bot.wait_until_ready()
     while not bot.is_closed():
+        # While the WebSocket stream is live it keeps the pairs it covers current;
+        # a slow full refresh still catches the pairs it does not
+        if stream.is_live() and snapshot.age() < MAX_STALENESS / 2:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            continue
         try:
-            with open("pending_orders.json", "r") as f:
-                data = json.load(f)
-
-            if "stoploss" in data:
-                for sl in data["stoploss"]:
-                    if not sl.get("active"):
-                        continue
-
-                    current_price = get_last_price(sl["pair"])
-                    if current_price <= sl["stop_price"]:
-                        # Notify user
-                        user = bot.get_user(sl["user"])
-                        if user:
-                            await user.send(
-                                f"🛑 STOPLOSS TRIGGERED for {sl['coin']}!\n"
-                                f"Price dropped to {current_price:,.0f} IDR (Stop: {sl['stop_price']:,.0f})"
-                            )
-                        sl["active"] = False  # deactivate after triggering
-
-            # Save updates
-            with open("pending_orders.json", "w") as f:
-                json.dump(data, f, indent=2)
-
+            snapshot.load(await dex_client.get_summaries(priority=POLLING))
         except Exception as e:
-            print(f"[Stoploss Monitor Error] {e}")
+            print(f"[Snapshot] Refresh failed: {e}")
+        await asyncio.sleep(REFRESH_INTERVAL)
+
+# Trade tape recorder
+# Incrementally records public trades for pairs in use so analyze can read them locally
+
+async def tape_recorder():
+    await bot.wait_until_ready()
+    while not bot.is_closed():
+        active = tape.active_pairs()
+        indicators.forget(active)
+        for pair in active:
+            try:
+                # The tape's newest trade id is the cursor, so only the delta is parsed
+                new = await dex_client.get_trades_since(pair, tape.last_tid(pair), priority=POLLING)
+                await asyncio.to_thread(tape.append, pair, new)
+            except Exception as e:
+                print(f"[Tape] Failed to record {pair}: {e}")
+        await asyncio.sleep(RECORD_INTERVAL)
 
-        await asyncio.sleep(30)  # check every 30s
+# Trigger monitor
+# Alerts, stoplosses and trailing stops share one price feed, polled per pair at its own cadence
 
-    bot.loop.create_task(stoploss_monitor())
+TRAIL_FLUSH_INTERVAL = 60  # seconds between persisting raised trailing-stop marks
 
+auto_sells = set()   # in-flight auto_execute tasks; the loop only holds tasks weakly
 
-# Monitor Alerts
-# This background task checks for alerts every 15 seconds
+monitor_stats = {"cycles": 0, "last_cycle_ms": 0.0, "max_cycle_ms": 0.0, "pairs": 0, "slow": 0}
 
-async def monitor_alerts():
+async def monitor_triggers():
     await bot.wait_until_ready()
-    while not bot.is_closed():
-        # Offload blocking file read
-        alerts = await asyncio.to_thread(load_alerts)
+    version = None
+    engine.load_stops(get_active_stoplosses())
+    limit = asyncio.Semaphore(MONITOR_CONCURRENCY)
+    inflight = {}   # pair -> price fetch, possibly still running from an earlier pass
+    launched = {}   # pair -> when its fetch started
+    flushed = time.monotonic()
 
-        # Iterate over a shallow copy so we can remove items safely
-        for uid, user_alerts in list(alerts.items()):
-            for alert in list(user_alerts):
-                pair = alert["pair"]
-                target = alert["target"]
+    async def fetch(pair):
+        async with limit:
+            return await dex_client.get_last_price(pair, priority=POLLING)
 
-                try:
-                    # Offload blocking HTTP/CPU work if get_last_price is sync
-                    price = await asyncio.to_thread(get_last_price, pair)
-                except ValueError as ve:
-                    print(f"[Monitor] Skipping {pair}: {ve}")
-                    user_alerts.remove(alert)
-                    continue
-                except Exception as e:
-                    print(f"[Monitor] Error fetching {pair}: {e}")
-                    continue
-
-                # Trigger alert
-                if price >= target:
-                    try:
-                        user = await bot.fetch_user(int(uid))
-                        await user.send(f"🚨 `{pair}` hit `{price}` IDR (target `{target}`)")
-                    except Exception as e:
-                        # Don't let a DM failure block the loop
-                        print(f"[Monitor] DM failed for {uid}: {e}")
-                    finally:
-                        user_alerts.remove(alert)
-
-        # Persist any removals or changes (offload blocking file write)
-        await asyncio.to_thread(save_alerts, alerts)
-
-        # Yield control so Discord heartbeats can run
-        await asyncio.sleep(15)
-
-@tasks.loop(seconds=15)
-async def check_pending_orders():
-    client = IndodaxClient()
-    data = load_pending_orders()
-    changed = False
-
-    for user_id, orders in data.items():
-        for order in orders:
-            if order["status"] == "pending":
-                trades = client.get_trade_history(order["pair"], count=20)
-
-                # Check if order_id appears in trade history
-                for t in trades:
-                    if str(t.get("order_id")) == str(order["order_id"]):
-                        if float(t.get("remain", 0)) == 0:  # fully filled
-                            order["status"] = "completed"
-                            changed = True
-
-                            user = await bot.fetch_user(int(user_id))
-                            await user.send(
-                                f"✅ Your buy order {order['order_id']} for {order['amount']} {order['pair']} has been filled!"
-                            )
-
-    if changed:
-        save_pending_orders(data)
+    while not bot.is_closed():
+        started = time.monotonic()
+
+        # Rebuild the alert index only when the stored alerts changed
+        if version != alerts_version():
+            version = alerts_version()
+            engine.load_alerts(await asyncio.to_thread(load_alerts))
+            # Targets may have moved: re-poll everything and recompute cadences
+            cadence.forget(engine.pairs())
+            for pair in engine.pairs():
+                cadence.mark_due(pair)
+
+        # Fan out one fetch per due pair; a pair still in flight keeps its task
+        for pair in cadence.due(engine.pairs()):
+            if pair not in inflight:
+                inflight[pair] = asyncio.ensure_future(fetch(pair))
+                launched[pair] = started
+
+        # Evaluate every price that has arrived; the rest stay in flight
+        fired, dropped = [], []
+        for pair, task in list(inflight.items()):
+            if not task.done():
+                continue
+            del inflight[pair]
+            took = time.monotonic() - launched.pop(pair)
+            if took >= MONITOR_DEADLINE:
+                print(f"[Monitor] Price for {pair} took {took:.1f}s")
+            try:
+                price = task.result()
+            except ValueError as ve:
+                print(f"[Monitor] Skipping {pair}: {ve}")
+                dropped.extend(engine.alerts.drop(pair))
+                continue
+            except Exception as e:
+                print(f"[Monitor] Error fetching {pair}: {e}")
+                cadence.backoff(pair)
+                continue
+
+            # Sorted indexes and trailing books: only crossed triggers are touched
+            triggered_at = time.time()
+            for kind, uid, item in engine.on_price(pair, price):
+                if kind != ALERT and item.get("auto"):
+                    # Sell first, before any bookkeeping or DM queuing
+                    task = asyncio.ensure_future(auto_execute(uid, kind, item, price, triggered_at))
+                    auto_sells.add(task)
+                    task.add_done_callback(auto_sells.discard)
+                fired.append((kind, uid, item, price))
+            # Next poll: sooner the closer (in volatility units) the nearest trigger is.
+            # Prices come from the snapshot, so polling faster than it refreshes
+            # gains nothing unless the stream is keeping it live; and re-reading
+            # memory costs nothing, so only pairs that need a real fetch wait longer.
+            cadence.observe(pair, price, stamp=snapshot.updated(pair))
+            floor = MIN_INTERVAL if stream.is_live() else REFRESH_INTERVAL
+            cached = snapshot.get_ticker(pair, refresh=False) is not None
+            ceiling = REFRESH_INTERVAL if cached else MAX_INTERVAL
+            cadence.reschedule(pair, price, engine.nearest(pair, price), floor=floor, ceiling=ceiling)
+
+        now = time.monotonic()
+        elapsed_ms = (now - started) * 1000
+        monitor_stats["cycles"] += 1
+        monitor_stats["last_cycle_ms"] = elapsed_ms
+        monitor_stats["max_cycle_ms"] = max(monitor_stats["max_cycle_ms"], elapsed_ms)
+        monitor_stats["pairs"] = len(engine.pairs())
+        monitor_stats["slow"] = sum(1 for at in launched.values() if now - at >= MONITOR_DEADLINE)
+
+        # Queued, not sent inline: the dispatcher merges and rate-limits DMs
+        fired_alerts = []
+        for kind, uid, item, price in fired:
+            if kind == ALERT:
+                fired_alerts.append((uid, item))
+                notifier.notify(uid, f"🚨 `{item['pair']}` hit `{price}` IDR (target `{item['target']}`)")
+                continue
+            deactivate_stoploss(item["id"], price)  # deactivate after triggering
+            if item.get("auto"):
+                continue   # auto_execute reports the sell instead
+            notifier.notify(uid, _trigger_text(kind, item, price))
+
+        # Persist alert removals (offload blocking I/O)
+        if fired_alerts or dropped:
+            await asyncio.to_thread(remove_alerts, fired_alerts + dropped)
+            if version == alerts_version() - 1:
+                # Our own write: the index already reflects it
+                version = alerts_version()
+
+        # Trailing marks move on every tick in memory; persist them occasionally
+        if time.monotonic() - flushed >= TRAIL_FLUSH_INTERVAL:
+            flushed = time.monotonic()
+            for stop, hwm in engine.raised_marks():
+                raise_stoploss(stop["id"], hwm)
+
+        if inflight:
+            # Wake on the first price back, so one slow pair never holds up the
+            # others; also when an idle pair falls due, or at the floor rate
+            # while streamed prices can mark pairs due at any moment
+            idle = [p for p in engine.pairs() if p not in inflight]
+            wait = MIN_INTERVAL if stream.is_live() else max(MIN_INTERVAL, cadence.next_wake(idle))
+            await asyncio.wait(list(inflight.values()), timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            continue
+
+        # Sleep until the next pair is due; streamed prices mark pairs due early
+        await asyncio.sleep(MIN_INTERVAL)
+        wait = cadence.next_wake(engine.pairs())
+        if wait > 0:
+            await stream.wait_update(wait)
+
+def _trigger_text(kind, item, price) -> str:
+    if kind == TAKE_PROFIT:
+        return (f"🎯 TAKE PROFIT TRIGGERED for {item['coin']}!\n"
+                f"Price rose to {price:,.0f} IDR (Target: {item['stop_price']:,.0f})")
+    level = item["stop_price"] if kind == STOP else item["hwm"] * (1 - item["trail"] / 100.0)
+    label = "STOPLOSS" if kind == STOP else f"TRAILING STOP ({item['trail']:g}%)"
+    return (f"🛑 {label} TRIGGERED for {item['coin']}!\n"
+            f"Price dropped to {price:,.0f} IDR (Stop: {level:,.0f})")
+
+async def auto_execute(uid, kind, item, price, triggered_at):
+    """Place the sell for an auto stop or take-profit, then report it."""
+    text = _trigger_text(kind, item, price)
+    try:
+        result = await executor.execute(uid, item, price, triggered_at)
+    except Exception as e:
+        print(f"[AutoExec] Sell for {uid} on {item['pair']} failed: {e}")
+        notifier.notify(uid, f"{text}\n⚠️ Automatic sell failed: {e}")
+        return
+    t = result["timings"]
+    notifier.notify(
+        uid,
+        f"{text}\n✅ Sell order #{result['order_id']} placed: {result['amount']} {item['coin']} "
+        f"at {result['price']:,.0f} IDR ({(t['ack'] - t['trigger']) * 1000:.0f} ms after trigger)"
+    )
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
+MONITOR_CONCURRENCY = int(os.getenv("MONITOR_CONCURRENCY", 8))   # pair fetches in flight at once
+MONITOR_DEADLINE = float(os.getenv("MONITOR_DEADLINE", 10))      # seconds before a price fetch counts as slow
 
 intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 bot.remove_command("help")
-dex_client = IndodaxClient()
+dex_client = AsyncIndodaxClient()  # shared keep-alive client for the bot's own key
+stream = MarketStream()            # pushes WebSocket prices into the shared snapshot
+notifier = Notifier(bot)           # queued, per-user coalesced DMs for background triggers
+tape.subscribe(indicators.feed)    # every tape append, from any command, updates the indicators
+
+def client_for_account(user_id, account) -> AsyncIndodaxClient:
+    """
+    The client holding the key that placed an order (`account` is the key
+    fingerprint stored with it), or None if that key is no longer available.
+    Orders tracked before fingerprints were stored were placed with the
+    bot's shared key.
+    """
+    if account is None or account == dex_client.account:
+        return dex_client
+    if clients.has(user_id):
+        client = clients.get(user_id)
+        if client.account == account:
+            return client
+    return None
+
+reconciler = OrderReconciler(client_for_account, notifier.notify)   # tracked orders vs. the exchange
+stream.on_price(lambda pair, price, ts: cadence.mark_due(pair))
 
 @bot.check
 async def global_maintenance_check(ctx):
@@ -299,7 +426,19 @@ async def on_command_error(ctx, error):
 
 @bot.event
 async def on_ready():
-    bot.loop.create_task(monitor_alerts())
+    # Sample Indodax server time once so signed calls can stamp locally
+    await dex_client.sync_clock()
+    if WS_TOKEN:
+        bot.loop.create_task(stream.run())
+    else:
+        print("[Stream] INDODAX_WS_TOKEN not set, polling prices only")
+    bot.loop.create_task(notifier.run())
+    bot.loop.create_task(snapshot_refresher())
+    bot.loop.create_task(tape_recorder())
+    bot.loop.create_task(monitor_triggers())
+    bot.loop.create_task(executor.keep_warm(engine.auto_users))
+    bot.loop.create_task(reconciler.run())
+    bot.loop.create_task(analysis_cache.prewarm(build_analysis))
 
     # Choose one of these Activity types:
     # activity = discord.Game(name="with crypto signals")
@@ -364,6 +503,116 @@ async def maintenance_toggle(ctx, mode: str):
     else:
         await ctx.send("❌ Invalid mode. Use `!maintenance on` or `!maintenance off`.")
 
+@bot.command(name="netstats")
+@is_owner()
+async def netstats(ctx):
+    """Show Indodax traffic: coalescing savings and scheduler queues."""
+    stats = public_flight.stats()
+    sched = scheduler.stats()
+
+    embed = discord.Embed(
+        title="📡 Indodax Traffic",
+        description=(
+            f"Callers: **{stats['calls']}** · Upstream fetches: **{stats['fetches']}**\n"
+            f"Deduplicated: **{stats['deduplicated']}** ({stats['saved_pct']:.1f}% saved) · "
+            f"In flight: **{public_flight.in_flight()}**"
+        ),
+        color=discord.Color.blurple()
+    )
+    for endpoint, ep in sorted(stats["endpoints"].items()):
+        embed.add_field(
+            name=endpoint,
+            value=f"{ep['calls']} calls / {ep['fetches']} fetches\n{ep['deduplicated']} deduplicated",
+            inline=True
+        )
+
+    lane_lines = [
+        f"**{name}**: {lane['queued']} queued · {lane['served']} served · "
+        f"avg {lane['avg_wait_ms']:.0f} ms · max {lane['max_wait_ms']:.0f} ms"
+        for name, lane in sched["lanes"].items()
+    ]
+    embed.add_field(name="Scheduler lanes", value="\n".join(lane_lines), inline=False)
+    if sched["buckets"]:
+        bucket_lines = [
+            f"`{name}`: {b['queued']} queued · {b['tokens']:.1f} tokens"
+            for name, b in sched["buckets"].items()
+        ]
+        embed.add_field(name="Token buckets", value="\n".join(bucket_lines), inline=False)
+    poll = cadence.stats()
+    armed = engine.stats()
+    embed.add_field(
+        name="Trigger monitor",
+        value=(
+            f"{armed['alerts']} alerts · {armed['stops']} stops · {armed['trailing']} trailing\n"
+            f"{monitor_stats['pairs']} pairs · last cycle {monitor_stats['last_cycle_ms']:.0f} ms · "
+            f"max {monitor_stats['max_cycle_ms']:.0f} ms · {monitor_stats['slow']} slow"
+            + (
+                f"\nPoll interval {poll['fastest']:.1f}s – {poll['slowest']:.0f}s"
+                if poll["fastest"] is not None else ""
+            )
+        ),
+        inline=False
+    )
+    dm = notifier.stats
+    embed.add_field(
+        name="DM dispatcher",
+        value=(
+            f"{notifier.pending()} queued · {dm['sent']} sent · {dm['merged']} merged · "
+            f"{dm['retried']} retried · {dm['rate_limited']} rate-limited · {dm['dropped']} dropped"
+        ),
+        inline=False
+    )
+    rec = reconciler.stats
+    embed.add_field(
+        name="Order reconciliation",
+        value=(
+            f"{rec['orders']} open orders in {rec['groups']} user/pair groups · "
+            f"last pass {rec['last_pass_ms']:.0f} ms\n"
+            f"{rec['calls']} calls · {rec['fills']} fills · {rec['cancels']} cancels · "
+            f"{rec['unresolved']} unresolved"
+        ),
+        inline=False
+    )
+    embed.add_field(
+        name="Client registry",
+        value=(
+            f"{len(clients)} cached · {clients.stats['hits']} hits · {clients.stats['misses']} misses · "
+            f"{clients.stats['evicted']} evicted · {clients.stats['invalidated']} invalidated"
+        ),
+        inline=False
+    )
+    ac = analysis_cache.stats
+    embed.add_field(
+        name="Analysis cache",
+        value=(
+            f"{len(analysis_cache)} entries · {ac['hits']} hits · {ac['misses']} misses · "
+            f"{ac['prewarmed']} prewarmed · TTL {analysis_cache.ttl:.0f}s"
+        ),
+        inline=False
+    )
+    cs = compute.stats
+    embed.add_field(
+        name="Compute pool",
+        value=(
+            f"{compute.workers} workers · {cs['completed']} jobs · {cs['failed']} failed · "
+            f"{cs['timed_out']} timed out · {cs['cancelled']} cancelled · {cs['recycled']} recycled\n"
+            f"{cs['shared_bytes'] / 1e6:.1f} MB via shared memory · {cs['busy_ms'] / 1000:.1f}s busy"
+        ),
+        inline=False
+    )
+    lat = executor.latency_stats()
+    if lat:
+        embed.add_field(
+            name="Auto-execution",
+            value=(
+                f"{executor.stats['executed']} sells · {executor.stats['failed']} failed\n"
+                f"trigger→submit p50 {lat['submit_p50']:.0f} ms · trigger→ack p50 {lat['total_p50']:.0f} ms · "
+                f"max {lat['total_max']:.0f} ms"
+            ),
+            inline=False
+        )
+    await ctx.send(embed=embed)
+
 
 @bot.command(name="help")
 @maintenance_check()
@@ -380,6 +629,7 @@ async def help_command(ctx):
             ("help", "Display this help message.", "`!help`", None),
             ("trending", "Show the current top trending cryptocurrencies.", "`!trending`", None),
             ("analyze", "Analyze when to buy/sell based on news & market stats.", "`!analyze <coin> <time>(1h default)`", "`!analyze floki`"),
+            ("scan", "Rank every IDR pair by the analyze signals (add `weak` for the weakest).", "`!scan [count] [weak]`", "`!scan 10`"),
             ("market", "Show recent market trades for a coin.", "`!market <coin> [limit]`", "`!market btc 500`"),
             ("crypto_prices", "Fetch current top coin prices.", "`!crypto_prices`", None),
             ("crypto_news", "Browse the latest crypto news with pagination.", "`!crypto_news [limit]`", "`!crypto_news 10`"),
@@ -397,6 +647,9 @@ async def help_command(ctx):
             ("sell", "Place a sell order for a coin.", "`!sell <symbol> <price> <amount>`", "`!sell doge 4000 10`"),
             ("sell_list", "List all your active/pending sell orders.", "`!sell_list`", None),
             ("cancelsell", "Cancel a specific sell order.", "`!cancelsell <order_id>`", "`!cancelsell DOGEIDR-987654`"),
+            ("auto_stoploss", "Alert (or sell, with `sell`) when a coin falls a percentage below its current price.", "`!auto_stoploss <coin> <percent> [sell]`", "`!auto_stoploss btc 5 sell`"),
+            ("trailing_stop", "Stop that follows the highest price by a percentage.", "`!trailing_stop <coin> <percent> [sell]`", "`!trailing_stop btc 5`"),
+            ("take_profit", "Alert (or sell, with `sell`) when a coin reaches a price or rises a percentage.", "`!take_profit <coin> <price|+percent> [sell]`", "`!take_profit btc +10 sell`"),
         ],
         "Admin": [
             ("maintenance", "Toggle maintenance mode (Owner only).", "`!maintenance on/off`", "`!maintenance on`"),
@@ -463,30 +716,180 @@ async def crypto_prices(ctx):
     except Exception as e:
         return await ctx.send(f"⚠️ Could not load pairs.json: {e}")
 
+    # Every page is served from the shared market snapshot
+    if snapshot.age() >= REFRESH_INTERVAL:
+        try:
+            snapshot.load(await dex_client.get_summaries())
+        except Exception as e:
+            print(f"[Snapshot] Refresh failed: {e}")
     paginator = PricesPaginator(all_pairs, fetch_price)
-    embed = Embed(
-        title="📊 Indodax Market",
-        description="Latest market prices (from pairs.json)",
+    await ctx.send(embed=paginator.make_embed(), view=paginator)
+
+@bot.command(name="price")
+@maintenance_check()
+@with_typing
+async def price_command(ctx, coin: str):
+    pair = coin.lower() if "_" in coin else f"{coin.lower()}_idr"
+    try:
+        ticker = (await dex_client.get_ticker(pair))["ticker"]
+        last = float(ticker["last"])
+    except Exception as e:
+        return await ctx.send(f"⚠️ Couldn’t fetch price for `{pair}`: {e}")
+
+    embed = discord.Embed(
+        title=f"💵 {pair.upper()}",
+        description=f"**{last:,.0f} IDR**" if pair.endswith("_idr") else f"**{last:,.8f}**",
         color=0x2ECC71
     )
+    if "high" in ticker and "low" in ticker:
+        embed.add_field(name="24h High", value=f"{float(ticker['high']):,.0f}", inline=True)
+        embed.add_field(name="24h Low", value=f"{float(ticker['low']):,.0f}", inline=True)
+    source = "live stream" if stream.is_live() else "market snapshot"
+    age = snapshot.age(pair)
+    embed.set_footer(text=f"Source: {source}" + (f" · {age:.0f}s old" if age != float("inf") else ""))
+    await ctx.send(embed=embed)
 
-    # Limit to first 10 pairs (pagination comes next!)
-    for pair in all_pairs[:10]:
-        symbol, price = fetch_price(pair)
-        if price:
-            embed.add_field(
-                name=symbol.upper(),
-                value=f"Rp {price:,.0f}" if "idr" in pair else f"${price:,.2f}",
-                inline=True
-            )
+async def build_analysis(pair: str, seconds_ahead: float) -> dict:
+    """
+    Everything `!analyze` shows for `pair` with the prediction projected
+    `seconds_ahead`. Results are shared through analysis_cache, so nothing
+    here may depend on the caller.
+    """
+    if not await is_listed(pair):
+        raise ValueError(f"`{pair}` is not listed on Indodax.")
+    coin = pair.split("_")[0]
+    client = dex_client
+
+    # ---- News sentiment ----
+    articles = await asyncio.to_thread(fetch_crypto_news, 10)
+    if not articles:
+        raise RuntimeError(f"Couldn’t fetch news for `{coin}` analysis.")
+
+    pos_words = ["surge", "gain", "rally", "bull", "record", "up", "boost", "optimistic", "breakout", "institutional", "ETF", "upgrade", "partnership"]
+    neg_words = ["drop", "dip", "slump", "bear", "decline", "down", "crash", "pessimistic", "hack", "ban", "probe", "lawsuit", "de-list"]
+    pos_count = neg_count = 0
+    for art in articles:
+        title = (art.get("title") or "").lower()
+        pos_count += sum(1 for w in pos_words if w in title)
+        neg_count += sum(1 for w in neg_words if w in title)
+    news_strength = "Bullish" if pos_count > neg_count else "Bearish" if neg_count > pos_count else "Neutral"
+
+    # ---- Market trades ----
+    # Read from the local trade tape; if the recorder hasn't kept this pair
+    # current, fetch only the trades newer than the tape first.
+    tape.touch(pair)
+    if not tape.is_fresh(pair):
+        try:
+            new = await client.get_trades_since(pair, tape.last_tid(pair))  # [{date, type, price, amount, tid}]
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch market data for `{coin}`: {e}")
+        await asyncio.to_thread(tape.append, pair, new)
+
+    cols = tape.load(pair, since=time.time() - ANALYZE_LOOKBACK)
+    if cols is None or len(cols["date"]) < MIN_TRADES:
+        cols = tape.tail(pair, MIN_TRADES)
+    if cols is None:
+        raise RuntimeError(f"No trades returned for `{pair}`.")
+
+    trades_arr = from_columns(cols)
+
+    # ---- Current ticker ----
+    try:
+        ticker = await client.get_ticker(pair)
+        current_price = float(ticker["ticker"]["last"])
+    except Exception:
+        current_price = None
+
+    # ---- Order book ----
+    book = None
+    try:
+        book = await books.get(client, pair)
+    except Exception as e:
+        print(f"[Analyze] Order book unavailable for {pair}: {e}")
+    if book is not None and book.mid:
+        depth = book.cumulative_depth((1.0, 5.0))
+        bid_depth_1, ask_depth_1 = float(depth["bids"][0]), float(depth["asks"][0])
+        imbalance = book.imbalance(1.0)
+        spread_pct = book.spread_pct()
+        support_wall, resistance_wall = book.walls()
+    else:
+        bid_depth_1 = ask_depth_1 = 0.0
+        imbalance = 0.0
+        spread_pct = None
+        support_wall = resistance_wall = None
+
+    # ---- Order flow, momentum, SMA trend, volatility, range, 30m acceleration ----
+    # Incremental SMA/volatility/range/slope, used when it is caught up with the tape.
+    # The tape feeds it from whichever thread appends, so read it under its lock.
+    with indicators.lock:
+        state = indicators.get(pair, tape)
+        if state is not None and state.last_tid == int(cols["tid"][-1]):
+            # Indicator reads are O(1); the remaining passes are too small to ship out
+            stats = analyze_trades(trades_arr, seconds_ahead, current_price, state=state)
         else:
-            embed.add_field(
-                name=symbol.upper(),
-                value="❌ Error fetching price",
-                inline=True
-            )
+            state = None
+    if state is None:
+        stats = await compute.run(analyze_trades, trades_arr, seconds_ahead, current_price)
+    # The rest of `stats` is returned as is for the embed
+    n_trades = stats["n_trades"]
+    avg_buy_size, avg_sell_size = stats["avg_buy_size"], stats["avg_sell_size"]
+    flow_ratio, pct_per_hour = stats["flow_ratio"], stats["pct_per_hour"]
+    trend_state, volatility_pct = stats["trend_state"], stats["volatility_pct"]
+    rng_low, range_pos_pct = stats["range_low"], stats["range_pos_pct"]
+
+    # ---- Scoring & confidence ----
+    score = 0
+    score += 1 if news_strength == "Bullish" else -1 if news_strength == "Bearish" else 0
+    score += 1 if flow_ratio > 1.1 else -1 if flow_ratio < 0.9 else 0
+    score += 1 if avg_buy_size > avg_sell_size * 1.1 else -1 if avg_buy_size * 1.1 < avg_sell_size else 0
+    score += 1 if pct_per_hour > 1.0 else -1 if pct_per_hour < -1.0 else 0
+    score += 1 if trend_state == "Uptrend" else -1 if trend_state == "Downtrend" else 0
+    # Range posture: buying low in range or selling high in range is favorable
+    if range_pos_pct <= 30.0:
+        score += 1  # near support
+    elif range_pos_pct >= 70.0:
+        score -= 1  # near resistance
+    # Resting liquidity near mid: heavy bids support the price, heavy asks cap it
+    score += 1 if imbalance >= 0.2 else -1 if imbalance <= -0.2 else 0
+
+    # Confidence weighting
+    confidence = 50
+    confidence += 10 if news_strength != "Neutral" else 0
+    confidence += 10 if abs(pct_per_hour) >= 1.0 else 0
+    confidence += 10 if abs(flow_ratio - 1.0) >= 0.2 else 0
+    confidence -= 10 if volatility_pct >= 5.0 else 0
+    confidence -= 10 if n_trades < 150 else 0
+    confidence = max(5, min(95, confidence))
+
+    # Final advice
+    if score >= 3:
+        advice, color = "📈 Strong Buy", 0x2ECC71
+    elif score == 2:
+        advice, color = "✅ Buy", 0x2ECC71
+    elif score == 1 or score == 0:
+        advice, color = "🤔 Hold", 0xF1C40F
+    elif score == -1:
+        advice, color = "⚠️ Sell", 0xE74C3C
+    else:
+        advice, color = "🚨 Strong Sell", 0xE74C3C
+
+    # ---- Entry/Stoploss (exit depends on the exact horizon; set on render) ----
+    # Prefer the largest resting bid / ask walls; fall back to the trade range
+    entry_price = support_wall or rng_low  # Support
+    stoploss_price = entry_price * 0.97 if entry_price else None  # 3% below support
+
+    return {
+        "seconds_ahead": seconds_ahead,
+        "stats": stats,
+        "news_strength": news_strength, "pos_count": pos_count, "neg_count": neg_count,
+        "top_titles": [(a.get("title") or "")[:120] for a in articles[:3]],
+        "has_book": book is not None and bool(book.mid),
+        "bid_depth_1": bid_depth_1, "ask_depth_1": ask_depth_1,
+        "imbalance": imbalance, "spread_pct": spread_pct, "resistance_wall": resistance_wall,
+        "score": score, "confidence": confidence, "advice": advice, "color": color,
+        "entry_price": entry_price, "stoploss_price": stoploss_price,
+    }
 
-    await ctx.send(embed=paginator.make_embed(), view=paginator)
 
 # Analyze Command
 # This command analyzes news sentiment and market activity to give buy/sell advice
@@ -497,9 +900,6 @@ async def crypto_prices(ctx):
 @maintenance_check()
 @with_typing
 async def analyze(ctx, coin: str, *timeframe):
-    import numpy as np
-    import time as _time
-
     def fmt_pct(x, decimals=2):
         try:
             return f"{x:.{decimals}f}%"
@@ -519,7 +919,6 @@ async def analyze(ctx, coin: str, *timeframe):
     # ---- Parse inputs ----
     coin = coin.lower().strip()
     pair = f"{coin}_idr"
-    client = IndodaxClient()
 
     if not timeframe:  
         # Default to 1 hour
@@ -563,161 +962,40 @@ async def analyze(ctx, coin: str, *timeframe):
         else:
             horizon_label = f"{time_value} hour{'s' if time_value > 1 else ''}"
 
-    # ---- News sentiment ----
-    articles = fetch_crypto_news(10)
-    if not articles:
-        return await ctx.send(f"⚠️ Couldn’t fetch news for `{coin}` analysis.")
-
-    pos_words = ["surge", "gain", "rally", "bull", "record", "up", "boost", "optimistic", "breakout", "institutional", "ETF", "upgrade", "partnership"]
-    neg_words = ["drop", "dip", "slump", "bear", "decline", "down", "crash", "pessimistic", "hack", "ban", "probe", "lawsuit", "de-list"]
-    pos_count = neg_count = 0
-    for art in articles:
-        title = (art.get("title") or "").lower()
-        pos_count += sum(1 for w in pos_words if w in title)
-        neg_count += sum(1 for w in neg_words if w in title)
-    news_strength = "Bullish" if pos_count > neg_count else "Bearish" if neg_count > pos_count else "Neutral"
+    if not await is_listed(pair):
+        return await ctx.send(f"⚠️ `{coin.upper()}` is not listed on Indodax. Try `!pairs`.")
 
-    # ---- Market trades ----
+    # ---- Cached analysis (shared by everyone asking about this pair/horizon) ----
     try:
-        trades = client.get_trades(pair, 500)  # [{date, type, price, amount, total}]
+        result, cache_age = await analysis_cache.get(pair, seconds_ahead, build_analysis)
     except Exception as e:
-        return await ctx.send(f"⚠️ Failed to fetch market data for `{coin}`: {e}")
-
-    if not trades:
-        return await ctx.send(f"No trades returned for `{pair}`.")
-
-    # Ensure chronological order
-    trades = sorted(trades, key=lambda t: float(t["date"]))
-
-    # Extract arrays
-    times = np.array([float(t["date"]) for t in trades], dtype=float)
-    prices = np.array([float(t["price"]) for t in trades], dtype=float)
-    amounts = np.array([float(t["amount"]) for t in trades], dtype=float)
-    types = [t["type"] for t in trades]
-
-    # Side splits
-    buy_mask = np.array([tp == "buy" for tp in types])
-    sell_mask = ~buy_mask
-
-    buy_count = int(buy_mask.sum())
-    sell_count = int(sell_mask.sum())
-    buy_vol = float(amounts[buy_mask].sum()) if buy_count else 0.0
-    sell_vol = float(amounts[sell_mask].sum()) if sell_count else 0.0
-    avg_buy_size = buy_vol / buy_count if buy_count else 0.0
-    avg_sell_size = sell_vol / sell_count if sell_count else 0.0
-    flow_ratio = safe_ratio(buy_count, sell_count)  # >1 favors buyers
-
-    # ---- Current ticker ----
-    try:
-        ticker = client.get_ticker(pair)
-        current_price = float(ticker["ticker"]["last"])
-    except Exception:
-        current_price = prices[-1] if len(prices) else None
-
-    # ---- Momentum (slope) & prediction ----
-    predicted_price = None
-    price_trend = None
-    try:
-        t0 = times.min()
-        t_rel = times - t0  # seconds from first trade
-        slope, intercept = np.polyfit(t_rel, prices, 1)  # price per second
-        future_t = (t_rel.max() + seconds_ahead)
-        predicted_price = float(slope * future_t + intercept)
-
-        if current_price:
-            # Convert slope to % per hour
-            pct_per_hour = (slope * 3600.0) / current_price * 100.0
-            if predicted_price > current_price * 1.02:
-                price_trend = "Expected Rise"
-            elif predicted_price < current_price * 0.98:
-                price_trend = "Expected Drop"
-            else:
-                price_trend = "Flat"
-        else:
-            pct_per_hour = 0.0
-    except Exception:
-        predicted_price = None
-        pct_per_hour = 0.0
-        price_trend = None
-
-    # ---- Trend (SMA crossover) ----
-    sma_short = np.mean(prices[-50:]) if len(prices) >= 50 else np.mean(prices)
-    sma_long = np.mean(prices[-200:]) if len(prices) >= 200 else np.mean(prices)
-    trend_state = "Uptrend" if sma_short >= sma_long else "Downtrend" if sma_short < sma_long else "Sideways"
-
-    # ---- Volatility & range posture ----
-    lookback = prices[-200:] if len(prices) >= 200 else prices
-    volatility_pct = np.std(lookback) / np.mean(lookback) * 100.0 if len(lookback) > 1 else 0.0
-    recent = prices[-100:] if len(prices) >= 100 else prices
-    rng_low, rng_high = float(np.min(recent)), float(np.max(recent))
-    if current_price:
-        range_pos_pct = (current_price - rng_low) / (rng_high - rng_low) * 100.0 if rng_high > rng_low else 50.0
-    else:
-        range_pos_pct = 50.0
-
-    # ---- Recent window comparison (acceleration) ----
-    now_ts = times.max()
-    recent_window = 30 * 60  # 30 minutes
-    prev_cut = now_ts - 2 * recent_window
-    mid_cut = now_ts - recent_window
-
-    prev_mask = (times >= prev_cut) & (times < mid_cut)
-    recent_mask = (times >= mid_cut)
-
-    def side_stats(mask):
-        if not mask.any():
-            return 0, 0.0
-        sub_types = np.array(types)[mask]
-        sub_amounts = amounts[mask]
-        b = float(sub_amounts[sub_types == "buy"].sum())
-        s = float(sub_amounts[sub_types == "sell"].sum())
-        return b, s
-
-    recent_b_vol, recent_s_vol = side_stats(recent_mask)
-    prev_b_vol, prev_s_vol = side_stats(prev_mask)
-    buy_accel = pct_change(recent_b_vol, prev_b_vol) if prev_b_vol else (100.0 if recent_b_vol > 0 else 0.0)
-    sell_accel = pct_change(recent_s_vol, prev_s_vol) if prev_s_vol else (100.0 if recent_s_vol > 0 else 0.0)
-
-    # ---- Scoring & confidence ----
-    score = 0
-    score += 1 if news_strength == "Bullish" else -1 if news_strength == "Bearish" else 0
-    score += 1 if flow_ratio > 1.1 else -1 if flow_ratio < 0.9 else 0
-    score += 1 if avg_buy_size > avg_sell_size * 1.1 else -1 if avg_buy_size * 1.1 < avg_sell_size else 0
-    score += 1 if pct_per_hour > 1.0 else -1 if pct_per_hour < -1.0 else 0
-    score += 1 if trend_state == "Uptrend" else -1 if trend_state == "Downtrend" else 0
-    # Range posture: buying low in range or selling high in range is favorable
-    if range_pos_pct <= 30.0:
-        score += 1  # near support
-    elif range_pos_pct >= 70.0:
-        score -= 1  # near resistance
-
-    # Confidence weighting
-    confidence = 50
-    confidence += 10 if news_strength != "Neutral" else 0
-    confidence += 10 if abs(pct_per_hour) >= 1.0 else 0
-    confidence += 10 if abs(flow_ratio - 1.0) >= 0.2 else 0
-    confidence -= 10 if volatility_pct >= 5.0 else 0
-    confidence -= 10 if len(trades) < 150 else 0
-    confidence = max(5, min(95, confidence))
-
-    # Final advice
-    if score >= 3:
-        advice, color = "📈 Strong Buy", 0x2ECC71
-    elif score == 2:
-        advice, color = "✅ Buy", 0x2ECC71
-    elif score == 1 or score == 0:
-        advice, color = "🤔 Hold", 0xF1C40F
-    elif score == -1:
-        advice, color = "⚠️ Sell", 0xE74C3C
-    else:
-        advice, color = "🚨 Strong Sell", 0xE74C3C
-
-        # ---- Entry/Exit/Stoploss ----
-    entry_price = rng_low  # Support
-    exit_price = rng_high  # Resistance
+        return await ctx.send(f"⚠️ {e}")
+
+    stats = result["stats"]
+    n_trades, current_price = stats["n_trades"], stats["current_price"]
+    buy_count, sell_count = stats["buy_count"], stats["sell_count"]
+    avg_buy_size, avg_sell_size = stats["avg_buy_size"], stats["avg_sell_size"]
+    pct_per_hour = stats["pct_per_hour"]
+    sma_short, sma_long, trend_state = stats["sma_short"], stats["sma_long"], stats["trend_state"]
+    volatility_pct = stats["volatility_pct"]
+    rng_low, rng_high, range_pos_pct = stats["range_low"], stats["range_high"], stats["range_pos_pct"]
+    prev_b_vol, prev_s_vol = stats["prev_b_vol"], stats["prev_s_vol"]
+    buy_accel, sell_accel = stats["buy_accel"], stats["sell_accel"]
+    news_strength, pos_count, neg_count = result["news_strength"], result["pos_count"], result["neg_count"]
+    bid_depth_1, ask_depth_1 = result["bid_depth_1"], result["ask_depth_1"]
+    imbalance, spread_pct = result["imbalance"], result["spread_pct"]
+    confidence, advice, color = result["confidence"], result["advice"], result["color"]
+    entry_price, stoploss_price = result["entry_price"], result["stoploss_price"]
+
+    # The fit is linear, so the cached bucket's prediction shifts exactly to this horizon
+    predicted_price = stats["predicted_price"]
+    if predicted_price is not None:
+        predicted_price += stats["slope"] * (seconds_ahead - result["seconds_ahead"])
+
+    # ---- Exit ----
+    exit_price = result["resistance_wall"] or rng_high  # Resistance
     if predicted_price and predicted_price > current_price:
         exit_price = predicted_price  # use prediction if higher
-    stoploss_price = rng_low * 0.97 if rng_low else None  # 3% below support
 
     # ---- Reasoning text ----
     bullets = []
@@ -734,6 +1012,10 @@ async def analyze(ctx, coin: str, *timeframe):
     if current_price is not None:
         bullets.append(f"📦 **Range Position (last 100 trades):** {fmt_pct(range_pos_pct)} of range "
                        f"[{rng_low:,.0f}–{rng_high:,.0f}] (lower=near support).")
+    if result["has_book"]:
+        spread_txt = fmt_pct(spread_pct, 3) if spread_pct is not None else "—"
+        bullets.append(f"📚 **Order Book (±1%):** {bid_depth_1:,.0f} IDR bids vs {ask_depth_1:,.0f} IDR asks "
+                       f"(imbalance {imbalance:+.2f}; spread {spread_txt}).")
     if predicted_price and current_price:
         ppct = pct_change(predicted_price, current_price)
         bullets.append(f"🔮 **Prediction ({horizon_label}):** {predicted_price:,.2f} IDR "
@@ -764,14 +1046,79 @@ async def analyze(ctx, coin: str, *timeframe):
         embed.add_field(name="🛑 Stoploss", value=f"{stoploss_price:,.2f} IDR", inline=True)
 
     # Top headlines
-    top_titles = "\n".join(f"• {(a.get('title') or '')[:120]}" for a in articles[:3])
+    top_titles = "\n".join(f"• {title}" for title in result["top_titles"])
     if top_titles.strip():
         embed.add_field(name="📰 Top News Headlines", value=top_titles, inline=False)
 
-    embed.set_footer(text=f"Data: 10 news items & {len(trades)} trades | Horizon: {horizon_label}")
+    embed.set_footer(
+        text=f"Data: 10 news items & {n_trades} trades | Horizon: {horizon_label}"
+        + (f" | Cached {cache_age:.0f}s ago" if cache_age >= 1 else "")
+    )
 
     await ctx.send(embed=embed)
 
+# Scan Command
+# Ranks every IDR pair by analyze's trade signals in one pass over local data
+@bot.command(name="scan", help="!scan [count] [weak] — rank all IDR pairs by analyze's trade signals")
+@maintenance_check()
+@with_typing
+async def scan_command(ctx, count: int = 10, mode: str = None):
+    count = max(1, min(count, 25))
+    weakest = mode is not None and mode.lower() in ("weak", "weakest", "bottom")
+    pairs = [p for p in PAIRS if p.endswith("_idr")]
+
+    # Refresh only pairs not fetched within SCAN_MAX_AGE, through the rate-limited
+    # scheduler. They are not touched: keeping every pair on the recorder would
+    # poll ~100 pairs per RECORD_INTERVAL and exceed the public rate limit.
+    stale = [p for p in pairs if time.time() - tape.polled_at(p) > SCAN_MAX_AGE]
+    if stale:
+        fetched = await asyncio.gather(
+            *(dex_client.get_trades_since(p, tape.last_tid(p), priority=POLLING) for p in stale),
+            return_exceptions=True
+        )
+        for pair, trades in zip(stale, fetched):
+            if isinstance(trades, Exception):
+                print(f"[Scan] Refresh of {pair} failed: {trades}")
+            else:
+                await asyncio.to_thread(tape.append, pair, trades)
+    # Old trade windows compared with the current price rank nothing: leave them out
+    skipped = [p for p in pairs if time.time() - tape.polled_at(p) > SCAN_MAX_AGE]
+    pairs = [p for p in pairs if p not in skipped]
+    oldest = max((time.time() - tape.polled_at(p) for p in pairs), default=0.0)
+
+    # Tape reads in a thread, scoring in a worker process: the loop never blocks
+    started = time.perf_counter()
+    try:
+        matrix = await asyncio.to_thread(load_matrix, pairs, tape)
+        top = await compute.run(top_pairs, matrix, last_prices(pairs, snapshot), count, weakest)
+    except Exception as e:
+        return await ctx.send(f"⚠️ Scan failed: {e}")
+    results = [{"pair": pairs[i], **signals} for i, signals in top]
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if not results:
+        return await ctx.send("⚠️ Not enough recorded trades to rank any pair yet. Try again shortly.")
+
+    lines = []
+    for i, r in enumerate(results, 1):
+        coin = r["pair"].split("_")[0].upper()
+        lines.append(
+            f"**{i}. {coin}** · score `{r['score']:+d}` · {r['last']:,.0f} IDR\n"
+            f"  momentum {r['pct_per_hour']:+.2f}%/h · flow {r['flow_ratio']:.2f} · "
+            f"range {r['range_pos_pct']:.0f}% · vol {r['volatility_pct']:.2f}%"
+        )
+    embed = discord.Embed(
+        title="📉 Weakest Pairs" if weakest else "📈 Strongest Pairs",
+        description="\n".join(lines),
+        color=0xE74C3C if weakest else 0x2ECC71
+    )
+    embed.set_footer(
+        text=f"{len(pairs)} pairs scanned in {elapsed_ms:.0f} ms · last {SCAN_TRADES} trades each · "
+             f"data up to {oldest / 60:.0f} min old"
+             + (f" · {len(skipped)} pairs left out (refresh failed)" if skipped else "")
+             + " · news and order books not included; use !analyze <coin> for the full picture"
+    )
+    await ctx.send(embed=embed)
+
 # Market Command
 @bot.command(
     name="market",
@@ -789,13 +1136,20 @@ async def market(ctx, coin: str, limit: int = 500):
         return await ctx.send(f"⚠️ Limit must be between 1 and {MAX_FETCH}.")
 
     pair   = f"{coin}_idr"
-    client = IndodaxClient()
-
-    # 1) Fetch trades
-    try:
-        trades = client.get_trades(pair, limit)
-    except Exception as e:
-        return await ctx.send(f"⚠️ Failed to fetch trades for `{pair}`: {e}")
+    client = dex_client
+    if not await is_listed(pair):
+        return await ctx.send(f"⚠️ `{coin.upper()}` is not listed on Indodax. Try `!pairs`.")
+
+    # 1) Fetch trades: bring the local tape up to date with only the new
+    #    trades (skipped when the recorder already has it current), then read it
+    tape.touch(pair)
+    if not tape.is_fresh(pair):
+        try:
+            new = await client.get_trades_since(pair, tape.last_tid(pair))
+        except Exception as e:
+            return await ctx.send(f"⚠️ Failed to fetch trades for `{pair}`: {e}")
+        await asyncio.to_thread(tape.append, pair, new)
+    trades = tape.recent_trades(pair, limit)
 
     if not trades:
         return await ctx.send(f"No trades returned for `{pair}`.")
@@ -899,13 +1253,9 @@ async def setkeys(ctx, api_key: str = None, api_secret: str = None):
             await ctx.send(f"{ctx.author.mention} I couldn't DM you. Please enable Direct Messages.")
         return
 
-    # Save credentials securely
-    creds = load_credentials()
-    creds[str(ctx.author.id)] = {
-        "api_key": api_key,
-        "api_secret": api_secret
-    }
-    save_credentials(creds)
+    # Save credentials securely; the next call builds a client with the new keys
+    set_credentials(ctx.author.id, api_key, api_secret)
+    clients.invalidate(ctx.author.id)
 
     # Confirmation embed
     embed = discord.Embed(
@@ -919,27 +1269,19 @@ async def setkeys(ctx, api_key: str = None, api_secret: str = None):
 @maintenance_check()
 @with_typing
 async def balance(ctx):
-    # 1) Load user creds
-    creds   = load_credentials()
-    user_id = str(ctx.author.id)
-    if user_id not in creds:
+    # 1-2) User's cached client (built from their stored keys on first use)
+    if not clients.has(ctx.author.id):
         return await ctx.send(
             "❌ You haven’t set your Indodax keys yet.\n"
             "Please DM me: `!setkeys YOUR_API_KEY YOUR_API_SECRET`"
         )
-
-    # 2) Instantiate client with user’s keys
-    data   = creds[user_id]
-    client = IndodaxClient(api_key=data["api_key"], api_secret=data["api_secret"])
-    info         = client.get_account_info()["return"]
-    free_bal     = info["balance"]
-    hold_bal     = info["balance_hold"]
-
+    client = clients.get(ctx.author.id)
 
     # 3) Fetch account info & extract balances
     try:
-        info     = client.get_account_info()
-        balances = info["return"]["balance"]
+        info     = (await client.get_account_info())["return"]
+        free_bal = info["balance"]
+        hold_bal = info["balance_hold"]
     except Exception as e:
         return await ctx.send(f"⚠️ Failed to fetch balances: {e}")
     all_coins = {}
@@ -1000,8 +1342,7 @@ async def set_alert(ctx, symbol: str, change: str):
                 ))
 
             try:
-                # Convert doge_idr → dogeidr for Indodax
-                current_price = get_last_price(pair_key.replace("_", ""))
+                current_price = await dex_client.get_last_price(pair_key)
             except Exception as e:
                 return await ctx.send(embed=discord.Embed(
                     title="❌ Price Fetch Error",
@@ -1030,14 +1371,12 @@ async def set_alert(ctx, symbol: str, change: str):
         ))
 
     # Persist the alert
-    alerts = load_alerts()
-    user_alerts = alerts.setdefault(user_id, [])
-    user_alerts.append({
+    add_alert(user_id, {
         "pair":    pair_key,
         "target":  target_price,
-        "percent": percent_val  # None if absolute
+        "percent": percent_val,  # None if absolute
+        "direction": BELOW if percent_val is not None and percent_val < 0 else ABOVE
     })
-    save_alerts(alerts)
 
     # Confirmation
     desc = f"**{pair_key}** at `{target_price:,.2f}` IDR"
@@ -1058,10 +1397,9 @@ async def set_alert(ctx, symbol: str, change: str):
 @with_typing
 async def alert_list(ctx):
     
-    alerts = load_alerts()               # your JSON/YAML/DB loader
-    user_id = str(ctx.author.id)
+    user_alerts = get_user_alerts(ctx.author.id)
     
-    if user_id not in alerts or not alerts[user_id]:
+    if not user_alerts:
         return await ctx.send(embed=discord.Embed(
             title="🔔 You Have No Alerts",
             description="Use `!alert <symbol> +10%` or `!alert <symbol> PRICE` to add one.",
@@ -1069,7 +1407,7 @@ async def alert_list(ctx):
         ))
     
     lines = []
-    for idx, entry in enumerate(alerts[user_id], start=1):
+    for idx, entry in enumerate(user_alerts, start=1):
         pair    = entry["pair"]
         target  = entry["target"]
         percent = entry.get("percent")
@@ -1078,7 +1416,9 @@ async def alert_list(ctx):
         price_str   = f"{target:,.2f} IDR"
         percent_str = f" ({percent:+.2f}%)" if percent is not None else ""
         
-        lines.append(f"{idx}. **{pair}** at \n`{price_str}{percent_str}`")
+        side_str    = "≤ " if entry.get("direction") == BELOW else ""
+
+        lines.append(f"{idx}. **{pair}** at \n`{side_str}{price_str}{percent_str}`")
     
     embed = discord.Embed(
         title="🔔 Your Price Alerts",
@@ -1092,13 +1432,13 @@ async def alert_list(ctx):
 @with_typing
 async def remove_alert(ctx, index: int):
     user_id = str(ctx.author.id)
-    alerts = load_alerts()
+    user_alerts = get_user_alerts(user_id)
 
-    if user_id not in alerts or index < 1 or index > len(alerts[user_id]):
+    if index < 1 or index > len(user_alerts):
         return await ctx.send("❌ Invalid alert index.")
 
-    removed = alerts[user_id].pop(index - 1)
-    save_alerts(alerts)
+    removed = user_alerts[index - 1]
+    remove_alerts([(user_id, removed)])
 
     await ctx.send(f"🗑️ Removed alert for `{removed['pair']}` target at `{removed['target']}` IDR")
 
@@ -1125,27 +1465,24 @@ async def list_pairs(ctx):
 @maintenance_check()
 @with_typing
 async def buy_command(ctx, coin: str, price: float, amount: float):
-    client = IndodaxClient()
+    client = dex_client
     pair = f"{coin.lower()}_idr"
     total_idr = price * amount
 
     try:
-        order = client.create_buy_order(pair, price, amount)
+        order = await client.create_buy_order(pair, price, amount)
         order_id = order['return']['order_id']
 
         # Store order locally
-        data = load_pending_orders()
-        user_orders = data.get(str(ctx.author.id), [])
-        user_orders.append({
+        add_pending_order(ctx.author.id, {
             "order_id": order_id,
             "pair": pair,
             "price": price,
             "amount": amount,
             "total": total_idr,
-            "status": "pending"
+            "status": "pending",
+            "account": client.account
         })
-        data[str(ctx.author.id)] = user_orders
-        save_pending_orders(data)
 
         # Send confirmation embed
         embed = discord.Embed(
@@ -1179,10 +1516,8 @@ async def buy_command(ctx, coin: str, price: float, amount: float):
 @maintenance_check()
 @with_typing
 async def buy_list_command(ctx):
-    data = load_pending_orders()
-
-    # If file is empty or user has no orders
-    orders = data.get(str(ctx.author.id), [])
+    # If the user has no orders
+    orders = get_user_orders(ctx.author.id)
     if not orders:
         embed = discord.Embed(
             title="📋 Pending Buy Orders",
@@ -1210,15 +1545,8 @@ async def buy_list_command(ctx):
 @maintenance_check()
 @with_typing
 async def cancel_buy_command(ctx, order_id: str):
-    data = load_pending_orders()
-    user_orders = data.get(str(ctx.author.id), [])
-    
     # Find the order to cancel
-    order_to_cancel = None
-    for o in user_orders:
-        if str(o["order_id"]) == str(order_id):
-            order_to_cancel = o
-            break
+    order_to_cancel = get_user_order(ctx.author.id, order_id)
 
     if not order_to_cancel:
         embed = discord.Embed(
@@ -1229,14 +1557,22 @@ async def cancel_buy_command(ctx, order_id: str):
         await ctx.send(embed=embed)
         return
 
-    client = IndodaxClient()
+    # Cancel with the key that placed the order
+    client = client_for_account(ctx.author.id, order_to_cancel["account"])
+    if client is None:
+        embed = discord.Embed(
+            title="❌ Order Not Found",
+            description=f"Order {order_id} was placed with API keys that are no longer stored.",
+            color=0xE74C3C
+        )
+        await ctx.send(embed=embed)
+        return
     try:
         # Cancel on Indodax using the pair from the order
-        client.cancel_order(order_to_cancel["pair"], order_id, "buy")
+        await client.cancel_order(order_to_cancel["pair"], order_id, "buy")
 
-        # Remove from local pending_orders.json
-        data[str(ctx.author.id)] = [o for o in user_orders if str(o["order_id"]) != str(order_id)]
-        save_pending_orders(data)
+        # Remove from local pending orders
+        remove_pending_order_by_user(ctx.author.id, order_id)
 
         embed = discord.Embed(
             title="✅ Buy Order Cancelled",
@@ -1257,28 +1593,25 @@ async def cancel_buy_command(ctx, order_id: str):
 @maintenance_check()
 @with_typing
 async def sell_command(ctx, coin: str, price: float, amount: float):
-    client = IndodaxClient()
+    client = dex_client
     pair = f"{coin.lower()}_idr"
     total_idr = price * amount
 
     try:
-        order = client.create_sell_order(pair, price, amount)
+        order = await client.create_sell_order(pair, price, amount)
         order_id = order['return']['order_id']
 
         # Store order locally
-        data = load_pending_orders()
-        user_orders = data.get(str(ctx.author.id), [])
-        user_orders.append({
+        add_pending_order(ctx.author.id, {
             "order_id": order_id,
             "pair": pair,
             "price": price,
             "amount": amount,
             "total": total_idr,
             "status": "pending",
-            "type": "sell"  # track type
+            "type": "sell",  # track type
+            "account": client.account
         })
-        data[str(ctx.author.id)] = user_orders
-        save_pending_orders(data)
 
         # Confirmation embed
         embed = discord.Embed(
@@ -1311,8 +1644,7 @@ async def sell_command(ctx, coin: str, price: float, amount: float):
 @maintenance_check()
 @with_typing
 async def sell_list_command(ctx):
-    data = load_pending_orders()
-    orders = [o for o in data.get(str(ctx.author.id), []) if o.get("type") == "sell"]
+    orders = get_user_orders(ctx.author.id, "sell")
 
     if not orders:
         embed = discord.Embed(
@@ -1339,15 +1671,8 @@ async def sell_list_command(ctx):
 @maintenance_check()
 @with_typing
 async def cancel_sell_command(ctx, order_id: str):
-    data = load_pending_orders()
-    user_orders = data.get(str(ctx.author.id), [])
-    
     # Find sell order
-    order_to_cancel = None
-    for o in user_orders:
-        if str(o["order_id"]) == str(order_id) and o.get("type") == "sell":
-            order_to_cancel = o
-            break
+    order_to_cancel = get_user_order(ctx.author.id, order_id, "sell")
 
     if not order_to_cancel:
         embed = discord.Embed(
@@ -1358,13 +1683,21 @@ async def cancel_sell_command(ctx, order_id: str):
         await ctx.send(embed=embed)
         return
 
-    client = IndodaxClient()
+    # Cancel with the key that placed the order
+    client = client_for_account(ctx.author.id, order_to_cancel["account"])
+    if client is None:
+        embed = discord.Embed(
+            title="❌ Order Not Found",
+            description=f"Order {order_id} was placed with API keys that are no longer stored.",
+            color=0xE74C3C
+        )
+        await ctx.send(embed=embed)
+        return
     try:
-        client.cancel_order(order_to_cancel["pair"], order_id, "sell")
+        await client.cancel_order(order_to_cancel["pair"], order_id, "sell")
 
         # Remove from local pending orders
-        data[str(ctx.author.id)] = [o for o in user_orders if str(o["order_id"]) != str(order_id)]
-        save_pending_orders(data)
+        remove_pending_order_by_user(ctx.author.id, order_id)
 
         embed = discord.Embed(
             title="✅ Sell Order Cancelled",
@@ -1381,13 +1714,39 @@ async def cancel_sell_command(ctx, order_id: str):
         )
         await ctx.send(embed=embed)
 
-@bot.command(name="auto_stoploss", help="!auto_stoploss <coin> <percent>")
+async def _arm_stop(ctx, entry: dict, current_price: float, mode: str = None) -> dict:
+    """
+    Persist and arm a stop. With mode "sell" the user's free balance of the
+    coin is sold automatically when it fires (re-read then, so never more
+    than is still free), so their client is built, the pair's precision
+    loaded and the connection warmed now rather than at trigger time.
+    """
+    if mode is not None and mode.lower() != "sell":
+        raise ValueError(f"Unknown mode `{mode}` (use `sell`).")
+    if mode:
+        client = clients.get(ctx.author.id)
+        amount = await client.get_balance(entry["coin"])
+        if amount <= 0:
+            raise ValueError(f"No free {entry['coin']} balance to sell.")
+        entry.update(auto=True, amount=amount)
+        await client.amount_decimals(entry["pair"])
+        await client.warm()
+
+    entry["id"] = add_stoploss(entry)
+    engine.add_stop(entry, current_price)
+    cadence.mark_due(entry["pair"])
+    return entry
+
+def _auto_note(entry: dict) -> str:
+    return f"\n⚡ Will sell {entry['amount']} {entry['coin']} automatically." if entry.get("auto") else ""
+
+@bot.command(name="auto_stoploss", help="!auto_stoploss <coin> <percent> [sell]")
 @maintenance_check()
 @with_typing
-async def auto_stoploss(ctx, coin: str, percent: float):
+async def auto_stoploss(ctx, coin: str, percent: float, mode: str = None):
     pair = f"{coin.lower()}_idr"
     try:
-        current_price = get_last_price(pair)
+        current_price = await dex_client.get_last_price(pair)
         stop_price = current_price * (1 - percent / 100.0)
 
         stoploss_entry = {
@@ -1398,41 +1757,90 @@ async def auto_stoploss(ctx, coin: str, percent: float):
             "user": ctx.author.id,
             "active": True
         }
-
-        # Save to pending_orders.json
-        try:
-            with open("pending_orders.json", "r+") as f:
-                data = json.load(f)
-                data.setdefault("stoploss", []).append(stoploss_entry)
-                f.seek(0)
-                json.dump(data, f, indent=2)
-        except FileNotFoundError:
-            with open("pending_orders.json", "w") as f:
-                json.dump({"stoploss": [stoploss_entry]}, f, indent=2)
+        stoploss_entry = await _arm_stop(ctx, stoploss_entry, current_price, mode)
 
         await ctx.send(
             f"🛑 Stoploss set for {coin.upper()} at {stop_price:,.0f} IDR "
-            f"({percent:.1f}% below current {current_price:,.0f})"
+            f"({percent:.1f}% below current {current_price:,.0f})" + _auto_note(stoploss_entry)
         )
     except Exception as e:
         await ctx.send(f"⚠️ Failed to set stoploss: {e}")
 
+@bot.command(name="trailing_stop", help="!trailing_stop <coin> <percent> [sell]")
+@maintenance_check()
+@with_typing
+async def trailing_stop(ctx, coin: str, percent: float, mode: str = None):
+    pair = f"{coin.lower()}_idr"
+    if not 0 < percent < 100:
+        return await ctx.send("❌ Trail percent must be between 0 and 100.")
+    try:
+        current_price = await dex_client.get_last_price(pair)
+        stop_price = current_price * (1 - percent / 100.0)
+
+        stoploss_entry = {
+            "coin": coin.upper(),
+            "pair": pair,
+            "stop_price": stop_price,
+            "percent": percent,
+            "trail": percent,
+            "hwm": current_price,
+            "user": ctx.author.id,
+            "active": True
+        }
+        stoploss_entry = await _arm_stop(ctx, stoploss_entry, current_price, mode)
+
+        await ctx.send(
+            f"🛑 Trailing stop set for {coin.upper()} {percent:.1f}% below its highest price "
+            f"(now {stop_price:,.0f} IDR, trailing {current_price:,.0f})" + _auto_note(stoploss_entry)
+        )
+    except Exception as e:
+        await ctx.send(f"⚠️ Failed to set trailing stop: {e}")
+
+@bot.command(name="take_profit", help="!take_profit <coin> <price|+percent> [sell]")
+@maintenance_check()
+@with_typing
+async def take_profit(ctx, coin: str, target: str, mode: str = None):
+    pair = f"{coin.lower()}_idr"
+    try:
+        current_price = await dex_client.get_last_price(pair)
+        if target.startswith("+"):
+            percent = float(target.rstrip("%"))
+            target_price = current_price * (1 + percent / 100.0)
+        else:
+            target_price = float(target.replace(",", ""))
+            percent = (target_price / current_price - 1) * 100
+        if target_price <= current_price:
+            return await ctx.send(f"❌ Target must be above the current price ({current_price:,.0f} IDR).")
+
+        stoploss_entry = {
+            "coin": coin.upper(),
+            "pair": pair,
+            "stop_price": target_price,
+            "percent": percent,
+            "direction": ABOVE,
+            "user": ctx.author.id,
+            "active": True
+        }
+        stoploss_entry = await _arm_stop(ctx, stoploss_entry, current_price, mode)
+
+        await ctx.send(
+            f"🎯 Take-profit set for {coin.upper()} at {target_price:,.0f} IDR "
+            f"({percent:.1f}% above current {current_price:,.0f})" + _auto_note(stoploss_entry)
+        )
+    except Exception as e:
+        await ctx.send(f"⚠️ Failed to set take-profit: {e}")
+
 @bot.command(
     name="trade_history",
     help="!trade_history <coin> [count] — Show your recent trades for a coin."
 )
 @with_typing
 async def trade_history(ctx, coin: str, count: int = 10):
-    client = IndodaxClient()
+    client = dex_client
     try:
         pair = f"{coin.lower()}_idr"
-        trades = client.get_trade_history(pair, count)
-
-        if "return" not in trades or "trades" not in trades["return"]:
-            await ctx.send(f"⚠️ No trade history found for {coin.upper()}.")
-            return
-
-        trade_list = trades["return"]["trades"]
+        # get_trade_history already unwraps and normalizes the trade list
+        trade_list = await client.get_trade_history(pair, count)
         if not trade_list:
             await ctx.send(f"⚠️ No trades found for {coin.upper()}.")
             return
@@ -1494,4 +1902,6 @@ async def trade_history(ctx, coin: str, count: int = 10):
         await ctx.send(f"❌ Error fetching trade history: {e}")
 
 if __name__ == "__main__":
+    # Warm the compute workers before the event loop starts
+    compute.start()
     bot.run(TOKEN)
@@ -0,0 +1,76 @@
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from indodax_api import AsyncIndodaxClient
+from credential_storage import get_credentials
+
+# Config may come from .env; don't rely on bot.py having loaded it before this import
+load_dotenv()
+MAX_CLIENTS = int(os.getenv("CLIENT_CACHE_SIZE", 256))
+IDLE_TTL = float(os.getenv("CLIENT_IDLE_TTL", 3600))   # seconds unused before a client is dropped
+
+
+class ClientRegistry:
+    """
+    One AsyncIndodaxClient per Discord user, built on first use from the
+    stored credentials. The client keeps its pre-keyed HMAC signer and all
+    clients share the module's keep-alive session, so a warm call does no
+    credential lookup, env read or key setup. Entries are evicted least
+    recently used beyond MAX_CLIENTS or after IDLE_TTL idle, and must be
+    invalidated when the user's keys change.
+    """
+
+    def __init__(self, max_clients: int = MAX_CLIENTS, idle_ttl: float = IDLE_TTL):
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self._clients = OrderedDict()   # user id -> (client, last used), oldest first
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0, "invalidated": 0}
+
+    def __len__(self):
+        return len(self._clients)
+
+    def get(self, user_id) -> AsyncIndodaxClient:
+        """The user's client; RuntimeError if they have not stored keys."""
+        user_id = str(user_id)
+        now = time.monotonic()
+        entry = self._clients.get(user_id)
+        if entry is not None:
+            self.stats["hits"] += 1
+            self._clients[user_id] = (entry[0], now)
+            self._clients.move_to_end(user_id)
+            return entry[0]
+
+        self.stats["misses"] += 1
+        creds = get_credentials(user_id)
+        if creds is None:
+            raise RuntimeError("No Indodax API keys stored. DM me `!setkeys YOUR_API_KEY YOUR_API_SECRET`.")
+        client = AsyncIndodaxClient(creds["api_key"], creds["api_secret"])
+        self._clients[user_id] = (client, now)
+        self._evict(now)
+        return client
+
+    def has(self, user_id) -> bool:
+        """Whether the user can get a client (cached or stored keys)."""
+        return str(user_id) in self._clients or get_credentials(user_id) is not None
+
+    def invalidate(self, user_id):
+        """Drop the cached client, e.g. after `!setkeys` replaced the keys."""
+        if self._clients.pop(str(user_id), None) is not None:
+            self.stats["invalidated"] += 1
+
+    def _evict(self, now: float):
+        while len(self._clients) > self.max_clients:
+            self._clients.popitem(last=False)
+            self.stats["evicted"] += 1
+        # Oldest first: stop at the first entry still in use
+        while self._clients:
+            user_id, (_, used) = next(iter(self._clients.items()))
+            if now - used < self.idle_ttl:
+                break
+            del self._clients[user_id]
+            self.stats["evicted"] += 1
+
+
+clients = ClientRegistry()
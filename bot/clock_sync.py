@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+SYNC_INTERVAL = 30 * 60      # seconds between routine resyncs
+RETRY_INTERVAL = 60          # seconds before retrying a failed sync
+DRIFT_TOLERANCE_MS = 250     # wall-clock step (NTP, suspend) that forces a resync
+SAMPLES_PER_SYNC = 3         # server_time round trips per sync; lowest RTT wins
+
+TIMESTAMP_ERRORS = ("timestamp", "nonce", "recvwindow")
+
+
+def is_timestamp_error(error: str) -> bool:
+    """True if a TAPI error message looks like a rejected request timestamp."""
+    error = (error or "").lower()
+    return any(word in error for word in TIMESTAMP_ERRORS)
+
+
+class ClockOffset:
+    """
+    Per-process estimate of (Indodax server time - local time) in milliseconds.
+
+    Each sample assumes the server stamped its reply half-way through the
+    round trip; of several samples the one with the smallest RTT is kept,
+    since it bounds the error tightest. Signed requests are then stamped
+    from the local clock plus the offset instead of asking the server first.
+    """
+
+    def __init__(self, sync_interval: float = SYNC_INTERVAL, drift_tolerance_ms: float = DRIFT_TOLERANCE_MS):
+        self.sync_interval = sync_interval
+        self.drift_tolerance_ms = drift_tolerance_ms
+        self.offset_ms = 0.0
+        self.rtt_ms = None
+        self.syncs = 0
+        self._next_sync = 0.0           # monotonic deadline for the next routine sync
+        self._wall_minus_mono = None    # detects wall-clock steps between syncs
+        self._thread_lock = threading.Lock()
+        self._async_lock = None
+
+    def now_ms(self) -> int:
+        """Current server time estimate in milliseconds."""
+        return int(time.time() * 1000 + self.offset_ms)
+
+    def invalidate(self):
+        """Force a resync before the next signed request (e.g. after a rejection)."""
+        self._next_sync = 0.0
+
+    def needs_sync(self) -> bool:
+        if time.monotonic() >= self._next_sync:
+            return True
+        # A stepped wall clock invalidates the offset even between routine syncs
+        drift = (time.time() - time.monotonic()) - self._wall_minus_mono
+        return abs(drift) * 1000 > self.drift_tolerance_ms
+
+    def _record(self, samples: list):
+        if not samples:
+            print("[Clock] Could not sample server time, keeping previous offset")
+            self._next_sync = time.monotonic() + RETRY_INTERVAL
+            self._wall_minus_mono = time.time() - time.monotonic()
+            return
+
+        self.rtt_ms, self.offset_ms = min(samples)
+        self.syncs += 1
+        self._next_sync = time.monotonic() + self.sync_interval
+        self._wall_minus_mono = time.time() - time.monotonic()
+
+    @staticmethod
+    def _sample(sent: float, server_ms: float, received: float) -> tuple:
+        """Return (rtt_ms, offset_ms) for one server_time round trip."""
+        if server_ms < 1e12:   # tolerate a seconds-resolution reply
+            server_ms *= 1000
+        midpoint_ms = (sent + received) / 2 * 1000
+        return (received - sent) * 1000, server_ms - midpoint_ms
+
+    def sync(self, fetch_server_ms):
+        """Resync from a blocking `fetch_server_ms()` callable."""
+        with self._thread_lock:
+            if not self.needs_sync():
+                return
+            samples = []
+            for _ in range(SAMPLES_PER_SYNC):
+                try:
+                    sent = time.time()
+                    server_ms = fetch_server_ms()
+                    samples.append(self._sample(sent, server_ms, time.time()))
+                except Exception as e:
+                    print(f"[Clock] server_time sample failed: {e}")
+            self._record(samples)
+
+    async def async_sync(self, fetch_server_ms):
+        """Resync from an async `fetch_server_ms()` coroutine function."""
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            # Concurrent signed calls that all saw a stale clock resync once
+            if not self.needs_sync():
+                return
+            samples = []
+            for _ in range(SAMPLES_PER_SYNC):
+                try:
+                    sent = time.time()
+                    server_ms = await fetch_server_ms()
+                    samples.append(self._sample(sent, server_ms, time.time()))
+                except Exception as e:
+                    print(f"[Clock] server_time sample failed: {e}")
+            self._record(samples)
+
+
+clock = ClockOffset()
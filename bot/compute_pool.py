@@ -0,0 +1,282 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Imported by bot.py before it loads .env, so load it here first
+load_dotenv()
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+JOB_TIMEOUT = float(os.getenv("COMPUTE_TIMEOUT", 10))   # seconds, unless a job asks otherwise
+SHM_MIN_BYTES = 64 * 1024   # smaller arrays are cheaper to pickle than to map
+
+
+class SharedArray:
+    """Picklable handle to an array the parent copied into shared memory."""
+    __slots__ = ("name", "shape", "dtype")
+
+    def __init__(self, name: str, shape: tuple, dtype: np.dtype):
+        self.name, self.shape, self.dtype = name, shape, dtype
+
+
+def _share(obj, segments: list):
+    """Replace large arrays in `obj` (nested dict/list/tuple) with SharedArray handles."""
+    if isinstance(obj, np.ndarray) and obj.nbytes >= SHM_MIN_BYTES:
+        shm = shared_memory.SharedMemory(create=True, size=obj.nbytes)
+        segments.append(shm)
+        np.ndarray(obj.shape, obj.dtype, buffer=shm.buf)[...] = obj
+        return SharedArray(shm.name, obj.shape, obj.dtype)
+    if isinstance(obj, dict):
+        return {k: _share(v, segments) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_share(v, segments) for v in obj)
+    return obj
+
+
+def _attach(obj, handles: list):
+    """Worker side of _share: map each SharedArray back to a zero-copy ndarray."""
+    if isinstance(obj, SharedArray):
+        # Workers share the parent's resource tracker (forkserver/spawn), so
+        # attaching adds nothing to it and the parent's unlink stays the only one
+        shm = shared_memory.SharedMemory(name=obj.name)
+        handles.append(shm)
+        return np.ndarray(obj.shape, obj.dtype, buffer=shm.buf)
+    if isinstance(obj, dict):
+        return {k: _attach(v, handles) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_attach(v, handles) for v in obj)
+    return obj
+
+
+def _run_job(fn, args, kwargs):
+    handles = []
+    try:
+        args, kwargs = _attach((args, kwargs), handles)
+        result = fn(*args, **kwargs)
+        del args, kwargs
+        return result
+    finally:
+        for shm in handles:
+            try:
+                shm.close()
+            except BufferError:
+                pass   # the result still views the segment; freed with it
+
+
+WARM_MODULES = ["market_analysis", "market_scanner"]
+
+
+def _warm():
+    # Import the analysis modules so the first real job pays no import cost
+    import market_analysis, market_scanner   # noqa: F401
+    return os.getpid()
+
+
+def _context():
+    """
+    Workers start from a forkserver (spawn where there is none), never by
+    forking the bot: once it runs threads (aiohttp, asyncio.to_thread) a
+    fork can copy a held lock into the child.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Preload what jobs use instead of re-importing the bot's __main__
+        context.set_forkserver_preload(WARM_MODULES)
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class ComputePool:
+    """
+    Warm process pool for CPU-bound work (analysis, scans, rendering) so it
+    never runs on the event loop thread.
+
+    Large NumPy arrays in a job's arguments travel through shared memory
+    instead of being pickled; everything else is pickled as usual, so job
+    functions must be importable module-level functions. Each job has a
+    timeout. A job that is cancelled or times out while still queued is
+    simply dropped; one already running cannot be interrupted, so the pool
+    is recycled (workers terminated and restarted) to reclaim the CPU. Jobs
+    running at that moment fail and their callers see the error.
+
+    `start()` warms the first workers before the event loop runs; a pool
+    started later (lazily or by a recycle) is warmed without blocking the
+    loop. Retired pools are joined in a thread so their manager thread
+    shuts down cleanly.
+    """
+
+    def __init__(self, workers: int = COMPUTE_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._starting = None     # task starting a pool from the running loop
+        self._retiring = set()    # tasks joining recycled pools
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "timed_out": 0,
+                      "cancelled": 0, "recycled": 0, "shared_bytes": 0, "busy_ms": 0.0}
+
+    def start(self):
+        """Start and warm the workers now, blocking; call before the event loop runs."""
+        if self._pool is not None:
+            return
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=_context())
+        for future in [self._pool.submit(_warm) for _ in range(self.workers)]:
+            future.result()
+        print(f"[Compute] {self.workers} worker process(es) ready")
+
+    async def _pool_ready(self) -> ProcessPoolExecutor:
+        """The current pool, starting one from the running loop if there is none."""
+        if self._pool is None:
+            if self._starting is None:
+                self._starting = asyncio.ensure_future(self._start_late())
+            await asyncio.shield(self._starting)
+        return self._pool
+
+    async def _start_late(self):
+        try:
+            pool = ProcessPoolExecutor(self.workers, mp_context=_context())
+            # submit() launches the processes (and the forkserver); keep that off the loop
+            warm = await asyncio.to_thread(lambda: [pool.submit(_warm) for _ in range(self.workers)])
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in warm))
+            self._pool = pool
+            print(f"[Compute] {self.workers} worker process(es) ready")
+        finally:
+            self._starting = None
+
+    def _recycle(self):
+        """Retire the current pool; the next job starts a fresh one."""
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        self.stats["recycled"] += 1
+        task = asyncio.ensure_future(self._retire(pool))
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    @staticmethod
+    async def _retire(pool: ProcessPoolExecutor):
+        # ProcessPoolExecutor has no public way to stop a running call
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        # Wait for the manager thread to notice and exit, so it closes its own
+        # wakeup pipe instead of racing interpreter shutdown for it
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+    async def run(self, fn, *args, timeout: float = None, **kwargs):
+        """
+        Run `fn(*args, **kwargs)` in a worker and return its result.
+        RuntimeError if it takes longer than `timeout` seconds; cancelling
+        the awaiting task cancels the job.
+        """
+        pool = await self._pool_ready()
+        timeout = JOB_TIMEOUT if timeout is None else timeout
+        segments = []
+        try:
+            shared_args, shared_kwargs = _share((args, kwargs), segments)
+            self.stats["shared_bytes"] += sum(shm.size for shm in segments)
+            self.stats["submitted"] += 1
+            started = time.monotonic()
+            job = pool.submit(_run_job, fn, shared_args, shared_kwargs)
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(job), timeout)
+            except asyncio.TimeoutError:
+                self.stats["timed_out"] += 1
+                self._abandon(job)
+                raise RuntimeError(f"{fn.__name__} took longer than {timeout:g}s")
+            except asyncio.CancelledError:
+                self.stats["cancelled"] += 1
+                self._abandon(job)
+                raise
+            except Exception:
+                self.stats["failed"] += 1
+                raise
+            self.stats["completed"] += 1
+            self.stats["busy_ms"] += (time.monotonic() - started) * 1000
+            return result
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+
+    def _abandon(self, job):
+        if not job.cancel() and job.running():
+            print("[Compute] Recycling workers to stop an abandoned job")
+            self._recycle()
+
+    async def shutdown(self):
+        """Stop the workers and wait for every pool, including retiring ones, to exit."""
+        if self._starting is not None:
+            await asyncio.gather(self._starting, return_exceptions=True)
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+        if self._retiring:
+            await asyncio.gather(*self._retiring, return_exceptions=True)
+
+
+compute = ComputePool()
+
+
+if __name__ == "__main__":
+    # Self-check: python compute_pool.py
+    from market_analysis import TRADE_DTYPE, analyze_trades
+
+    # Workers come from a forkserver that never imports this __main__,
+    # so the self-check only submits importable functions
+    async def main():
+        pool = ComputePool(workers=2)
+        pool.start()
+
+        rng = np.random.default_rng(0)
+        arr = np.empty(200_000, TRADE_DTYPE)
+        arr["date"] = 1.7e9 + np.arange(len(arr), dtype=float)
+        arr["price"] = 1e6 + rng.normal(0, 10, len(arr)).cumsum()
+        arr["amount"] = 1.0
+        arr["is_buy"] = rng.random(len(arr)) < 0.5
+
+        started = time.perf_counter()
+        remote = await pool.run(analyze_trades, arr, 3600)
+        elapsed = (time.perf_counter() - started) * 1000
+        assert remote == analyze_trades(arr, 3600)
+        assert pool.stats["shared_bytes"] >= arr.nbytes
+        print(f"analyze_trades on {len(arr):,} trades in a worker: {elapsed:.1f} ms")
+
+        # The loop stays responsive while a worker computes
+        ticks = 0
+        job = asyncio.ensure_future(pool.run(time.sleep, 0.5))
+        while not job.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        assert ticks > 20 and job.result() is None
+
+        try:
+            await pool.run(time.sleep, 5, timeout=0.2)
+            raise AssertionError("timeout not raised")
+        except RuntimeError as e:
+            print(f"timed out as expected: {e}")
+        assert pool.stats["recycled"] == 1
+
+        # The replacement pool starts without stalling the loop
+        ticks = 0
+        job = asyncio.ensure_future(pool.run(analyze_trades, arr, 3600))
+        while not job.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        assert job.result() == remote and ticks > 1
+        print(f"recycled pool served a job; loop ticked {ticks}x meanwhile")
+
+        job = asyncio.ensure_future(pool.run(time.sleep, 5))
+        await asyncio.sleep(0.2)
+        job.cancel()
+        try:
+            await job
+        except asyncio.CancelledError:
+            pass
+        assert pool.stats["cancelled"] == 1 and pool.stats["recycled"] == 2
+        print(pool.stats)
+        await pool.shutdown()
+
+    asyncio.run(main())
+    print("compute_pool self-check passed")
@@ -0,0 +1,26 @@
+from storage import connect
+
+
+def load_credentials() -> dict:
+    """Every stored key pair as {user_id: {"api_key", "api_secret"}}."""
+    return {
+        row["user_id"]: {"api_key": row["api_key"], "api_secret": row["api_secret"]}
+        for row in connect().execute("SELECT * FROM credentials")
+    }
+
+
+def get_credentials(user_id) -> dict:
+    """One user's {"api_key", "api_secret"}, or None if not set."""
+    row = connect().execute("SELECT * FROM credentials WHERE user_id = ?", (str(user_id),)).fetchone()
+    if row is None:
+        return None
+    return {"api_key": row["api_key"], "api_secret": row["api_secret"]}
+
+
+def set_credentials(user_id, api_key: str, api_secret: str):
+    conn = connect()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO credentials (user_id, api_key, api_secret) VALUES (?, ?, ?)",
+            (str(user_id), api_key, api_secret),
+        )
@@ -0,0 +1,285 @@
+import math
+import threading
+import time
+from collections import deque
+
+from market_analysis import (
+    SMA_SHORT, SMA_LONG, VOLATILITY_WINDOW, RANGE_WINDOW,
+    projection, trend_state, range_state,
+)
+
+LOOKBACK = 3 * 3600     # seconds of trades the regression covers
+MIN_TRADES = 500        # ...but never fewer trades than this
+REBASE_EVERY = 10_000   # updates between exact recomputes of the running sums
+
+PRICE_WINDOW = max(SMA_LONG, VOLATILITY_WINDOW)
+
+
+class PairIndicators:
+    """
+    Rolling indicators for one pair, each updated in O(1) per trade:
+
+    - SMA50/SMA200 from running sums over the last SMA_LONG prices
+    - standard deviation over the last VOLATILITY_WINDOW prices by sliding
+      Welford (one add, one remove per trade)
+    - min/max over the last RANGE_WINDOW trades by monotonic deques
+    - linear slope from running regression sums over the trades in the
+      last LOOKBACK seconds (at least MIN_TRADES), with time measured from
+      an origin that is moved forward on rebase to keep the sums small
+
+    The running sums are recomputed exactly every REBASE_EVERY updates so
+    floating-point drift cannot accumulate.
+    """
+
+    def __init__(self):
+        self.last_tid = 0
+        self._prices = deque()           # last PRICE_WINDOW prices
+        self._sum_short = self._sum_long = 0.0
+        self._n = 0                      # Welford over the last VOLATILITY_WINDOW prices
+        self._mean = self._m2 = 0.0
+        self._index = 0                  # trades seen, for range eviction
+        self._mins = deque()             # (index, price), prices increasing
+        self._maxs = deque()             # (index, price), prices decreasing
+        self._fit = deque()              # (t, price) in the regression window
+        self._origin = None
+        self._st = self._sp = self._stt = self._stp = 0.0
+        self._since_rebase = 0
+
+    def __len__(self):
+        return len(self._fit)
+
+    def update(self, date: float, price: float):
+        """Fold in one trade (chronological order)."""
+        prices = self._prices
+
+        # SMAs
+        if len(prices) >= SMA_SHORT:
+            self._sum_short -= prices[-SMA_SHORT]
+        self._sum_short += price
+        prices.append(price)
+        self._sum_long += price
+        if len(prices) > SMA_LONG:
+            self._sum_long -= prices[-SMA_LONG - 1]
+
+        # Sliding Welford
+        self._welford_add(price)
+        if self._n > VOLATILITY_WINDOW:
+            self._welford_remove(prices[-VOLATILITY_WINDOW - 1])
+        if len(prices) > PRICE_WINDOW:
+            prices.popleft()
+
+        # Rolling min / max
+        i = self._index
+        self._index += 1
+        while self._mins and self._mins[-1][1] >= price:
+            self._mins.pop()
+        self._mins.append((i, price))
+        while self._maxs and self._maxs[-1][1] <= price:
+            self._maxs.pop()
+        self._maxs.append((i, price))
+        cutoff = i - RANGE_WINDOW
+        if self._mins[0][0] <= cutoff:
+            self._mins.popleft()
+        if self._maxs[0][0] <= cutoff:
+            self._maxs.popleft()
+
+        # Regression sums
+        if self._origin is None:
+            self._origin = date
+        t = date - self._origin
+        self._fit.append((t, price))
+        self._st += t
+        self._sp += price
+        self._stt += t * t
+        self._stp += t * price
+        while len(self._fit) > MIN_TRADES and self._fit[0][0] < t - LOOKBACK:
+            old_t, old_p = self._fit.popleft()
+            self._st -= old_t
+            self._sp -= old_p
+            self._stt -= old_t * old_t
+            self._stp -= old_t * old_p
+
+        self._since_rebase += 1
+        if self._since_rebase >= REBASE_EVERY:
+            self._rebase()
+
+    def _welford_add(self, x: float):
+        self._n += 1
+        delta = x - self._mean
+        self._mean += delta / self._n
+        self._m2 += delta * (x - self._mean)
+
+    def _welford_remove(self, x: float):
+        old_mean = self._mean
+        self._n -= 1
+        self._mean -= (x - old_mean) / self._n
+        self._m2 -= (x - old_mean) * (x - self._mean)
+
+    def _rebase(self):
+        """Recompute every running sum exactly and move the time origin to the oldest fit point."""
+        self._since_rebase = 0
+        prices = list(self._prices)
+        self._sum_short = math.fsum(prices[-SMA_SHORT:])
+        self._sum_long = math.fsum(prices[-SMA_LONG:])
+        window = prices[-VOLATILITY_WINDOW:]
+        self._n = len(window)
+        self._mean = math.fsum(window) / self._n
+        self._m2 = math.fsum((x - self._mean) ** 2 for x in window)
+
+        shift = self._fit[0][0]
+        self._origin += shift
+        self._fit = deque((t - shift, p) for t, p in self._fit)
+        self._st = math.fsum(t for t, _ in self._fit)
+        self._sp = math.fsum(p for _, p in self._fit)
+        self._stt = math.fsum(t * t for t, _ in self._fit)
+        self._stp = math.fsum(t * p for t, p in self._fit)
+
+    def feed(self, trades: list) -> int:
+        """Fold in API trades newer than the last one seen; returns how many."""
+        new = sorted((t for t in trades if int(t["tid"]) > self.last_tid), key=lambda t: int(t["tid"]))
+        for t in new:
+            self.update(float(t["date"]), float(t["price"]))
+        if new:
+            self.last_tid = int(new[-1]["tid"])
+        return len(new)
+
+    def seed(self, cols: dict):
+        """Replay trade tape columns (chronological) into an empty state."""
+        for date, price in zip(cols["date"].tolist(), cols["price"].tolist()):
+            self.update(date, price)
+        if len(cols["tid"]):
+            self.last_tid = int(cols["tid"][-1])
+
+    # ── Reads (all O(1)) ─────────────────────────────────────────────────────
+
+    def sma(self, window: int) -> float:
+        n = min(window, len(self._prices))
+        total = self._sum_short if window == SMA_SHORT else self._sum_long
+        return total / n if n else None
+
+    def volatility_pct(self) -> float:
+        if self._n < 2 or not self._mean:
+            return 0.0
+        return math.sqrt(max(self._m2, 0.0) / self._n) / self._mean * 100.0
+
+    def range(self) -> tuple:
+        return self._mins[0][1], self._maxs[0][1]
+
+    def slope(self) -> tuple:
+        """(price per second, intercept at the origin) or None with too few points."""
+        n = len(self._fit)
+        denom = n * self._stt - self._st * self._st
+        if n < 2 or denom <= 0:
+            return None
+        slope = (n * self._stp - self._st * self._sp) / denom
+        return slope, (self._sp - slope * self._st) / n
+
+    def values(self, seconds_ahead: float, current_price: float = None) -> dict:
+        """The indicator fields `market_analysis.analyze_trades` reports."""
+        out = trend_state(self.sma(SMA_SHORT), self.sma(SMA_LONG))
+        out["volatility_pct"] = self.volatility_pct()
+        out.update(range_state(*self.range(), current_price))
+        fit = self.slope()
+        if fit is None:
+            out.update(slope=0.0, predicted_price=None, pct_per_hour=0.0, price_trend=None)
+        else:
+            slope, intercept = fit
+            predicted = slope * (self._fit[-1][0] + seconds_ahead) + intercept
+            out.update(projection(slope, predicted, current_price))
+        return out
+
+
+class IndicatorBook:
+    """
+    PairIndicators per pair, seeded from the trade tape on first use and fed
+    by the tape itself (`tape.subscribe(indicators.feed)`), so every append
+    reaches the state whichever command made it. Feeds run in the appending
+    thread: hold `lock` while reading a state.
+    """
+
+    def __init__(self):
+        self._pairs = {}
+        self.lock = threading.RLock()
+
+    def get(self, pair: str, tape=None) -> PairIndicators:
+        """The pair's state; built from `tape` if it has none yet (None if nothing recorded)."""
+        with self.lock:
+            return self._get(pair, tape)
+
+    def _get(self, pair: str, tape) -> PairIndicators:
+        state = self._pairs.get(pair)
+        if state is None and tape is not None:
+            cols = tape.load(pair, since=time.time() - LOOKBACK)
+            if cols is None or len(cols["date"]) < MIN_TRADES:
+                cols = tape.tail(pair, max(MIN_TRADES, PRICE_WINDOW))
+            if cols is None or not len(cols["date"]):
+                return None
+            state = PairIndicators()
+            state.seed(cols)
+            self._pairs[pair] = state
+        return state
+
+    def feed(self, pair: str, trades: list, after_tid: int):
+        """
+        Trades appended to the tape after `after_tid`; ignored until the pair
+        has been seeded. A state that has not seen `after_tid` is missing
+        trades, so it is dropped and re-seeded from the tape on next use.
+        """
+        with self.lock:
+            state = self._pairs.get(pair)
+            if state is None or not trades:
+                return
+            if state.last_tid != after_tid:
+                del self._pairs[pair]
+                return
+            state.feed(trades)
+
+    def forget(self, keep):
+        keep = set(keep)
+        with self.lock:
+            for pair in [p for p in self._pairs if p not in keep]:
+                del self._pairs[pair]
+
+    def __len__(self):
+        return len(self._pairs)
+
+
+indicators = IndicatorBook()
+
+
+if __name__ == "__main__":
+    # Self-check against the vectorized batch formulas: python indicators.py
+    import numpy as np
+    from market_analysis import TRADE_DTYPE, momentum, trend, volatility_pct, range_position
+
+    rng = np.random.default_rng(3)
+    n = 30_000
+    dates = 1.7e9 + np.cumsum(rng.exponential(2.0, n))
+    prices = 1e9 * np.exp(np.cumsum(rng.normal(0, 5e-4, n)))
+
+    state = PairIndicators()
+    for i, (d, p) in enumerate(zip(dates.tolist(), prices.tolist())):
+        state.update(d, p)
+        if i in (10, 499, 4_321, 12_345, n - 1):
+            # The window the regression should cover
+            start = int(np.searchsorted(dates[: i + 1], d - LOOKBACK, side="left"))
+            start = min(start, max(0, i + 1 - MIN_TRADES))
+            arr = np.zeros(i + 1 - start, TRADE_DTYPE)
+            arr["date"], arr["price"] = dates[start:i + 1], prices[start:i + 1]
+            got = state.values(3600, p)
+            want = {**momentum(arr, 3600, p), **trend(prices[:i + 1]),
+                    **range_position(prices[:i + 1], p), "volatility_pct": volatility_pct(prices[:i + 1])}
+            for key in ("slope", "predicted_price", "sma_short", "sma_long", "volatility_pct",
+                        "range_low", "range_high"):
+                assert math.isclose(got[key], want[key], rel_tol=1e-6, abs_tol=1e-9), (i, key, got[key], want[key])
+
+    started = time.perf_counter()
+    for d, p in zip(dates.tolist(), prices.tolist()):
+        state.update(d + n * 2.0, p)
+    per_update = (time.perf_counter() - started) / n * 1e6
+    started = time.perf_counter()
+    for _ in range(10_000):
+        state.values(3600, prices[-1])
+    per_read = (time.perf_counter() - started) / 10_000 * 1e6
+    print(f"update {per_update:.2f} µs/trade · read {per_read:.2f} µs")
+    print("indicators self-check passed")
@@ -2,44 +2,154 @@ import os
 import time
 import hmac
 import hashlib
+from decimal import Decimal, ROUND_DOWN
+import aiohttp
 import requests
 from urllib.parse import urlencode
 from dotenv import load_dotenv
+from market_snapshot import snapshot
+from singleflight import SingleFlight
+from clock_sync import clock, is_timestamp_error
+from nonce_sequencer import nonces, key_fingerprint
+from request_scheduler import scheduler, PUBLIC_BUCKET, CRITICAL, ACCOUNT, INTERACTIVE
 
+PUBLIC_URL = "https://indodax.com/api"
+TAPI_URL = "https://indodax.com/tapi"
 
-class IndodaxClient:
-    def __init__(self, api_key: str = None, api_secret: str = None):
-        load_dotenv()
+AMOUNT_DECIMALS = 8        # Indodax never accepts amounts finer than this
+CONNECTIONS_PER_HOST = 8   # keep-alive sockets per Indodax host
+REQUEST_TIMEOUT = 10       # seconds
+
+_session = None
+
+# Identical public requests made concurrently share one upstream fetch
+public_flight = SingleFlight()
+
+# /api/pairs rows by ticker id ("btc_idr"); trading rules rarely change, so loaded once
+_pair_rules = {}
+
+
+def round_amount(amount: float, decimals: int = AMOUNT_DECIMALS) -> float:
+    """Round `amount` down to `decimals` places, so an order never exceeds what is held."""
+    return float(Decimal(str(amount)).quantize(Decimal(1).scaleb(-decimals), rounding=ROUND_DOWN))
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the process-wide keep-alive session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=CONNECTIONS_PER_HOST,
+            keepalive_timeout=60,
+            ttl_dns_cache=300
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _load_keys(api_key: str = None, api_secret: str = None):
+    """Return (key, secret bytes) from explicit credentials or the environment."""
+    load_dotenv()
+
+    if api_key and api_secret:
+        return api_key, api_secret.strip().encode()
+
+    key = os.getenv("INDODAX_API_KEY")
+    secret_env = os.getenv("INDODAX_SECRET_KEY")
+    if not key or not secret_env:
+        raise RuntimeError("Missing INDODAX_API_KEY or INDODAX_SECRET_KEY")
+    return key, secret_env.strip().encode()
+
+
+def _parse_orders(data: dict) -> list:
+    """Normalize an openOrders / orderHistory response into a list of order dicts."""
+    orders = data.get("return", {}).get("orders") or []
+    if isinstance(orders, dict):
+        # openOrders without a pair is keyed by pair
+        orders = [o for group in orders.values() for o in group]
+    return orders
 
-        if api_key and api_secret:
-            self.key = api_key
-            self.secret = api_secret.strip().encode()
+
+def order_remain(order: dict, pair: str) -> float:
+    """
+    Unfilled coin amount of an exchange order. Sells report `remain_<coin>`;
+    buys placed by IDR value report `remain_idr`, converted at the limit price.
+    """
+    coin = pair.split("_")[0]
+    if f"remain_{coin}" in order:
+        return float(order[f"remain_{coin}"])
+    price = float(order.get("price") or 0)
+    return float(order.get("remain_idr", 0)) / price if price else 0.0
+
+
+def _trades_after(trades: list, since_tid: int) -> list:
+    """
+    Trades with an id above `since_tid`, oldest first. Indodax lists trades
+    newest first, so the scan stops at the first one already seen.
+    """
+    new = []
+    for t in trades:
+        if int(t["tid"]) <= since_tid:
+            break
+        new.append(t)
+    new.reverse()
+    return new
+
+
+def _parse_trade_history(data: dict) -> list:
+    """Normalize a tradeHistory response into a list of trade dicts."""
+    try:
+        raw_trades = data.get("return", {}).get("trades", [])
+        # Handle case: trades may be a dict keyed by trade_id
+        if isinstance(raw_trades, dict):
+            trades = list(raw_trades.values())
+        elif isinstance(raw_trades, list):
+            trades = raw_trades
         else:
-            self.key = os.getenv("INDODAX_API_KEY")
-            secret_env = os.getenv("INDODAX_SECRET_KEY")
-            if not self.key or not secret_env:
-                raise RuntimeError("Missing INDODAX_API_KEY or INDODAX_SECRET_KEY")
-            self.secret = secret_env.strip().encode()
+            print(f"[DEBUG] Unexpected tradeHistory format: {data}")
+            return []
+
+        # Normalize keys so missing "amount" won’t break your code
+        for t in trades:
+            t.setdefault("amount", t.get("remain", "0"))
+
+        return trades
+    except Exception as e:
+        print(f"[ERROR] Parsing trade history failed: {e}, raw={data}")
+        return []
 
-        self.api_url = "https://indodax.com/tapi"
+
+class IndodaxClient:
+    def __init__(self, api_key: str = None, api_secret: str = None):
+        self.key, self.secret = _load_keys(api_key, api_secret)
+        self.api_url = TAPI_URL
 
     def _get_server_time(self):
-        """Fetch Indodax server time in seconds since epoch."""
-        try:
-            resp = requests.get("https://indodax.com/api/server_time")
-            resp.raise_for_status()
-            data = resp.json()
-            return int(data.get("server_time", time.time()))
-        except Exception as e:
-            print(f"[WARN] Could not fetch server time, using local time: {e}")
-            return int(time.time())
+        """Fetch Indodax server time in milliseconds since epoch."""
+        resp = requests.get(f"{PUBLIC_URL}/server_time", timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        return int(resp.json()["server_time"])
 
-    def _post(self, method, params=None):
+    def _post(self, method, params=None, retry=True):
         if params is None:
             params = {}
 
+        # Stamp from the local clock + estimated offset; only resync when due
+        if clock.needs_sync():
+            clock.sync(self._get_server_time)
         params["method"] = method
-        params["timestamp"] = self._get_server_time()
+        params["timestamp"] = clock.now_ms()
+        params["nonce"] = nonces.next(self.key)
 
         post_data = urlencode(params)
         sign = hmac.new(self.secret, post_data.encode(), hashlib.sha512).hexdigest()
@@ -56,20 +166,33 @@ class IndodaxClient:
             raise RuntimeError("Invalid JSON response from Indodax")
 
         if not data.get("success"):
-            raise RuntimeError(data.get("error") or "Unknown TAPI error")
+            error = data.get("error") or "Unknown TAPI error"
+            if retry and is_timestamp_error(error):
+                # Our offset has drifted: resync and re-sign once
+                clock.invalidate()
+                return self._post(method, params, retry=False)
+            raise RuntimeError(error)
 
         return data
 
     def get_account_info(self):
         return self._post("getInfo")
 
-    def get_ticker(self, pair: str) -> dict:
+    def get_ticker(self, pair: str, max_age: float = None) -> dict:
+        cached = snapshot.get_ticker(pair, max_age)
+        if cached is not None:
+            return {"ticker": cached}
+
         url = f"https://indodax.com/api/{pair}/ticker"
         response = requests.get(url)
         response.raise_for_status()
         return response.json()
 
-    def get_ticker_v2(self, pair: str) -> dict:
+    def get_ticker_v2(self, pair: str, max_age: float = None) -> dict:
+        cached = snapshot.get_ticker(pair, max_age)
+        if cached is not None:
+            return {"ticker": cached}
+
         formatted_pair = pair.replace("_", "")
         url = f"https://indodax.com/api/ticker/{formatted_pair}"
         response = requests.get(url)
@@ -91,6 +214,19 @@ class IndodaxClient:
         resp.raise_for_status()
         return resp.json()[:limit]
 
+    def get_trades_since(self, pair: str, since_tid: int = 0) -> list:
+        """Only the trades newer than `since_tid`, oldest first."""
+        url = f"{PUBLIC_URL}/{pair}/trades"
+        resp = requests.get(url, params={"since": since_tid} if since_tid else None, timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        return _trades_after(resp.json(), since_tid)
+
+    def get_depth(self, pair: str) -> dict:
+        """Order book: {"buy": [[price, amount], ...], "sell": [...]}."""
+        resp = requests.get(f"{PUBLIC_URL}/{pair}/depth", timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        return resp.json()
+
     def get_balance(self, coin: str) -> float:
         info = self.get_account_info()
         balances = info["return"]["balance"]
@@ -140,23 +276,247 @@ class IndodaxClient:
         }
 
         data = self._post("tradeHistory", params)
+        return _parse_trade_history(data)
+
+
+class AsyncIndodaxClient:
+    """
+    asyncio counterpart of IndodaxClient. All instances share one keep-alive
+    aiohttp session, so commands never block the Discord event loop.
+    Every request is admitted by the shared scheduler; `priority` picks the lane.
+    """
+
+    def __init__(self, api_key: str = None, api_secret: str = None):
+        self.key, self.secret = _load_keys(api_key, api_secret)
+        self.api_url = TAPI_URL
+        self.account = key_fingerprint(self.key)   # stored with orders to find this key again
+        self.bucket = f"private:{self.account}"
+        self.trade_cursors = {}   # pair -> last trade id returned by get_new_trades
+        # Keyed HMAC built once; each request only copies it and hashes the body
+        self._signer = hmac.new(self.secret, digestmod=hashlib.sha512)
+        self._headers = {"Key": self.key, "Content-Type": "application/x-www-form-urlencoded"}
+
+    async def _get_json(self, url: str, priority: int = INTERACTIVE, flight_key: tuple = None):
+        if flight_key is not None:
+            # Shared fetch: admitted at the most urgent priority among its callers so far
+            priority = public_flight.urgency(flight_key, priority)
+        await scheduler.acquire(PUBLIC_BUCKET, priority, tag=flight_key)
+        async with get_session().get(url) as resp:
+            resp.raise_for_status()
+            # Indodax does not always label JSON bodies as application/json
+            return await resp.json(content_type=None)
+
+    async def _get_public(self, endpoint: str, pair: str, url: str, priority: int = INTERACTIVE):
+        """
+        GET a public endpoint, coalesced per (endpoint, pair). The shared fetch
+        runs at the most urgent caller's priority: a caller joining a fetch
+        still queued in a slower lane moves it up to its own.
+        """
+        key = (endpoint, pair)
+        scheduler.promote(key, priority)
+        return await public_flight.do(key, lambda: self._get_json(url, priority, key), priority)
+
+    async def _get_server_time(self):
+        """Fetch Indodax server time in milliseconds since epoch."""
+        # Not coalesced: a shared reply would skew the round-trip measurement
+        data = await self._get_json(f"{PUBLIC_URL}/server_time", CRITICAL)
+        return int(data["server_time"])
+
+    async def sync_clock(self):
+        """Sample server time now if the clock offset is due for a resync."""
+        if clock.needs_sync():
+            await clock.async_sync(self._get_server_time)
+
+    async def warm(self):
+        """Keep a pooled connection to Indodax open and the clock offset fresh."""
+        if clock.needs_sync():
+            await clock.async_sync(self._get_server_time)
+        else:
+            await self._get_server_time()
+
+    def _sign(self, post_data: str) -> str:
+        signer = self._signer.copy()
+        signer.update(post_data.encode())
+        return signer.hexdigest()
+
+    async def _post(self, method, params=None, retry=True, priority=ACCOUNT, timings: dict = None):
+        if params is None:
+            params = {}
+
+        # Stamp from the local clock + estimated offset; only resync when due
+        await self.sync_clock()
+        # Queue before stamping so the timestamp isn't aged by the wait
+        await scheduler.acquire(self.bucket, priority)
+        params["method"] = method
+        params["timestamp"] = clock.now_ms()
+        params["nonce"] = nonces.next(self.key)
+
+        post_data = urlencode(params)
+        headers = {**self._headers, "Sign": self._sign(post_data)}
+
+        if timings is not None:
+            timings["submit"] = time.time()
+        async with get_session().post(self.api_url, data=post_data, headers=headers) as response:
+            try:
+                data = await response.json(content_type=None)
+            except ValueError:
+                raise RuntimeError("Invalid JSON response from Indodax")
+        if timings is not None:
+            timings["ack"] = time.time()
+
+        if not data.get("success"):
+            error = data.get("error") or "Unknown TAPI error"
+            if retry and is_timestamp_error(error):
+                # Our offset has drifted: resync and re-sign once
+                clock.invalidate()
+                return await self._post(method, params, retry=False, priority=priority, timings=timings)
+            raise RuntimeError(error)
+
+        return data
+
+    async def get_summaries(self, priority: int = INTERACTIVE) -> dict:
+        return await self._get_public("summaries", None, f"{PUBLIC_URL}/summaries", priority)
 
+    async def get_pair_rules(self, pair: str, priority: int = INTERACTIVE) -> dict:
+        """The /api/pairs entry for `pair` (precision, minimums), or {} if unlisted."""
+        if not _pair_rules:
+            rows = await self._get_public("pairs", None, f"{PUBLIC_URL}/pairs", priority)
+            _pair_rules.update({row["ticker_id"]: row for row in rows if "ticker_id" in row})
+        return _pair_rules.get(pair.lower(), {})
+
+    async def amount_decimals(self, pair: str, priority: int = INTERACTIVE) -> int:
+        """Decimal places Indodax accepts for `pair`'s order amounts."""
         try:
-            raw_trades = data.get("return", {}).get("trades", [])
-            # Handle case: trades may be a dict keyed by trade_id
-            if isinstance(raw_trades, dict):
-                trades = list(raw_trades.values())
-            elif isinstance(raw_trades, list):
-                trades = raw_trades
-            else:
-                print(f"[DEBUG] Unexpected tradeHistory format: {data}")
-                return []
-
-            # Normalize keys so missing "amount" won’t break your code
-            for t in trades:
-                t.setdefault("amount", t.get("remain", "0"))
-
-            return trades
+            rules = await self.get_pair_rules(pair, priority)
         except Exception as e:
-            print(f"[ERROR] Parsing trade history failed: {e}, raw={data}")
-            return []
+            # Never let a metadata fetch block an order; 8 places is always accepted
+            print(f"[Indodax] Pair rules unavailable, using {AMOUNT_DECIMALS} decimals: {e}")
+            return AMOUNT_DECIMALS
+        return int(rules.get("volume_precision") or AMOUNT_DECIMALS)
+
+    async def get_account_info(self, priority: int = ACCOUNT):
+        return await self._post("getInfo", priority=priority)
+
+    async def get_ticker(self, pair: str, max_age: float = None, priority: int = INTERACTIVE) -> dict:
+        cached = snapshot.get_ticker(pair, max_age, refresh=False)
+        if cached is not None:
+            return {"ticker": cached}
+        return await self._get_public("ticker", pair, f"{PUBLIC_URL}/{pair}/ticker", priority)
+
+    async def get_ticker_v2(self, pair: str, max_age: float = None, priority: int = INTERACTIVE) -> dict:
+        cached = snapshot.get_ticker(pair, max_age, refresh=False)
+        if cached is not None:
+            return {"ticker": cached}
+        formatted_pair = pair.replace("_", "")
+        return await self._get_public("ticker_v2", formatted_pair, f"{PUBLIC_URL}/ticker/{formatted_pair}", priority)
+
+    async def get_last_price(self, pair: str, priority: int = INTERACTIVE) -> float:
+        """Async equivalent of price_fetcher.get_last_price."""
+        data = await self.get_ticker_v2(pair.lower(), priority=priority)
+
+        # Guard against invalid pairs or unexpected shape
+        if "error" in data:
+            raise ValueError(f"Pair '{pair}' not supported: {data.get('error_description', '')}")
+
+        if "ticker" not in data or "last" not in data["ticker"]:
+            raise ValueError(f"No ticker data found for pair '{pair}'")
+
+        return float(data["ticker"]["last"])
+
+    async def trade(self, pair, type_, price, amount):
+        params = {
+            "pair": pair,
+            "type": type_,
+            "price": price,
+            "amount": amount
+        }
+        return await self._post("trade", params, priority=CRITICAL)
+
+    async def get_trades(self, pair: str, limit: int = 100, priority: int = INTERACTIVE) -> list:
+        trades = await self._get_public("trades", pair, f"{PUBLIC_URL}/{pair}/trades", priority)
+        return trades[:limit]
+
+    async def get_trades_since(self, pair: str, since_tid: int = 0, priority: int = INTERACTIVE) -> list:
+        """
+        Only the trades newer than `since_tid`, oldest first. The id is sent
+        as `since` so the server can trim the payload; the result is also
+        cut client-side, so it is correct even when the server ignores it.
+        """
+        url = f"{PUBLIC_URL}/{pair}/trades"
+        if since_tid:
+            url += f"?since={since_tid}"
+        trades = await self._get_public("trades_since", f"{pair}@{since_tid}", url, priority)
+        return _trades_after(trades, since_tid)
+
+    async def get_depth(self, pair: str, priority: int = INTERACTIVE) -> dict:
+        """Order book: {"buy": [[price, amount], ...], "sell": [...]}."""
+        return await self._get_public("depth", pair, f"{PUBLIC_URL}/{pair}/depth", priority)
+
+    async def get_new_trades(self, pair: str, priority: int = INTERACTIVE) -> list:
+        """Trades since the previous call for this pair (everything on the first call)."""
+        new = await self.get_trades_since(pair, self.trade_cursors.get(pair, 0), priority)
+        if new:
+            self.trade_cursors[pair] = int(new[-1]["tid"])
+        return new
+
+    async def get_balance(self, coin: str, priority: int = ACCOUNT) -> float:
+        info = await self.get_account_info(priority)
+        balances = info["return"]["balance"]
+        return float(balances.get(coin.lower(), 0))
+
+    async def create_buy_order(self, pair, price, amount):
+        price = float(price)
+        amount = float(amount)
+        total_idr = price * amount
+
+        if total_idr < 10000:
+            raise ValueError(f"Minimum order 10,000 IDR — Your total: {total_idr}")
+
+        params = {
+            "pair": pair,
+            "type": "buy",
+            "price": price,
+            "idr": total_idr  # use IDR instead of amount
+        }
+        return await self._post("trade", params, priority=CRITICAL)
+
+    async def create_sell_order(self, pair, price, amount, timings: dict = None):
+        """`timings`, if given, receives wall-clock "submit" and "ack" stamps."""
+        params = {
+            "pair": pair,
+            "type": "sell",
+            "price": float(price),
+            "amount": float(amount)
+        }
+        return await self._post("trade", params, priority=CRITICAL, timings=timings)
+
+    async def cancel_order(self, pair, order_id, type_):
+        params = {
+            "pair": pair,
+            "order_id": order_id,
+            "type": type_
+        }
+        return await self._post("cancelOrder", params, priority=CRITICAL)
+
+    async def get_trade_history(self, pair: str, count: int = 10, priority: int = ACCOUNT) -> list:
+        """
+        Fetch user's trade history for a given pair.
+        Returns a list of trades or [] if none.
+        """
+        params = {
+            "pair": pair,
+            "count": count
+        }
+
+        data = await self._post("tradeHistory", params, priority=priority)
+        return _parse_trade_history(data)
+
+    async def get_open_orders(self, pair: str, priority: int = ACCOUNT) -> list:
+        """The key owner's open orders on `pair`."""
+        data = await self._post("openOrders", {"pair": pair}, priority=priority)
+        return _parse_orders(data)
+
+    async def get_order_history(self, pair: str, count: int = 100, priority: int = ACCOUNT) -> list:
+        """The key owner's most recent finished (filled or cancelled) orders on `pair`."""
+        data = await self._post("orderHistory", {"pair": pair, "count": count}, priority=priority)
+        return _parse_orders(data)
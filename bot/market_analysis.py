@@ -0,0 +1,215 @@
+import numpy as np
+
+# One row per trade; columns are contiguous after a slice, so every pass below is a vector op
+TRADE_DTYPE = np.dtype([
+    ("date", "<f8"),
+    ("price", "<f8"),
+    ("amount", "<f8"),
+    ("is_buy", "?"),
+])
+
+SMA_SHORT = 50
+SMA_LONG = 200
+VOLATILITY_WINDOW = 200    # trades
+RANGE_WINDOW = 100         # trades
+ACCEL_WINDOW = 30 * 60     # seconds; last window vs the one before it
+TREND_BAND = 0.02          # predicted move beyond ±2% counts as a rise/drop
+
+
+def parse_trades(trades: list) -> np.ndarray:
+    """
+    API trades ([{date, type, price, amount, ...}]) to a structured array in
+    chronological order. Each trade is converted exactly once.
+    """
+    arr = np.fromiter(
+        ((float(t["date"]), float(t["price"]), float(t["amount"]), t["type"] == "buy") for t in trades),
+        TRADE_DTYPE, len(trades),
+    )
+    # Indodax lists newest first; a stable sort keeps same-second trades in order
+    return arr[np.argsort(arr["date"], kind="stable")]
+
+
+def from_columns(cols: dict) -> np.ndarray:
+    """Trade tape columns (already chronological) to a structured array."""
+    arr = np.empty(len(cols["date"]), TRADE_DTYPE)
+    arr["date"] = cols["date"]
+    arr["price"] = cols["price"]
+    arr["amount"] = cols["amount"]
+    arr["is_buy"] = cols["is_buy"]
+    return arr
+
+
+def order_flow(arr: np.ndarray) -> dict:
+    is_buy, amounts = arr["is_buy"], arr["amount"]
+    buy_count = int(np.count_nonzero(is_buy))
+    sell_count = len(arr) - buy_count
+    total_vol = float(amounts.sum())
+    buy_vol = float(amounts @ is_buy)   # one pass instead of two masked copies
+    sell_vol = total_vol - buy_vol
+    return {
+        "buy_count": buy_count,
+        "sell_count": sell_count,
+        "buy_vol": buy_vol,
+        "sell_vol": sell_vol,
+        "avg_buy_size": buy_vol / buy_count if buy_count else 0.0,
+        "avg_sell_size": sell_vol / sell_count if sell_count else 0.0,
+        "flow_ratio": buy_count / (sell_count or 1e-12),   # >1 favors buyers
+    }
+
+
+def projection(slope: float, predicted: float, current_price: float = None) -> dict:
+    """Momentum fields from a fitted slope (price/second) and the price it projects."""
+    out = {"slope": slope, "predicted_price": predicted, "pct_per_hour": 0.0, "price_trend": None}
+    if current_price:
+        out["pct_per_hour"] = slope * 3600.0 / current_price * 100.0
+        if predicted > current_price * (1 + TREND_BAND):
+            out["price_trend"] = "Expected Rise"
+        elif predicted < current_price * (1 - TREND_BAND):
+            out["price_trend"] = "Expected Drop"
+        else:
+            out["price_trend"] = "Flat"
+    return out
+
+
+def momentum(arr: np.ndarray, seconds_ahead: float, current_price: float = None) -> dict:
+    """Least-squares price trend in closed form (no polyfit Vandermonde matrix)."""
+    if len(arr) < 2:
+        return {"slope": 0.0, "predicted_price": None, "pct_per_hour": 0.0, "price_trend": None}
+    t = arr["date"] - arr["date"][0]
+    prices = arr["price"]
+    t_mean, p_mean = t.mean(), prices.mean()
+    dt = t - t_mean
+    var_t = float(dt @ dt)
+    if var_t == 0:
+        return {"slope": 0.0, "predicted_price": None, "pct_per_hour": 0.0, "price_trend": None}
+
+    slope = float(dt @ (prices - p_mean)) / var_t   # price per second
+    intercept = p_mean - slope * t_mean
+    return projection(slope, float(slope * (t[-1] + seconds_ahead) + intercept), current_price)
+
+
+def trend_state(sma_short: float, sma_long: float) -> dict:
+    return {
+        "sma_short": sma_short,
+        "sma_long": sma_long,
+        "trend_state": "Uptrend" if sma_short >= sma_long else "Downtrend",
+    }
+
+
+def trend(prices: np.ndarray) -> dict:
+    return trend_state(float(prices[-SMA_SHORT:].mean()), float(prices[-SMA_LONG:].mean()))
+
+
+def volatility_pct(prices: np.ndarray) -> float:
+    window = prices[-VOLATILITY_WINDOW:]
+    return float(window.std() / window.mean() * 100.0) if len(window) > 1 else 0.0
+
+
+def range_state(low: float, high: float, current_price: float = None) -> dict:
+    if current_price and high > low:
+        pos = (current_price - low) / (high - low) * 100.0
+    else:
+        pos = 50.0
+    return {"range_low": low, "range_high": high, "range_pos_pct": pos}
+
+
+def range_position(prices: np.ndarray, current_price: float = None) -> dict:
+    window = prices[-RANGE_WINDOW:]
+    return range_state(float(window.min()), float(window.max()), current_price)
+
+
+def _accel(recent: float, prev: float) -> float:
+    if prev:
+        return (recent - prev) / prev * 100.0
+    return 100.0 if recent > 0 else 0.0
+
+
+def acceleration(arr: np.ndarray, window: float = ACCEL_WINDOW) -> dict:
+    """
+    Buy/sell volume in the last `window` seconds vs the one before. Dates
+    are sorted, so each window is a contiguous slice found by searchsorted.
+    """
+    dates = arr["date"]
+    now = dates[-1]
+    prev_start, mid = np.searchsorted(dates, (now - 2 * window, now - window), side="left")
+    signed = arr["amount"] * arr["is_buy"]   # buy volume per trade, 0 for sells
+
+    recent_b = float(signed[mid:].sum())
+    recent_s = float(arr["amount"][mid:].sum()) - recent_b
+    prev_b = float(signed[prev_start:mid].sum())
+    prev_s = float(arr["amount"][prev_start:mid].sum()) - prev_b
+    return {
+        "recent_b_vol": recent_b, "recent_s_vol": recent_s,
+        "prev_b_vol": prev_b, "prev_s_vol": prev_s,
+        "buy_accel": _accel(recent_b, prev_b),
+        "sell_accel": _accel(recent_s, prev_s),
+    }
+
+
+def analyze_trades(arr: np.ndarray, seconds_ahead: float, current_price: float = None, state=None) -> dict:
+    """
+    Every trade-derived statistic `!analyze` reports, from a chronological
+    TRADE_DTYPE array. `current_price` defaults to the last trade. With an
+    incremental `state` (indicators.PairIndicators) covering the same
+    trades, momentum, trend, volatility and range are read from it instead
+    of recomputed.
+    """
+    if not len(arr):
+        raise ValueError("No trades to analyze")
+    prices = arr["price"]
+    if current_price is None:
+        current_price = float(prices[-1])
+
+    stats = {"n_trades": len(arr), "current_price": current_price}
+    stats.update(order_flow(arr))
+    if state is not None:
+        stats.update(state.values(seconds_ahead, current_price))
+    else:
+        stats.update(momentum(arr, seconds_ahead, current_price))
+        stats.update(trend(prices))
+        stats["volatility_pct"] = volatility_pct(prices)
+        stats.update(range_position(prices, current_price))
+    stats.update(acceleration(arr))
+    return stats
+
+
+if __name__ == "__main__":
+    # Benchmark: python market_analysis.py
+    import time
+
+    def synthetic(n: int, seed: int = 1) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        arr = np.empty(n, TRADE_DTYPE)
+        arr["date"] = 1.7e9 + np.cumsum(rng.exponential(0.5, n))
+        arr["price"] = 1e9 * np.exp(np.cumsum(rng.normal(0, 2e-4, n)))
+        arr["amount"] = rng.exponential(0.01, n)
+        arr["is_buy"] = rng.random(n) < 0.5
+        return arr
+
+    # Cross-check against the straightforward formulas
+    arr = synthetic(5000)
+    s = analyze_trades(arr, 3600)
+    buy = arr["is_buy"]
+    assert np.isclose(s["buy_vol"], arr["amount"][buy].sum())
+    slope, _ = np.polyfit(arr["date"] - arr["date"][0], arr["price"], 1)
+    assert np.isclose(s["slope"], slope)
+    recent = arr["date"] >= arr["date"][-1] - ACCEL_WINDOW
+    assert np.isclose(s["recent_b_vol"], arr["amount"][recent & buy].sum())
+
+    for n in (500, 50_000, 1_000_000):
+        arr = synthetic(n)
+        reps = max(3, 200_000 // n)
+        started = time.perf_counter()
+        for _ in range(reps):
+            analyze_trades(arr, 3600)
+        per_call = (time.perf_counter() - started) / reps * 1000
+
+        line = f"{n:>9,} trades: analyze {per_call:8.3f} ms/call"
+        if n <= 50_000:
+            trades = [{"date": d, "price": p, "amount": a, "type": "buy" if b else "sell"}
+                      for d, p, a, b in arr.tolist()][::-1]
+            started = time.perf_counter()
+            parse_trades(trades)
+            line += f" · parse {(time.perf_counter() - started) * 1000:8.3f} ms"
+        print(line)
+    print("market_analysis self-check passed")
@@ -0,0 +1,184 @@
+import numpy as np
+
+from market_analysis import SMA_SHORT, SMA_LONG, RANGE_WINDOW
+
+SCAN_TRADES = SMA_LONG   # most recent trades per pair; the SMA200 needs all of them
+MIN_SCAN_TRADES = 20     # pairs with fewer recorded trades are not ranked
+HIGH_VOLATILITY = 5.0    # % std/mean; same threshold that costs !analyze confidence
+SCAN_MAX_AGE = 15 * 60   # seconds; older tapes are refreshed (or left out) before a scan
+
+
+def load_matrix(pairs: list, tape, count: int = SCAN_TRADES) -> dict:
+    """
+    The last `count` trades of every pair as (pairs x count) arrays, right
+    aligned so column -1 is each pair's newest trade. Missing slots are NaN
+    (False in `is_buy`) and `valid` marks the real ones.
+    """
+    shape = (len(pairs), count)
+    m = {
+        "date": np.full(shape, np.nan),
+        "price": np.full(shape, np.nan),
+        "amount": np.full(shape, np.nan),
+        "is_buy": np.zeros(shape, bool),
+    }
+    for row, pair in enumerate(pairs):
+        cols = tape.tail(pair, count)
+        if cols is None:
+            continue
+        n = len(cols["date"])
+        for name in m:
+            m[name][row, count - n:] = cols[name]
+    m["valid"] = ~np.isnan(m["price"])
+    return m
+
+
+def score_pairs(m: dict, last: np.ndarray) -> dict:
+    """
+    !analyze's trade signals for every row of `m` at once: order flow,
+    average trade size, momentum (least-squares slope), SMA crossover,
+    range position and volatility. `last` holds each pair's ticker price
+    (NaN falls back to the newest trade). News and order books are not
+    part of a scan.
+    """
+    valid, is_buy = m["valid"], m["is_buy"]
+    price, amount = m["price"], np.where(valid, m["amount"], 0.0)
+    n = valid.sum(axis=1)
+    safe_n = np.maximum(n, 1)
+    newest = price[:, -1]
+    last = np.where(np.isnan(last), newest, last)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Order flow
+        buys = is_buy & valid
+        buy_count = buys.sum(axis=1)
+        sell_count = n - buy_count
+        buy_vol = (amount * buys).sum(axis=1)
+        sell_vol = amount.sum(axis=1) - buy_vol
+        flow_ratio = buy_count / np.where(sell_count > 0, sell_count, 1e-12)
+        avg_buy = np.where(buy_count > 0, buy_vol / np.maximum(buy_count, 1), 0.0)
+        avg_sell = np.where(sell_count > 0, sell_vol / np.maximum(sell_count, 1), 0.0)
+
+        # Momentum: per-row least squares over the valid slots
+        dates = np.where(valid, m["date"], 0.0)
+        t = dates - dates[np.arange(len(n)), -n.clip(1)][:, None]   # seconds from each pair's oldest trade
+        t_mean = np.where(valid, t, 0.0).sum(axis=1, keepdims=True) / safe_n[:, None]
+        p_mean = np.where(valid, price, 0.0).sum(axis=1, keepdims=True) / safe_n[:, None]
+        dt = np.where(valid, t - t_mean, 0.0)
+        dp = np.where(valid, price - p_mean, 0.0)
+        var_t = (dt * dt).sum(axis=1)
+        slope = np.where(var_t > 0, (dt * dp).sum(axis=1) / np.where(var_t > 0, var_t, 1.0), 0.0)
+        pct_per_hour = slope * 3600.0 / last * 100.0
+
+        # Trend, range and volatility
+        short_valid = valid[:, -SMA_SHORT:]
+        sma_short = (np.where(short_valid, price[:, -SMA_SHORT:], 0.0).sum(axis=1)
+                     / np.maximum(short_valid.sum(axis=1), 1))
+        sma_long = p_mean[:, 0]
+        recent, recent_valid = price[:, -RANGE_WINDOW:], valid[:, -RANGE_WINDOW:]
+        rng_low = np.where(recent_valid, recent, np.inf).min(axis=1)
+        rng_high = np.where(recent_valid, recent, -np.inf).max(axis=1)
+        span = rng_high - rng_low
+        range_pos = np.where(span > 0, (last - rng_low) / np.where(span > 0, span, 1.0) * 100.0, 50.0)
+        volatility = np.sqrt((dp * dp).sum(axis=1) / safe_n) / p_mean[:, 0] * 100.0
+
+    # Same thresholds as !analyze, one ±1 vote per signal
+    score = (
+        (flow_ratio > 1.1).astype(int) - (flow_ratio < 0.9).astype(int)
+        + (avg_buy > avg_sell * 1.1).astype(int) - (avg_buy * 1.1 < avg_sell).astype(int)
+        + (pct_per_hour > 1.0).astype(int) - (pct_per_hour < -1.0).astype(int)
+        + np.where(sma_short >= sma_long, 1, -1)
+        + (range_pos <= 30.0).astype(int) - (range_pos >= 70.0).astype(int)
+    )
+    return {
+        "score": score, "trades": n, "last": last,
+        "flow_ratio": flow_ratio, "pct_per_hour": pct_per_hour,
+        "sma_short": sma_short, "sma_long": sma_long,
+        "range_pos_pct": range_pos, "volatility_pct": volatility,
+    }
+
+
+def rank(signals: dict, k: int, weakest: bool = False) -> np.ndarray:
+    """
+    Row indices of the k strongest (or weakest) pairs, best first. Score
+    decides; momentum breaks ties and high volatility costs half a point.
+    Selection is O(pairs) via argpartition; only the k winners are sorted.
+    """
+    key = (
+        signals["score"]
+        + 0.1 * np.tanh(np.nan_to_num(signals["pct_per_hour"]))
+        - 0.5 * (signals["volatility_pct"] >= HIGH_VOLATILITY)
+    ).astype(float)
+    if weakest:
+        key = -key
+    key[signals["trades"] < MIN_SCAN_TRADES] = -np.inf
+    key = np.nan_to_num(key, nan=-np.inf)
+
+    eligible = int(np.isfinite(key).sum())
+    k = min(k, eligible)
+    if k <= 0:
+        return np.array([], dtype=int)
+    top = np.argpartition(-key, k - 1)[:k]
+    return top[np.argsort(-key[top], kind="stable")]
+
+
+def last_prices(pairs: list, snapshot) -> np.ndarray:
+    return np.array([snapshot.get_last(p, refresh=False) or np.nan for p in pairs], dtype=float)
+
+
+def top_pairs(m: dict, last: np.ndarray, k: int = 10, weakest: bool = False) -> list:
+    """[(row, signals)] for the top-k rows; plain Python values, so cheap to return from a worker."""
+    signals = score_pairs(m, last)
+    return [
+        (int(i), {name: values[i].item() for name, values in signals.items()})
+        for i in rank(signals, k, weakest)
+    ]
+
+
+def scan(pairs: list, tape, snapshot, k: int = 10, weakest: bool = False) -> list:
+    """Top-k pairs by !analyze-style score from the local tape and ticker snapshot."""
+    m = load_matrix(pairs, tape)
+    return [{"pair": pairs[i], **signals} for i, signals in top_pairs(m, last_prices(pairs, snapshot), k, weakest)]
+
+
+if __name__ == "__main__":
+    # Benchmark: python market_scanner.py
+    import tempfile
+    import time
+
+    from trade_tape import TradeTape
+
+    class Snap:
+        def get_last(self, pair, refresh=True):
+            return None
+
+    rng = np.random.default_rng(5)
+    for n_pairs in (100, 1000):
+        with tempfile.TemporaryDirectory() as root:
+            tape = TradeTape(root)
+            pairs = [f"c{i}_idr" for i in range(n_pairs)]
+            for i, pair in enumerate(pairs):
+                count = int(rng.integers(0, 400))
+                drift = rng.normal(0, 5e-4)
+                prices = 1e6 * np.exp(np.cumsum(rng.normal(drift, 2e-3, count)))
+                tape.append(pair, [
+                    {"tid": j + 1, "date": 1.7e9 + j * 5, "price": p, "amount": 1.0,
+                     "type": "buy" if rng.random() < 0.5 else "sell"}
+                    for j, p in enumerate(prices)
+                ])
+
+            started = time.perf_counter()
+            top = scan(pairs, tape, Snap(), k=10)
+            elapsed = (time.perf_counter() - started) * 1000
+            m = load_matrix(pairs, tape)
+            started = time.perf_counter()
+            rank(score_pairs(m, np.full(n_pairs, np.nan)), 10)
+            scoring = (time.perf_counter() - started) * 1000
+
+            # The vectorized slope matches a per-pair polyfit
+            best = top[0]["pair"]
+            cols = tape.tail(best, SCAN_TRADES)
+            slope, _ = np.polyfit(cols["date"] - cols["date"][0], cols["price"], 1)
+            assert np.isclose(top[0]["pct_per_hour"], slope * 3600 / cols["price"][-1] * 100)
+            print(f"{n_pairs:>5} pairs: scan {elapsed:7.1f} ms (scoring + top-k {scoring:.1f} ms) · "
+                  f"best {best} score {top[0]['score']}")
+    print("market_scanner self-check passed")
@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+import requests
+
+from alert_storage import get_pairs
+
+SUMMARIES_URL = "https://indodax.com/api/summaries"
+REFRESH_INTERVAL = 10   # seconds between full refreshes
+MAX_STALENESS = 60      # older than this, callers fall back to a direct fetch
+
+
+class MarketSnapshot:
+    """
+    In-process copy of every Indodax ticker, filled by one /api/summaries call.
+    Readers never block on the network unless the snapshot is missing or stale.
+    """
+
+    def __init__(self, refresh_interval: float = REFRESH_INTERVAL, max_staleness: float = MAX_STALENESS):
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.tickers = {}        # "btc_idr" -> ticker dict
+        self.updated_at = 0.0    # epoch seconds of the last successful full load
+        self.pair_updated = {}   # "btc_idr" -> epoch seconds of its last load or streamed tick
+        self._compact = {}       # "btcidr" -> "btc_idr"
+        self._pairs_json = None  # same mapping from pairs.json, loaded on demand
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Fetch all tickers in a single request and swap them in."""
+        resp = requests.get(SUMMARIES_URL, timeout=10)
+        resp.raise_for_status()
+        self.load(resp.json())
+
+    def load(self, data: dict):
+        tickers = {p.lower(): t for p, t in data.get("tickers", {}).items()}
+        # Swap whole dicts so readers never see a half-built snapshot
+        now = time.time()
+        self._compact = {p.replace("_", ""): p for p in tickers}
+        self.tickers = tickers
+        self.pair_updated = {**self.pair_updated, **dict.fromkeys(tickers, now)}
+        self.updated_at = now
+
+    def apply_ticks(self, ticks: list) -> list:
+        """
+        Merge streamed (pair, fields) updates into the snapshot. Pairs may be
+        compact ("btcidr"); unknown pairs are skipped. Returns the updated
+        (pair, ticker) entries.
+        """
+        tickers = dict(self.tickers)
+        applied = []
+        for pair, fields in ticks:
+            compact = pair.lower().replace("_", "")
+            # Fall back to pairs.json names before the first REST load arrives
+            key = self._compact.get(compact) or self._known_pairs().get(compact)
+            if key is None:
+                continue
+            ticker = {**tickers.get(key, {}), **fields}
+            tickers[key] = ticker
+            applied.append((key, ticker))
+        if applied:
+            # Only the pairs that ticked are fresher; a pair the stream stops
+            # covering keeps aging and falls back to a REST fetch
+            now = time.time()
+            self.tickers = tickers
+            self.pair_updated = {**self.pair_updated, **{key: now for key, _ in applied}}
+        return applied
+
+    def _known_pairs(self) -> dict:
+        if self._pairs_json is None:
+            self._pairs_json = {p.lower().replace("_", ""): p.lower() for p in get_pairs()}
+        return self._pairs_json
+
+    def _key(self, pair: str) -> str:
+        key = pair.lower()
+        return self._compact.get(key.replace("_", ""), key)
+
+    def updated(self, pair: str) -> float:
+        """Epoch seconds `pair` was last loaded or streamed (0.0 if never)."""
+        return self.pair_updated.get(self._key(pair), 0.0)
+
+    def age(self, pair: str = None) -> float:
+        """
+        Seconds since `pair` was last updated, or since the last full refresh
+        if no pair is given (inf if never loaded).
+        """
+        updated_at = self.updated_at if pair is None else self.updated(pair)
+        if not updated_at:
+            return math.inf
+        return time.time() - updated_at
+
+    def ensure_fresh(self, pair: str = None):
+        if self.age(pair) < self.refresh_interval:
+            return
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if self.age(pair) < self.refresh_interval:
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[Snapshot] Refresh failed: {e}")
+
+    def get_ticker(self, pair: str, max_age: float = None, refresh: bool = True) -> dict:
+        """
+        Return the cached ticker for `pair` ("btc_idr" or "btcidr"),
+        or None if the pair is unknown or its entry is older than `max_age`.
+        Async callers pass refresh=False so a stale snapshot never blocks the loop.
+        """
+        if refresh:
+            self.ensure_fresh(pair)
+        if self.age(pair) > (self.max_staleness if max_age is None else max_age):
+            return None
+        return self.tickers.get(self._key(pair))
+
+    def get_last(self, pair: str, max_age: float = None, refresh: bool = True) -> float:
+        ticker = self.get_ticker(pair, max_age, refresh)
+        if not ticker or "last" not in ticker:
+            return None
+        return float(ticker["last"])
+
+
+snapshot = MarketSnapshot()
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import random
+import time
+import aiohttp
+from dotenv import load_dotenv
+
+from indodax_api import get_session, close_session
+from market_snapshot import snapshot
+
+load_dotenv()
+
+WS_URL = os.getenv("INDODAX_WS_URL", "wss://ws3.indodax.com/ws/")
+WS_TOKEN = os.getenv("INDODAX_WS_TOKEN", "")
+SUMMARY_CHANNEL = "market:summary-24h"
+TRADE_CHANNEL = "market:trade-activity-{}"   # formatted with a compact pair, e.g. btcidr
+
+BACKOFF_START = 1.0
+BACKOFF_MAX = 60.0
+LIVE_FOR = 30   # seconds without a frame before the stream counts as down
+
+
+class MarketStream:
+    """
+    Streams Indodax's public WebSocket ticker and trade channels into the
+    shared market snapshot, reconnecting with jittered exponential backoff.
+
+    Listeners registered with `on_price` are called as (pair, price, ts) for
+    every streamed price, and `wait_update` lets pollers wake early.
+    Passing `record_path` appends every raw frame to a JSONL file that
+    ws_replay_server.py can serve back for offline tests and benchmarks.
+    """
+
+    def __init__(self, url: str = WS_URL, token: str = WS_TOKEN, trade_pairs=(), record_path: str = None):
+        self.url = url
+        self.token = token
+        self.trade_pairs = {p.lower() for p in trade_pairs}
+        self.record_path = record_path
+        self._changed = asyncio.Event()
+        self.last_frame = 0.0   # when a ticker/trade frame last updated the snapshot
+        self.frames = 0
+        self.reconnects = 0
+        self._listeners = []
+        self._ws = None
+        self._msg_id = 0
+
+    def on_price(self, callback):
+        self._listeners.append(callback)
+
+    def is_live(self) -> bool:
+        return time.time() - self.last_frame < LIVE_FOR
+
+    async def wait_update(self, timeout: float) -> bool:
+        """Wait for the next streamed price or `timeout`; True if one arrived."""
+        event = self._changed
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self):
+        """Connect forever; never raises except on cancellation."""
+        backoff = BACKOFF_START
+        while True:
+            started = time.monotonic()
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Stream] Disconnected: {e}")
+            self._ws = None
+            self.reconnects += 1
+
+            # A connection that stayed up for a while resets the backoff
+            if time.monotonic() - started > LIVE_FOR:
+                backoff = BACKOFF_START
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+            backoff = min(backoff * 2, BACKOFF_MAX)
+
+    async def _send(self, payload: dict):
+        self._msg_id += 1
+        payload["id"] = self._msg_id
+        await self._ws.send_json(payload)
+
+    async def subscribe_trades(self, pair: str):
+        """Start streaming trades for `pair` (takes effect now if connected)."""
+        pair = pair.lower()
+        if pair in self.trade_pairs:
+            return
+        self.trade_pairs.add(pair)
+        if self._ws is not None:
+            await self._send({"method": 1, "params": {"channel": TRADE_CHANNEL.format(pair.replace("_", ""))}})
+
+    async def _session(self):
+        async with get_session().ws_connect(self.url, heartbeat=20) as ws:
+            self._ws = ws
+            await self._send({"params": {"token": self.token}})
+            await self._send({"method": 1, "params": {"channel": SUMMARY_CHANNEL}})
+            for pair in self.trade_pairs:
+                await self._send({"method": 1, "params": {"channel": TRADE_CHANNEL.format(pair.replace("_", ""))}})
+            print(f"[Stream] Connected to {self.url}")
+
+            record = open(self.record_path, "a") if self.record_path else None
+            try:
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        if msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSED):
+                            break
+                        continue
+                    if record:
+                        record.write(json.dumps({"t": time.time(), "frame": msg.data}) + "\n")
+                    await self.handle_frame(msg.data)
+            finally:
+                if record:
+                    record.close()
+
+    async def handle_frame(self, raw: str):
+        self.frames += 1
+        # Several JSON replies may arrive newline-separated in one frame
+        for line in raw.splitlines():
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if data == {}:
+                # Server ping: answer with an empty object
+                if self._ws is not None:
+                    await self._ws.send_str("{}")
+                continue
+            push = data.get("result", {})
+            channel = push.get("channel")
+            rows = push.get("data", {}).get("data")
+            if not channel or not rows:
+                continue
+            if channel == SUMMARY_CHANNEL:
+                self._apply_summary(rows)
+            elif channel.startswith("market:trade-activity-"):
+                self._apply_trades(rows)
+
+    def _apply_summary(self, rows: list):
+        # Row: [pair, ts, last, low, high, price_24h_ago, vol_idr, vol_coin]
+        ticks = []
+        for row in rows:
+            pair, ts, last, low, high = row[0], row[1], row[2], row[3], row[4]
+            ticks.append((pair, {"last": str(last), "low": str(low), "high": str(high), "server_time": ts}))
+        self._publish(snapshot.apply_ticks(ticks))
+
+    def _apply_trades(self, rows: list):
+        # Row: [pair, ts, seq, side, price, idr_volume, coin_volume]
+        ticks = [(row[0], {"last": str(row[4]), "server_time": row[1]}) for row in rows]
+        self._publish(snapshot.apply_ticks(ticks))
+
+    def _publish(self, applied: list):
+        if not applied:
+            return
+        # Only prices count as liveness: pings, acks and errors alone must not
+        # keep snapshot_refresher from falling back to REST
+        self.last_frame = time.time()
+        for pair, ticker in applied:
+            price, ts = float(ticker["last"]), ticker.get("server_time")
+            for callback in self._listeners:
+                try:
+                    callback(pair, price, ts)
+                except Exception as e:
+                    print(f"[Stream] Listener failed for {pair}: {e}")
+        # Swap in a fresh event so every current waiter wakes exactly once
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+if __name__ == "__main__":
+    # Offline benchmark against ws_replay_server.py, e.g.
+    #   python ws_replay_server.py frames.jsonl --speed 0
+    #   python market_stream.py ws://127.0.0.1:8765/ws 10
+    import sys
+
+    async def bench(url: str, seconds: float):
+        stream = MarketStream(url=url)
+        ticks = 0
+
+        def count(pair, price, ts):
+            nonlocal ticks
+            ticks += 1
+
+        stream.on_price(count)
+        task = asyncio.ensure_future(stream.run())
+        await asyncio.sleep(seconds)
+        task.cancel()
+        await close_session()
+        print(f"{stream.frames} frames, {ticks} price ticks in {seconds:.0f}s "
+              f"({stream.frames / seconds:,.0f} frames/s, {ticks / seconds:,.0f} ticks/s)")
+
+    asyncio.run(bench(sys.argv[1] if len(sys.argv) > 1 else "ws://127.0.0.1:8765/ws",
+                      float(sys.argv[2]) if len(sys.argv) > 2 else 10))
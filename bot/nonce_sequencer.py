@@ -0,0 +1,77 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+TONCE_FILE = "last_tonce.pkl"
+RESERVE_BLOCK = 60_000_000   # µs of nonces reserved per disk write (one minute)
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Stable, non-reversible id for an API key so raw keys never hit disk or metrics."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+class NonceSequencer:
+    """
+    Hands out strictly increasing TAPI nonces per API key.
+
+    Values follow the microsecond clock but never repeat or go backwards,
+    so concurrent signed calls from the same key can't collide. Instead of
+    writing every nonce, a ceiling `RESERVE_BLOCK` ahead is persisted and
+    only rewritten once it is used up; after a restart the sequence resumes
+    above that ceiling, which is always past anything already issued.
+    """
+
+    def __init__(self, path: str = TONCE_FILE, block: int = RESERVE_BLOCK):
+        self.path = path
+        self.block = block
+        self._floor = 0
+        self._last = {}        # fingerprint -> last issued nonce
+        self._reserved = {}    # fingerprint -> persisted ceiling
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"[Nonce] Could not read {self.path}: {e}")
+            return
+
+        if isinstance(data, int):
+            # Legacy single tonce: treat it as a floor for every key
+            self._floor = data
+        elif isinstance(data, dict):
+            self._floor = data.get("floor", 0)
+            self._reserved = dict(data.get("keys", {}))
+            self._last = dict(self._reserved)
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"floor": self._floor, "keys": self._reserved}, f)
+        os.replace(tmp, self.path)
+
+    def next(self, api_key: str) -> int:
+        fp = key_fingerprint(api_key)
+        with self._lock:
+            last = self._last.get(fp, self._floor)
+            value = max(last + 1, time.time_ns() // 1000)
+            self._last[fp] = value
+
+            # Only touch disk when the persisted ceiling has been used up
+            if value >= self._reserved.get(fp, 0):
+                self._reserved[fp] = value + self.block
+                try:
+                    self._save()
+                except OSError as e:
+                    print(f"[Nonce] Could not persist {self.path}: {e}")
+            return value
+
+
+nonces = NonceSequencer()
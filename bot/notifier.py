@@ -0,0 +1,133 @@
+import asyncio
+import time
+import discord
+
+COALESCE_WINDOW = 2.0    # seconds to gather more triggers for the same user
+MAX_ATTEMPTS = 5
+RETRY_BASE = 2.0         # seconds; doubled on every failed attempt
+DM_LIMIT = 2000          # Discord's message length limit
+
+
+def _chunks(lines: list) -> list:
+    """Join lines into as few messages under DM_LIMIT as possible."""
+    messages, current = [], ""
+    for line in lines:
+        line = line[:DM_LIMIT]
+        if current and len(current) + 1 + len(line) > DM_LIMIT:
+            messages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages
+
+
+def _retry_after(e: discord.HTTPException) -> float:
+    """Seconds Discord asked us to wait, from the 429 body or headers."""
+    delay = getattr(e, "retry_after", None)
+    if delay is None and getattr(e, "response", None) is not None:
+        headers = e.response.headers
+        delay = headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After")
+    try:
+        return float(delay) if delay is not None else RETRY_BASE
+    except ValueError:
+        return RETRY_BASE
+
+
+class Notifier:
+    """
+    Queue-backed DM dispatcher.
+
+    Background tasks call `notify`, which never blocks. A single worker
+    gathers triggers for COALESCE_WINDOW seconds, merges them into one DM
+    per user, resolves users through a cache instead of a REST call per
+    message, pauses on Discord 429s for as long as Discord asks, and
+    re-queues failed sends with exponential backoff.
+    """
+
+    def __init__(self, bot, window: float = COALESCE_WINDOW):
+        self.bot = bot
+        self.window = window
+        self._queue = asyncio.Queue()
+        self._users = {}
+        self._paused_until = 0.0
+        self.stats = {"queued": 0, "sent": 0, "merged": 0, "retried": 0, "dropped": 0, "rate_limited": 0}
+
+    def notify(self, user_id, text: str, attempt: int = 1):
+        self._queue.put_nowait((int(user_id), text, attempt))
+        self.stats["queued"] += 1
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def _user(self, user_id: int):
+        user = self._users.get(user_id) or self.bot.get_user(user_id)
+        if user is None:
+            user = await self.bot.fetch_user(user_id)
+        self._users[user_id] = user
+        return user
+
+    async def run(self):
+        """Worker loop; start once from on_ready."""
+        while True:
+            uid, text, attempt = await self._queue.get()
+            batch = {uid: ([text], attempt)}
+
+            # Gather everything else that arrives within the window
+            deadline = time.monotonic() + self.window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    uid, text, attempt = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                lines, prev = batch.get(uid, ([], 0))
+                if lines:
+                    self.stats["merged"] += 1
+                lines.append(text)
+                batch[uid] = (lines, max(prev, attempt))
+
+            for uid, (lines, attempt) in batch.items():
+                await self._deliver(uid, lines, attempt)
+
+    async def _deliver(self, user_id: int, lines: list, attempt: int):
+        wait = self._paused_until - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        messages = _chunks(lines)
+        delivered = 0   # chunks already sent; a retry resumes after them
+        try:
+            user = await self._user(user_id)
+            for message in messages:
+                await user.send(message)
+                delivered += 1
+            self.stats["sent"] += 1
+        except (discord.Forbidden, discord.NotFound) as e:
+            # DMs closed or unknown user: retrying will not help
+            print(f"[Notifier] Dropping DM for {user_id}: {e}")
+            self.stats["dropped"] += 1
+        except discord.HTTPException as e:
+            if e.status == 429:
+                delay = _retry_after(e)
+                self._paused_until = time.monotonic() + delay
+                self.stats["rate_limited"] += 1
+            else:
+                delay = RETRY_BASE * 2 ** (attempt - 1)
+            self._retry(user_id, messages[delivered:], attempt, delay, e)
+        except Exception as e:
+            self._retry(user_id, messages[delivered:], attempt, RETRY_BASE * 2 ** (attempt - 1), e)
+
+    def _retry(self, user_id: int, messages: list, attempt: int, delay: float, error):
+        if attempt >= MAX_ATTEMPTS:
+            print(f"[Notifier] Giving up on DM for {user_id} after {attempt} attempts: {error}")
+            self.stats["dropped"] += 1
+            return
+        self.stats["retried"] += 1
+        # Re-queue the undelivered chunks later instead of sleeping, so other
+        # users' DMs keep flowing; each stays one line, so none is truncated
+        loop = asyncio.get_running_loop()
+        for message in messages:
+            loop.call_later(delay, self.notify, user_id, message, attempt + 1)
@@ -0,0 +1,171 @@
+import time
+import numpy as np
+
+DEPTH_TTL = 5          # seconds a fetched book is reused
+WALL_RANGE_PCT = 5.0   # how far from mid to look for support / resistance walls
+
+
+def _levels(rows, descending: bool) -> np.ndarray:
+    """[[price, amount], ...] (strings or numbers) -> sorted float array of shape (n, 2)."""
+    arr = np.asarray(rows, dtype=float).reshape(-1, 2)
+    order = np.argsort(-arr[:, 0] if descending else arr[:, 0], kind="stable")
+    return arr[order]
+
+
+def _walk(prices, cum_base, cum_quote, qty: float, in_quote: bool) -> tuple:
+    """
+    Fill `qty` (base units, or quote units if `in_quote`) against one side.
+    Returns (base filled, quote filled, levels touched).
+    """
+    n = len(prices)
+    if not n or qty <= 0:
+        return 0.0, 0.0, 0
+    cum = cum_quote if in_quote else cum_base
+    k = int(np.searchsorted(cum, qty, side="left"))
+    if k >= n:
+        # Not enough depth: everything on the book
+        return float(cum_base[-1]), float(cum_quote[-1]), n
+
+    prev_base = cum_base[k - 1] if k else 0.0
+    prev_quote = cum_quote[k - 1] if k else 0.0
+    if in_quote:
+        return float(prev_base + (qty - prev_quote) / prices[k]), float(qty), k + 1
+    return float(qty), float(prev_quote + (qty - prev_base) * prices[k]), k + 1
+
+
+class OrderBook:
+    """
+    One pair's depth as sorted NumPy arrays (bids high->low, asks low->high)
+    with cumulative base and quote volume precomputed, so depth, imbalance
+    and fill simulations are searchsorted lookups rather than Python loops.
+    """
+
+    def __init__(self, pair: str, bids: np.ndarray, asks: np.ndarray, fetched_at: float = None):
+        self.pair = pair
+        self.fetched_at = fetched_at or time.time()
+        self.bid_px, self.bid_amt = bids[:, 0], bids[:, 1]
+        self.ask_px, self.ask_amt = asks[:, 0], asks[:, 1]
+        self.bid_cum = np.cumsum(self.bid_amt)
+        self.ask_cum = np.cumsum(self.ask_amt)
+        self.bid_cum_quote = np.cumsum(self.bid_px * self.bid_amt)
+        self.ask_cum_quote = np.cumsum(self.ask_px * self.ask_amt)
+
+    @classmethod
+    def from_depth(cls, pair: str, data: dict) -> "OrderBook":
+        """Build from an /api/{pair}/depth response ({"buy": [...], "sell": [...]})."""
+        return cls(pair, _levels(data.get("buy", []), True), _levels(data.get("sell", []), False))
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    @property
+    def best_bid(self) -> float:
+        return float(self.bid_px[0]) if len(self.bid_px) else None
+
+    @property
+    def best_ask(self) -> float:
+        return float(self.ask_px[0]) if len(self.ask_px) else None
+
+    @property
+    def mid(self) -> float:
+        if self.best_bid is None or self.best_ask is None:
+            return self.best_bid or self.best_ask
+        return (self.best_bid + self.best_ask) / 2
+
+    def spread_pct(self) -> float:
+        if self.best_bid is None or self.best_ask is None:
+            return None
+        return (self.best_ask - self.best_bid) / self.mid * 100.0
+
+    def cumulative_depth(self, pcts=(0.5, 1.0, 2.0, 5.0)) -> dict:
+        """Quote volume resting within each % of mid, per side, in one pass."""
+        mid = self.mid
+        pcts = np.asarray(pcts, dtype=float)
+        if not mid:
+            zeros = np.zeros_like(pcts)
+            return {"pcts": pcts, "bids": zeros, "asks": zeros}
+        # Bids are descending, so search the negated prices
+        n_bid = np.searchsorted(-self.bid_px, -mid * (1 - pcts / 100.0), side="right")
+        n_ask = np.searchsorted(self.ask_px, mid * (1 + pcts / 100.0), side="right")
+        # Prefix a zero so a count of n levels indexes the cumulative total directly
+        bids = np.concatenate(([0.0], self.bid_cum_quote))[n_bid]
+        asks = np.concatenate(([0.0], self.ask_cum_quote))[n_ask]
+        return {"pcts": pcts, "bids": bids, "asks": asks}
+
+    def imbalance(self, pct: float = 1.0) -> float:
+        """(bid - ask) / (bid + ask) quote volume within `pct`% of mid, in [-1, 1]."""
+        depth = self.cumulative_depth((pct,))
+        b, a = float(depth["bids"][0]), float(depth["asks"][0])
+        return (b - a) / (b + a) if b + a else 0.0
+
+    def fill(self, side: str, amount: float = None, idr: float = None) -> dict:
+        """
+        Simulate a market order: side "buy" walks the asks, "sell" the bids.
+        Give either a base `amount` or an `idr` (quote) budget.
+        """
+        if side == "buy":
+            px, cum, cum_q, best = self.ask_px, self.ask_cum, self.ask_cum_quote, self.best_ask
+        else:
+            px, cum, cum_q, best = self.bid_px, self.bid_cum, self.bid_cum_quote, self.best_bid
+        in_quote = idr is not None
+        wanted = idr if in_quote else amount
+        base, quote, levels = _walk(px, cum, cum_q, wanted, in_quote)
+
+        avg = quote / base if base else None
+        slippage = None
+        if avg and best:
+            # Positive = worse than the top of book for this side
+            slippage = (avg - best) / best * 100.0 if side == "buy" else (best - avg) / best * 100.0
+        filled = quote if in_quote else base
+        return {
+            "base": base,
+            "quote": quote,
+            "avg_price": avg,
+            "slippage_pct": slippage,
+            "levels": levels,
+            "complete": filled >= wanted * (1 - 1e-12),
+        }
+
+    def walls(self, pct: float = WALL_RANGE_PCT) -> tuple:
+        """(support, resistance): the largest bid and ask levels within `pct`% of mid."""
+        mid = self.mid
+        if not mid:
+            return None, None
+        n_bid = int(np.searchsorted(-self.bid_px, -mid * (1 - pct / 100.0), side="right"))
+        n_ask = int(np.searchsorted(self.ask_px, mid * (1 + pct / 100.0), side="right"))
+        support = float(self.bid_px[np.argmax(self.bid_amt[:n_bid])]) if n_bid else None
+        resistance = float(self.ask_px[np.argmax(self.ask_amt[:n_ask])]) if n_ask else None
+        return support, resistance
+
+
+class OrderBookCache:
+    """Per-pair books reused for DEPTH_TTL seconds."""
+
+    def __init__(self, ttl: float = DEPTH_TTL):
+        self.ttl = ttl
+        self._books = {}
+
+    def _cached(self, pair: str) -> OrderBook:
+        book = self._books.get(pair)
+        if book is not None and book.age() < self.ttl:
+            return book
+        return None
+
+    async def get(self, client, pair: str) -> OrderBook:
+        """Fetch through an AsyncIndodaxClient unless a fresh book is cached."""
+        book = self._cached(pair)
+        if book is None:
+            book = OrderBook.from_depth(pair, await client.get_depth(pair))
+            self._books[pair] = book
+        return book
+
+    def get_sync(self, client, pair: str) -> OrderBook:
+        """Same as `get` for the blocking IndodaxClient."""
+        book = self._cached(pair)
+        if book is None:
+            book = OrderBook.from_depth(pair, client.get_depth(pair))
+            self._books[pair] = book
+        return book
+
+
+books = OrderBookCache()
@@ -0,0 +1,249 @@
+import json
+import threading
+import time
+
+from storage import connect
+
+# Lifecycle events, appended to order_events and never rewritten
+PLACED = "placed"
+PARTIALLY_FILLED = "partially_filled"
+FILLED = "filled"
+CANCELLED = "cancelled"
+STOP_ARMED = "stop_armed"
+STOP_TRIGGERED = "stop_triggered"
+STOP_RAISED = "stop_raised"          # a trailing stop's high-water mark moved up
+
+SNAPSHOT_EVERY = 500   # events between snapshots; bounds how much recovery replays
+
+# Order status derived from the last event applied
+STATUS = {
+    PLACED: "pending",
+    PARTIALLY_FILLED: "partial",
+    FILLED: "completed",
+}
+OPEN_STATUSES = ("pending", "partial")
+
+
+def _order_key(user_id, order_id) -> str:
+    return f"{user_id}:{order_id}"
+
+
+def apply_event(state: dict, kind: str, user_id: str, ref: str, data: dict, seq: int, ts: float):
+    """Fold one event into `state` ({"orders": {...}, "stops": {...}})."""
+    orders, stops = state["orders"], state["stops"]
+
+    if kind == PLACED:
+        orders[_order_key(user_id, ref)] = {
+            "user_id": user_id,
+            "order_id": ref,
+            "pair": data["pair"],
+            "type": data.get("type", "buy"),
+            "price": data.get("price"),
+            "amount": data.get("amount"),
+            "total": data.get("total"),
+            "remain": data.get("amount"),
+            "account": data.get("account"),   # fingerprint of the key that placed it
+            "status": STATUS[PLACED],
+            "updated": ts,
+        }
+    elif kind == PARTIALLY_FILLED:
+        order = orders.get(_order_key(user_id, ref))
+        if order is not None:
+            order["status"] = STATUS[kind]
+            order["remain"] = data.get("remain", order["remain"])
+            order["updated"] = ts
+    elif kind in (FILLED, CANCELLED):
+        # Finished orders leave the hot state; their history stays in order_events
+        orders.pop(_order_key(user_id, ref), None)
+    elif kind == STOP_ARMED:
+        # The arming event's sequence number is the stop's id
+        stops[str(seq)] = {
+            "id": seq,
+            "user": int(user_id),
+            "coin": data["coin"],
+            "pair": data["pair"],
+            "stop_price": data["stop_price"],
+            "percent": data.get("percent"),
+            "trail": data.get("trail"),
+            "hwm": data.get("hwm"),
+            "direction": data.get("direction", "below"),
+            "auto": data.get("auto", False),
+            "amount": data.get("amount"),
+            "active": True,
+        }
+    elif kind == STOP_RAISED:
+        stop = stops.get(str(ref))
+        if stop is not None:
+            stop["hwm"] = data["hwm"]
+    elif kind == STOP_TRIGGERED:
+        stops.pop(str(ref), None)
+
+
+class OrderLedger:
+    """
+    Append-only record of order and stoploss lifecycle events.
+
+    Every change is one INSERT into order_events; the current state lives
+    in memory and is rebuilt at startup from the newest snapshot plus the
+    events after it. A snapshot is written every SNAPSHOT_EVERY events, so
+    recovery never replays more than that many.
+
+    Only open orders are kept in memory, indexed by user and by status, so
+    queries cost the size of the answer rather than every order ever placed.
+    """
+
+    def __init__(self):
+        self.state = None
+        self.seq = 0                # last event folded into `state`
+        self.snapshot_seq = 0       # last event covered by a stored snapshot
+        # Indexes over state["orders"]; dicts used as insertion-ordered sets
+        self._by_user = {}          # user_id -> {order key: None}
+        self._by_status = {}        # status -> {order key: None}
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self.state is None:
+            with self._lock:
+                if self.state is None:
+                    self.recover()
+
+    def recover(self) -> dict:
+        """Load the latest snapshot and replay the tail. Returns timing stats."""
+        started = time.perf_counter()
+        conn = connect()
+        self._import_tables(conn)
+
+        row = conn.execute("SELECT seq, state FROM ledger_snapshots ORDER BY seq DESC LIMIT 1").fetchone()
+        if row:
+            state, seq = json.loads(row["state"]), row["seq"]
+        else:
+            state, seq = {"orders": {}, "stops": {}}, 0
+        self.snapshot_seq = seq
+
+        replayed = 0
+        for ev in conn.execute("SELECT * FROM order_events WHERE seq > ? ORDER BY seq", (seq,)):
+            apply_event(state, ev["kind"], ev["user_id"], ev["ref"], json.loads(ev["data"]), ev["seq"], ev["ts"])
+            seq = ev["seq"]
+            replayed += 1
+
+        # Snapshots written before finished orders were dropped may still hold some
+        state["orders"] = {k: o for k, o in state["orders"].items() if o["status"] in OPEN_STATUSES}
+        self.state, self.seq = state, seq
+        self._by_user, self._by_status = {}, {}
+        for key, order in state["orders"].items():
+            self._index(key, order)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"[Ledger] Recovered {len(state['orders'])} orders, {len(state['stops'])} stops "
+              f"(snapshot @{self.snapshot_seq}, {replayed} events replayed) in {elapsed_ms:.1f} ms")
+        return {"snapshot_seq": self.snapshot_seq, "replayed": replayed, "ms": elapsed_ms}
+
+    def _import_tables(self, conn):
+        """One-shot import of the pre-ledger pending_orders / stoplosses rows as events."""
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'ledger_imported'").fetchone():
+            return
+        with conn:
+            for o in conn.execute("SELECT * FROM pending_orders ORDER BY rowid").fetchall():
+                data = {k: o[k] for k in ("pair", "type", "price", "amount", "total")}
+                self._insert(conn, PLACED, o["user_id"], o["order_id"], data)
+                if o["status"] == "completed":
+                    self._insert(conn, FILLED, o["user_id"], o["order_id"], {"remain": 0})
+            for sl in conn.execute("SELECT * FROM stoplosses WHERE active = 1 ORDER BY id").fetchall():
+                data = {k: sl[k] for k in ("coin", "pair", "stop_price", "percent")}
+                self._insert(conn, STOP_ARMED, sl["user_id"], None, data)
+            conn.execute("DELETE FROM pending_orders")
+            conn.execute("DELETE FROM stoplosses")
+            conn.execute("INSERT INTO meta (key, value) VALUES ('ledger_imported', ?)", (str(time.time()),))
+
+    @staticmethod
+    def _insert(conn, kind, user_id, ref, data) -> tuple:
+        ts = time.time()
+        cur = conn.execute(
+            "INSERT INTO order_events (ts, kind, user_id, ref, data) VALUES (?, ?, ?, ?, ?)",
+            (ts, kind, str(user_id), None if ref is None else str(ref), json.dumps(data)),
+        )
+        return cur.lastrowid, ts
+
+    def record(self, kind: str, user_id, ref=None, **data) -> int:
+        """Append one event, fold it into memory and return its sequence number."""
+        self._ensure_loaded()
+        user_id = str(user_id)
+        ref = None if ref is None else str(ref)
+        with self._lock:
+            conn = connect()
+            with conn:
+                seq, ts = self._insert(conn, kind, user_id, ref, data)
+            key = _order_key(user_id, ref)
+            before = self.state["orders"].get(key)
+            if before is not None:
+                self._unindex(key, before)
+            apply_event(self.state, kind, user_id, ref, data, seq, ts)
+            after = self.state["orders"].get(key)
+            if after is not None:
+                self._index(key, after)
+            self.seq = seq
+            if self.seq - self.snapshot_seq >= SNAPSHOT_EVERY:
+                self._snapshot(conn)
+        return seq
+
+    def _index(self, key: str, order: dict):
+        self._by_user.setdefault(order["user_id"], {})[key] = None
+        self._by_status.setdefault(order["status"], {})[key] = None
+
+    def _unindex(self, key: str, order: dict):
+        for index, value in ((self._by_user, order["user_id"]), (self._by_status, order["status"])):
+            keys = index.get(value)
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del index[value]
+
+    def _snapshot(self, conn):
+        with conn:
+            conn.execute(
+                "INSERT INTO ledger_snapshots (seq, ts, state) VALUES (?, ?, ?)",
+                (self.seq, time.time(), json.dumps(self.state)),
+            )
+            # Older snapshots are never read again; the events themselves are kept
+            conn.execute("DELETE FROM ledger_snapshots WHERE seq < ?", (self.seq,))
+        self.snapshot_seq = self.seq
+
+    # ── Queries (served from memory) ─────────────────────────────────────────
+
+    def orders(self, user_id=None, type_=None, statuses=None) -> list:
+        """Open orders, optionally for one user, of one type and/or in `statuses`."""
+        self._ensure_loaded()
+        with self._lock:
+            orders = self.state["orders"]
+            if user_id is not None:
+                keys = self._by_user.get(str(user_id), {})
+            elif statuses is not None:
+                keys = [key for status in statuses for key in self._by_status.get(status, {})]
+            else:
+                keys = orders
+            return [
+                dict(orders[key]) for key in keys
+                if (type_ is None or orders[key]["type"] == type_)
+                and (statuses is None or orders[key]["status"] in statuses)
+            ]
+
+    def order(self, user_id, order_id) -> dict:
+        self._ensure_loaded()
+        order = self.state["orders"].get(_order_key(user_id, order_id))
+        return dict(order) if order else None
+
+    def stop(self, stop_id) -> dict:
+        self._ensure_loaded()
+        stop = self.state["stops"].get(str(stop_id))
+        return dict(stop) if stop else None
+
+    def active_stops(self) -> list:
+        self._ensure_loaded()
+        return [dict(stop) for stop in self.state["stops"].values()]
+
+
+ledger = OrderLedger()
+
+
+if __name__ == "__main__":
+    # Report how long startup recovery takes against the local database
+    OrderLedger().recover()
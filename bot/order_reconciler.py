@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from indodax_api import order_remain
+from pending_storage import get_open_orders, record_fill, remove_pending_order_by_user
+from request_scheduler import POLLING
+
+RECONCILE_INTERVAL = 15   # seconds between passes
+HISTORY_DEPTH = 50        # finished orders fetched per group when some order left the book
+REMAIN_EPSILON = 1e-12
+
+
+class OrderReconciler:
+    """
+    Keeps tracked orders in step with the exchange. Open orders are grouped
+    by (user, pair, placing key) and each group costs one `openOrders` call
+    made with the key that placed them; `orderHistory` is only fetched for a
+    group when one of its orders is no longer open, to tell fills from
+    cancellations. A pass costs O(active groups) requests however many
+    orders each group holds. `unresolved` counts the orders the last pass
+    could not settle.
+    """
+
+    def __init__(self, client_for, notify):
+        self.client_for = client_for   # (user id, key fingerprint) -> AsyncIndodaxClient or None
+        self.notify = notify           # (user id, text) -> None
+        self.stats = {"passes": 0, "groups": 0, "orders": 0, "calls": 0,
+                      "fills": 0, "cancels": 0, "unresolved": 0, "last_pass_ms": 0.0}
+
+    @staticmethod
+    def groups() -> dict:
+        """{(user_id, pair, account): [order, ...]} for every open tracked order."""
+        out = {}
+        for user_id, order in get_open_orders():
+            out.setdefault((user_id, order["pair"], order["account"]), []).append(order)
+        return out
+
+    async def reconcile_group(self, user_id, pair: str, account: str, orders: list) -> int:
+        """Settle one group's orders; returns how many could not be resolved."""
+        client = self.client_for(user_id, account)
+        if client is None:
+            # The placing key was replaced or removed: nothing can see these orders
+            return len(orders)
+        self.stats["calls"] += 1
+        live = {str(o["order_id"]): o for o in await client.get_open_orders(pair, priority=POLLING)}
+
+        unresolved = 0
+        finished = {}
+        if any(str(o["order_id"]) not in live for o in orders):
+            self.stats["calls"] += 1
+            history = await client.get_order_history(pair, HISTORY_DEPTH, priority=POLLING)
+            finished = {str(o["order_id"]): o for o in history}
+
+        for order in orders:
+            oid = str(order["order_id"])
+            side = order["type"]
+            if oid in live:
+                remain = order_remain(live[oid], pair)
+                known = order["remain"] if order["remain"] is not None else float("inf")
+                if remain < known - REMAIN_EPSILON:
+                    record_fill(user_id, order["order_id"], remain)
+                    self.stats["fills"] += 1
+                    self.notify(user_id, f"🟡 Your {side} order {oid} on {pair} is partially filled "
+                                         f"({remain:g} remaining).")
+                continue
+
+            done = finished.get(oid)
+            if done is None:
+                # Older than the history window
+                unresolved += 1
+            elif done.get("status") == "cancelled":
+                # Keep any fill that happened before the cancel
+                remain = order_remain(done, pair)
+                known = order["remain"] if order["remain"] is not None else float("inf")
+                filled = ""
+                if 0 < remain < known - REMAIN_EPSILON:
+                    record_fill(user_id, order["order_id"], remain)
+                    filled = f" after a partial fill ({remain:g} left unfilled)"
+                remove_pending_order_by_user(user_id, order["order_id"])
+                self.stats["cancels"] += 1
+                self.notify(user_id, f"❌ Your {side} order {oid} on {pair} was cancelled on Indodax{filled}.")
+            else:
+                record_fill(user_id, order["order_id"], 0)
+                self.stats["fills"] += 1
+                self.notify(user_id, f"✅ Your {side} order {oid} for {order['amount']} {pair} has been filled!")
+        return unresolved
+
+    async def reconcile(self):
+        """One pass over every (user, pair) group with open orders."""
+        started = time.monotonic()
+        groups = self.groups()
+        results = await asyncio.gather(
+            *(self.reconcile_group(uid, pair, account, orders)
+              for (uid, pair, account), orders in groups.items()),
+            return_exceptions=True,
+        )
+        unresolved = 0
+        for (uid, pair, _), orders, result in zip(groups, groups.values(), results):
+            if isinstance(result, Exception):
+                print(f"[Reconcile] {uid} {pair}: {result}")
+                unresolved += len(orders)
+            else:
+                unresolved += result
+
+        self.stats["passes"] += 1
+        self.stats["groups"] = len(groups)
+        self.stats["orders"] = sum(len(orders) for orders in groups.values())
+        self.stats["unresolved"] = unresolved
+        self.stats["last_pass_ms"] = (time.monotonic() - started) * 1000
+
+    async def run(self):
+        """Background task; start once from on_ready."""
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f"[Reconcile] Pass failed: {e}")
+            await asyncio.sleep(RECONCILE_INTERVAL)
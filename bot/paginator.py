@@ -2,6 +2,7 @@ import discord
 from discord import ButtonStyle
 from discord.ui import View, button
 from datetime import datetime
+from market_snapshot import snapshot
 
 class NewsPaginator(View):
     def __init__(self, articles: list[dict]):
@@ -154,8 +155,10 @@ class PricesPaginator(discord.ui.View):
             else:
                 embed.add_field(name=symbol.upper(), value="❌ Error", inline=True)
 
+        age = snapshot.age()
+        age_text = f"Snapshot {age:.0f}s old" if age != float("inf") else "Live"
         embed.set_footer(
-            text=f"Updated in real-time from Indodax. Page {self.page + 1}/{self.total_pages}"
+            text=f"{age_text} · Indodax. Page {self.page + 1}/{self.total_pages}"
         )
 
         return embed
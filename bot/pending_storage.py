@@ -1,32 +1,83 @@
-import json
-import os
+from order_ledger import (
+    ledger, OPEN_STATUSES,
+    PLACED, PARTIALLY_FILLED, FILLED, CANCELLED, STOP_ARMED, STOP_TRIGGERED, STOP_RAISED
+)
+
+# Order lifecycle is event-sourced (see order_ledger.py): these helpers append
+# events and read the in-memory state the ledger rebuilds at startup.
+
+ORDER_FIELDS = ("order_id", "pair", "type", "price", "amount", "total", "status", "remain", "account")
+
+
+def _public(order: dict) -> dict:
+    # Orders recorded before a field existed lack it
+    return {field: order.get(field) for field in ORDER_FIELDS}
 
-PENDING_FILE = "pending_orders.json"
 
 def load_pending_orders():
-    if not os.path.exists(PENDING_FILE):
-        return {}
-    if os.path.getsize(PENDING_FILE) == 0:
-        return {}
-    with open(PENDING_FILE, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-def save_pending_orders(data):
-    with open(PENDING_FILE, "w") as f:
-        json.dump(data, f, indent=4)
-
-def add_pending_order(pair, order_data):
-    data = load_pending_orders()
-    if pair not in data:
-        data[pair] = []
-    data[pair].append(order_data)
-    save_pending_orders(data)
+    """Every tracked order as {user_id: [order, ...]}."""
+    data = {}
+    for order in ledger.orders():
+        data.setdefault(order["user_id"], []).append(_public(order))
+    return data
+
+def add_pending_order(user_id, order_data):
+    # Extra keys (e.g. auto-execution timings) are kept in the event only
+    extra = {k: v for k, v in order_data.items() if k not in ORDER_FIELDS}
+    ledger.record(
+        PLACED, user_id, order_data["order_id"],
+        pair=order_data["pair"], type=order_data.get("type", "buy"), price=order_data.get("price"),
+        amount=order_data.get("amount"), total=order_data.get("total"),
+        account=order_data.get("account"), **extra,
+    )
+
+def get_user_orders(user_id, type_=None):
+    return [_public(o) for o in ledger.orders(user_id=user_id, type_=type_)]
+
+def get_user_order(user_id, order_id, type_=None):
+    order = ledger.order(user_id, order_id)
+    if order is None or (type_ is not None and order["type"] != type_):
+        return None
+    return _public(order)
+
+def get_open_orders():
+    """[(user_id, order)] for every pending or partially filled order, grouped by pair."""
+    orders = sorted(ledger.orders(statuses=OPEN_STATUSES), key=lambda o: o["pair"])
+    return [(o["user_id"], _public(o)) for o in orders]
+
+def record_fill(user_id, order_id, remain):
+    """Record a fill seen on the exchange; `remain` 0 means fully filled."""
+    kind = FILLED if float(remain) == 0 else PARTIALLY_FILLED
+    ledger.record(kind, user_id, order_id, remain=float(remain))
 
 def remove_pending_order_by_user(user_id, order_id):
-    data = load_pending_orders()
-    user_orders = data.get(str(user_id), [])
-    data[str(user_id)] = [o for o in user_orders if str(o["order_id"]) != str(order_id)]
-    save_pending_orders(data)
+    ledger.record(CANCELLED, user_id, order_id)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Stoplosses
+
+def add_stoploss(entry):
+    """
+    Arm a stop; entries with `trail` (%) trail their high-water mark `hwm`,
+    direction "above" makes it a take-profit, and `auto` sells `amount`
+    automatically when it fires.
+    """
+    return ledger.record(
+        STOP_ARMED, entry["user"],
+        coin=entry["coin"], pair=entry["pair"], stop_price=float(entry["stop_price"]),
+        percent=entry.get("percent"), trail=entry.get("trail"), hwm=entry.get("hwm"),
+        direction=entry.get("direction", "below"), auto=bool(entry.get("auto")), amount=entry.get("amount"),
+    )
+
+def get_active_stoplosses():
+    return ledger.active_stops()
+
+def raise_stoploss(stoploss_id, hwm):
+    stop = ledger.stop(stoploss_id)
+    if stop is not None:
+        ledger.record(STOP_RAISED, stop["user"], stoploss_id, hwm=hwm)
+
+def deactivate_stoploss(stoploss_id, price=None):
+    stop = ledger.stop(stoploss_id)
+    if stop is not None:
+        ledger.record(STOP_TRIGGERED, stop["user"], stoploss_id, price=price)
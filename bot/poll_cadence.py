@@ -0,0 +1,119 @@
+import math
+import time
+
+MIN_INTERVAL = 0.5      # seconds; pairs about to cross a target (only while prices stream)
+MAX_INTERVAL = 120.0    # seconds; pairs with nothing nearby
+ERROR_INTERVAL = 15.0   # retry delay after a failed fetch
+DEFAULT_SIGMA = 2e-4    # volatility prior: fractional move per sqrt(second), ~6%/day
+SIGMA_ALPHA = 0.2       # EWMA weight of each new observation
+SAFETY = 0.25           # poll this fraction of the expected time to reach the target
+
+
+class PairState:
+    __slots__ = ("price", "seen_at", "stamp", "variance", "next_due", "interval")
+
+    def __init__(self):
+        self.price = None
+        self.seen_at = 0.0
+        self.stamp = None      # source timestamp of the last observed price
+        self.variance = DEFAULT_SIGMA ** 2
+        self.next_due = 0.0    # due immediately
+        self.interval = None
+
+
+class PollCadence:
+    """
+    Per-pair poll schedule. Each pair's next poll is set from how far its
+    price is from the nearest trigger, measured in units of its recent
+    volatility: for a random walk the expected time to move a fraction d
+    is (d / sigma)^2, and the pair is polled at SAFETY times that,
+    clamped to [floor, ceiling]. The floor is MIN_INTERVAL only when
+    prices arrive that fast; callers reading a periodically refreshed
+    snapshot pass its refresh interval instead. The ceiling is MAX_INTERVAL
+    for prices that cost a network fetch; a price read from memory saves
+    nothing by waiting, so callers cap it at the snapshot refresh interval.
+    """
+
+    def __init__(self):
+        self._pairs = {}
+
+    def _state(self, pair: str) -> PairState:
+        state = self._pairs.get(pair)
+        if state is None:
+            state = self._pairs[pair] = PairState()
+        return state
+
+    def observe(self, pair: str, price: float, now: float = None, stamp: float = None):
+        """
+        Feed a price; updates the pair's volatility estimate. `stamp` is when
+        the source last changed (e.g. the snapshot's update time): re-reading
+        the same price from the same snapshot is ignored, since counting it
+        as a fresh zero return would pull sigma toward 0.
+        """
+        now = time.monotonic() if now is None else now
+        state = self._state(pair)
+        if stamp is not None and stamp == state.stamp and price == state.price:
+            return
+        state.stamp = stamp
+        if state.price and price > 0:
+            dt = now - state.seen_at
+            if dt > 0:
+                r = math.log(price / state.price)
+                state.variance = SIGMA_ALPHA * (r * r / dt) + (1 - SIGMA_ALPHA) * state.variance
+        state.price, state.seen_at = price, now
+
+    def sigma(self, pair: str) -> float:
+        return math.sqrt(self._state(pair).variance)
+
+    def interval_for(self, pair: str, price: float, target: float, floor: float = MIN_INTERVAL,
+                     ceiling: float = MAX_INTERVAL) -> float:
+        if target is None or not price:
+            return ceiling
+        distance = abs(target - price) / price
+        expected = (distance / max(self.sigma(pair), 1e-9)) ** 2
+        return min(ceiling, max(floor, SAFETY * expected))
+
+    def reschedule(self, pair: str, price: float, target: float, now: float = None,
+                   floor: float = MIN_INTERVAL, ceiling: float = MAX_INTERVAL) -> float:
+        """Set the next poll from the nearest `target` (None: nothing to watch)."""
+        now = time.monotonic() if now is None else now
+        state = self._state(pair)
+        state.interval = self.interval_for(pair, price, target, floor, ceiling)
+        state.next_due = now + state.interval
+        return state.interval
+
+    def backoff(self, pair: str, now: float = None):
+        now = time.monotonic() if now is None else now
+        self._state(pair).next_due = now + ERROR_INTERVAL
+
+    def mark_due(self, pair: str):
+        """Poll `pair` on the next cycle (e.g. a streamed price just arrived)."""
+        if pair in self._pairs:
+            self._pairs[pair].next_due = 0.0
+
+    def due(self, pairs, now: float = None) -> list:
+        now = time.monotonic() if now is None else now
+        return [p for p in pairs if self._state(p).next_due <= now]
+
+    def next_wake(self, pairs, now: float = None) -> float:
+        """Seconds until the earliest of `pairs` is due."""
+        now = time.monotonic() if now is None else now
+        dues = [self._state(p).next_due for p in pairs]
+        return max(0.0, min(dues) - now) if dues else MAX_INTERVAL
+
+    def forget(self, keep):
+        """Drop state for pairs no longer watched."""
+        keep = set(keep)
+        for pair in [p for p in self._pairs if p not in keep]:
+            del self._pairs[pair]
+
+    def stats(self) -> dict:
+        intervals = [s.interval for s in self._pairs.values() if s.interval is not None]
+        return {
+            "pairs": len(self._pairs),
+            "fastest": min(intervals) if intervals else None,
+            "slowest": max(intervals) if intervals else None,
+        }
+
+
+cadence = PollCadence()
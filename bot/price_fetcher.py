@@ -1,6 +1,12 @@
 import requests
+from market_snapshot import snapshot
 
 def get_last_price(pair: str) -> float:
+    # Served from the shared summaries snapshot whenever it is fresh enough
+    cached = snapshot.get_last(pair)
+    if cached is not None:
+        return cached
+
     pair = pair.lower().replace("_", "")  
 
     url = f"https://indodax.com/api/ticker/{pair}"
@@ -1,75 +1,81 @@
 from indodax_api import IndodaxClient
+from order_book import books
+from trade_tape import tape
 
 def calculate_buy_quota(pair: str) -> float:
     """
-    Returns how much of the base coin you can buy with your entire IDR balance.
+    Returns how much of the base coin you can buy with your entire IDR balance,
+    walking the ask side of the order book so slippage is included.
     e.g. calculate_buy_quota('btc_idr')
     """
     client = IndodaxClient()
-    ticker = client.get_ticker(pair)
-
-    if not ticker or "ticker" not in ticker:
-        raise RuntimeError(f"No ticker data for {pair}: {ticker}")
-
-    data = ticker["ticker"]
-    buy_str = data.get("buy")
-    if buy_str is None:
-        raise RuntimeError(f"Missing buy price for {pair}: {data}")
+    pair = pair.lower()
 
     try:
-        buy_price = float(buy_str)
-    except ValueError:
-        raise RuntimeError(f"Could not parse buy price '{buy_str}' for {pair}")
+        book = books.get_sync(client, pair)
+    except Exception as e:
+        raise RuntimeError(f"No order book for {pair}: {e}")
+    if book.best_ask is None:
+        raise RuntimeError(f"No asks on the {pair} order book")
 
     available_idr = client.get_balance("idr")
     if available_idr <= 0:
         raise RuntimeError("No IDR balance available to buy.")
 
-    return available_idr / buy_price
+    fill = book.fill("buy", idr=available_idr)
+    if not fill["complete"]:
+        raise RuntimeError(
+            f"Order book too thin: only {fill['quote']:,.0f} of {available_idr:,.0f} IDR fills on {pair}"
+        )
+    return fill["base"]
 
 
 def calculate_sell_quota(pair: str) -> float:
     """
-    Returns how much IDR you would receive by selling your entire coin balance.
+    Returns how much IDR you would receive by selling your entire coin balance,
+    walking the bid side of the order book so slippage is included.
     """
     client = IndodaxClient()
     pair = pair.lower()
     symbol = pair.split("_")[0]
 
-    # 1) Fetch ticker
-    ticker = client.get_ticker(pair)
-    if not ticker or "ticker" not in ticker:
-        raise RuntimeError(f"No ticker data for {pair}: {ticker}")
-
-    # 2) Parse sell price
-    sell_str = ticker["ticker"].get("sell")
-    if sell_str is None:
-        raise RuntimeError(f"Missing sell price for {pair}: {ticker}")
+    # 1) Fetch the order book
     try:
-        sell_price = float(sell_str)
-    except ValueError:
-        raise RuntimeError(f"Could not parse sell price '{sell_str}' for {pair}")
-    if sell_price <= 0:
-        raise RuntimeError(f"Non-positive sell price for {pair}: {sell_price}")
+        book = books.get_sync(client, pair)
+    except Exception as e:
+        raise RuntimeError(f"No order book for {pair}: {e}")
+    if book.best_bid is None:
+        raise RuntimeError(f"No bids on the {pair} order book")
 
-    # 3) Fetch your coin balance and compute IDR you’d get
+    # 2) Fetch your coin balance
     available_coin = client.get_balance(symbol)
     if available_coin <= 0:
         raise RuntimeError(f"No {symbol.upper()} balance available to sell.")
 
-    return available_coin * sell_price
+    # 3) Walk the bids with the whole balance
+    fill = book.fill("sell", amount=available_coin)
+    if not fill["complete"]:
+        raise RuntimeError(
+            f"Order book too thin: only {fill['base']:.8f} of {available_coin:.8f} {symbol.upper()} fills on {pair}"
+        )
+    return fill["quote"]
 
 
 
 def count_market_activity(pair: str, limit: int = 10) -> tuple:
     """
     Returns (buy_count, sell_count) for the last `limit` trades of `pair`.
+    Only trades newer than the local trade tape are downloaded.
     """
     client = IndodaxClient()
-    trades = client.get_trades(pair, limit)
+    tape.append(pair, client.get_trades_since(pair, tape.last_tid(pair)))
+
+    cols = tape.tail(pair, limit)
+    if cols is None:
+        return 0, 0
 
-    buy_count = sum(1 for t in trades if t.get("type", "").lower() == "buy")
-    sell_count = sum(1 for t in trades if t.get("type", "").lower() == "sell")
+    buy_count = int(cols["is_buy"].sum())
+    sell_count = len(cols["is_buy"]) - buy_count
 
     return buy_count, sell_count
 
@@ -0,0 +1,170 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from dotenv import load_dotenv
+
+# Priority lanes: a lower value is always served first
+CRITICAL = 0      # order placement and cancellation
+ACCOUNT = 1       # balances, trade history, reconciliation
+INTERACTIVE = 2   # user-facing market display
+POLLING = 3       # background alert / price polling
+
+LANE_NAMES = {
+    CRITICAL: "critical",
+    ACCOUNT: "account",
+    INTERACTIVE: "interactive",
+    POLLING: "polling",
+}
+
+PUBLIC_BUCKET = "public"
+
+# Requests per second and burst size; override in .env if Indodax changes limits.
+# This module is imported before bot.py loads .env, so load it here first.
+load_dotenv()
+PUBLIC_RATE = float(os.getenv("INDODAX_PUBLIC_RPS", 3))
+PUBLIC_BURST = int(os.getenv("INDODAX_PUBLIC_BURST", 10))
+PRIVATE_RATE = float(os.getenv("INDODAX_PRIVATE_RPS", 3))
+PRIVATE_BURST = int(os.getenv("INDODAX_PRIVATE_BURST", 6))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until the next whole token is available."""
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+class LaneMetrics:
+    def __init__(self):
+        self.waiting = 0
+        self.served = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, waited: float):
+        self.served += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+
+class RequestScheduler:
+    """
+    Central admission control for Indodax traffic.
+
+    One token bucket guards the public API and one each private API key.
+    When a bucket is empty, callers queue in a heap ordered by
+    (priority, arrival), so order placement and cancellation always jump
+    ahead of display and polling traffic waiting on the same bucket.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._waiters = {}    # bucket name -> heap of (priority, seq, future)
+        self._drainers = {}   # bucket name -> task releasing queued callers
+        self._tagged = {}     # tag -> (bucket name, future, priority) of a queued caller
+        self._seq = itertools.count()
+        self.lanes = {lane: LaneMetrics() for lane in LANE_NAMES}
+
+    def _bucket(self, name: str) -> TokenBucket:
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            if name == PUBLIC_BUCKET:
+                bucket = TokenBucket(PUBLIC_RATE, PUBLIC_BURST)
+            else:
+                bucket = TokenBucket(PRIVATE_RATE, PRIVATE_BURST)
+            self._buckets[name] = bucket
+        return bucket
+
+    async def acquire(self, bucket_name: str, priority: int = INTERACTIVE, tag=None):
+        """
+        Wait until `bucket_name` admits one request at `priority`. A caller
+        queued with a `tag` can be moved to a more urgent lane by `promote`.
+        """
+        bucket = self._bucket(bucket_name)
+        heap = self._waiters.setdefault(bucket_name, [])
+        lane = self.lanes[priority]
+
+        bucket.refill()
+        if not heap and bucket.tokens >= 1:
+            bucket.tokens -= 1
+            lane.record(0.0)
+            return
+
+        start = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(heap, (priority, next(self._seq), fut))
+        if tag is not None:
+            self._tagged[tag] = (bucket_name, fut, priority)
+        lane.waiting += 1
+        drainer = self._drainers.get(bucket_name)
+        if drainer is None or drainer.done():
+            self._drainers[bucket_name] = asyncio.ensure_future(self._drain(bucket_name))
+        try:
+            # Cancelling the caller cancels `fut`; the drainer then skips it
+            await fut
+        finally:
+            lane.waiting -= 1
+            if tag is not None:
+                self._tagged.pop(tag, None)
+        lane.record(time.monotonic() - start)
+
+    def promote(self, tag, priority: int):
+        """Re-queue the caller waiting under `tag` at `priority` if that is more urgent."""
+        entry = self._tagged.get(tag)
+        if entry is None or entry[2] <= priority:
+            return
+        bucket_name, fut, _ = entry
+        # The old heap entry stays behind; the drainer skips it once `fut` is resolved
+        heapq.heappush(self._waiters[bucket_name], (priority, next(self._seq), fut))
+        self._tagged[tag] = (bucket_name, fut, priority)
+
+    async def _drain(self, bucket_name: str):
+        bucket = self._buckets[bucket_name]
+        heap = self._waiters[bucket_name]
+        while heap:
+            if heap[0][2].done():
+                # Cancelled, or served through a promoted entry: drop it without waiting for a token
+                heapq.heappop(heap)
+                continue
+            bucket.refill()
+            if bucket.tokens < 1:
+                await asyncio.sleep(bucket.wait_time())
+                continue
+            _, _, fut = heapq.heappop(heap)
+            bucket.tokens -= 1
+            fut.set_result(None)
+
+    def stats(self) -> dict:
+        lanes = {}
+        for lane, m in self.lanes.items():
+            lanes[LANE_NAMES[lane]] = {
+                "queued": m.waiting,
+                "served": m.served,
+                "avg_wait_ms": m.total_wait / m.served * 1000 if m.served else 0.0,
+                "max_wait_ms": m.max_wait * 1000,
+            }
+        buckets = {}
+        for name, bucket in self._buckets.items():
+            bucket.refill()
+            # Private buckets are named by key fingerprint, never the raw key
+            buckets[name] = {
+                # Promoted callers have two entries and resolved ones linger: count callers
+                "queued": len({fut for _, _, fut in self._waiters.get(name, []) if not fut.done()}),
+                "tokens": bucket.tokens,
+            }
+        return {"lanes": lanes, "buckets": buckets}
+
+
+scheduler = RequestScheduler()
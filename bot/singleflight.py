@@ -0,0 +1,73 @@
+import asyncio
+from collections import Counter
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one in-flight fetch.
+
+    The first caller starts the fetch as a task; everyone who asks for the
+    same key before it finishes awaits that task instead of making their own
+    request. Results are shared between callers, so treat them as read-only.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._urgency = {}         # key -> most urgent (lowest) priority among its callers
+        self.calls = Counter()     # endpoint -> callers
+        self.fetches = Counter()   # endpoint -> upstream requests actually made
+        self.shared = Counter()    # endpoint -> callers served by another caller's fetch
+
+    async def do(self, key: tuple, fn, priority: int = None):
+        """
+        Run `fn()` for `key` unless an identical call is already in flight.
+        Callers that pass `priority` are tracked so the fetch can read the
+        most urgent one through `urgency(key)`.
+        """
+        endpoint = key[0]
+        self.calls[endpoint] += 1
+        if priority is not None:
+            self._urgency[key] = min(priority, self._urgency.get(key, priority))
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.fetches[endpoint] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._forget(key))
+        else:
+            self.shared[endpoint] += 1
+
+        # Shield so one caller timing out doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: tuple):
+        self._inflight.pop(key, None)
+        self._urgency.pop(key, None)
+
+    def urgency(self, key: tuple, default: int = None) -> int:
+        """Lowest priority passed by any caller of the in-flight `key`."""
+        return self._urgency.get(key, default)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> dict:
+        """Per-endpoint caller / fetch / deduplicated counts plus totals."""
+        endpoints = {
+            ep: {
+                "calls": self.calls[ep],
+                "fetches": self.fetches[ep],
+                "deduplicated": self.shared[ep],
+            }
+            for ep in self.calls
+        }
+        total_calls = sum(self.calls.values())
+        total_shared = sum(self.shared.values())
+        return {
+            "calls": total_calls,
+            "fetches": sum(self.fetches.values()),
+            "deduplicated": total_shared,
+            "saved_pct": total_shared / total_calls * 100.0 if total_calls else 0.0,
+            "endpoints": endpoints,
+        }
@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import threading
+
+DB_FILE = "ifrit.db"
+
+# JSON files the bot used before SQLite; imported once by migrate_json()
+LEGACY_ALERTS = "alerts.json"
+LEGACY_PENDING = "pending_orders.json"
+LEGACY_CREDENTIALS = "user_credentials.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    id        INTEGER PRIMARY KEY,
+    user_id   TEXT NOT NULL,
+    pair      TEXT NOT NULL,
+    target    REAL NOT NULL,
+    percent   REAL,
+    direction TEXT NOT NULL DEFAULT 'above'
+);
+CREATE INDEX IF NOT EXISTS alerts_user ON alerts (user_id);
+CREATE INDEX IF NOT EXISTS alerts_pair ON alerts (pair);
+
+-- pending_orders and stoplosses only stage rows from the legacy JSON files;
+-- order_ledger imports them into order_events once and empties them
+CREATE TABLE IF NOT EXISTS pending_orders (
+    user_id  TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    pair     TEXT NOT NULL,
+    type     TEXT NOT NULL DEFAULT 'buy',
+    price    REAL,
+    amount   REAL,
+    total    REAL,
+    status   TEXT NOT NULL DEFAULT 'pending',
+    PRIMARY KEY (user_id, order_id)
+);
+CREATE INDEX IF NOT EXISTS pending_orders_order ON pending_orders (order_id);
+CREATE INDEX IF NOT EXISTS pending_orders_status ON pending_orders (status, pair);
+
+CREATE TABLE IF NOT EXISTS stoplosses (
+    id         INTEGER PRIMARY KEY,
+    user_id    TEXT NOT NULL,
+    coin       TEXT NOT NULL,
+    pair       TEXT NOT NULL,
+    stop_price REAL NOT NULL,
+    percent    REAL,
+    active     INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS stoplosses_user ON stoplosses (user_id);
+CREATE INDEX IF NOT EXISTS stoplosses_active ON stoplosses (active, pair);
+
+CREATE TABLE IF NOT EXISTS order_events (
+    seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts      REAL NOT NULL,
+    kind    TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    ref     TEXT,
+    data    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ledger_snapshots (
+    seq   INTEGER PRIMARY KEY,
+    ts    REAL NOT NULL,
+    state TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS credentials (
+    user_id    TEXT PRIMARY KEY,
+    api_key    TEXT NOT NULL,
+    api_secret TEXT NOT NULL
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def connect() -> sqlite3.Connection:
+    """
+    This thread's connection to the bot database. Commands run on the event
+    loop thread and background work in asyncio.to_thread, so each thread
+    keeps its own connection; WAL lets readers proceed during a write.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _ensure_schema(conn)
+    return conn
+
+
+def _ensure_schema(conn: sqlite3.Connection):
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        conn.executescript(SCHEMA)
+        migrate_json(conn)
+        _initialized = True
+
+
+def _read_json(path: str):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return {}
+    with open(path, "r") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            print(f"[Storage] Skipping unreadable {path}")
+            return {}
+
+
+def migrate_json(conn: sqlite3.Connection = None) -> dict:
+    """
+    Import the legacy JSON files into SQLite once. The JSON files are left
+    in place untouched; a marker in `meta` stops them being imported again.
+    Returns the number of rows imported per table.
+    """
+    conn = conn or connect()
+    done = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+    if done:
+        return {}
+
+    counts = {"alerts": 0, "pending_orders": 0, "stoplosses": 0, "credentials": 0}
+    with conn:
+        for uid, user_alerts in _read_json(LEGACY_ALERTS).items():
+            for a in user_alerts:
+                conn.execute(
+                    "INSERT INTO alerts (user_id, pair, target, percent, direction) VALUES (?, ?, ?, ?, ?)",
+                    (str(uid), a["pair"], float(a["target"]), a.get("percent"), a.get("direction", "above")),
+                )
+                counts["alerts"] += 1
+
+        for key, entries in _read_json(LEGACY_PENDING).items():
+            if key == "stoploss":
+                for sl in entries:
+                    conn.execute(
+                        "INSERT INTO stoplosses (user_id, coin, pair, stop_price, percent, active) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (str(sl["user"]), sl["coin"], sl["pair"], float(sl["stop_price"]),
+                         sl.get("percent"), int(bool(sl.get("active", True)))),
+                    )
+                    counts["stoplosses"] += 1
+                continue
+            for o in entries:
+                conn.execute(
+                    "INSERT OR REPLACE INTO pending_orders "
+                    "(user_id, order_id, pair, type, price, amount, total, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (str(key), str(o["order_id"]), o["pair"], o.get("type", "buy"), o.get("price"),
+                     o.get("amount"), o.get("total"), o.get("status", "pending")),
+                )
+                counts["pending_orders"] += 1
+
+        for uid, c in _read_json(LEGACY_CREDENTIALS).items():
+            # The shipped file is a template with placeholder keys; only real Discord ids are imported
+            if not str(uid).isdigit():
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO credentials (user_id, api_key, api_secret) VALUES (?, ?, ?)",
+                (str(uid), c["api_key"], c["api_secret"]),
+            )
+            counts["credentials"] += 1
+
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (json.dumps(counts),))
+
+    if any(counts.values()):
+        print(f"[Storage] Imported legacy JSON: {counts}")
+    return counts
+
+
+if __name__ == "__main__":
+    # Create the database and import the JSON files without starting the bot
+    connect()
+    print(connect().execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()[0])
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# The bot's modules import each other as top-level modules from bot/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Point storage at an empty database in a temp dir (cwd too, for the legacy JSON files)."""
+    import storage
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "DB_FILE", str(tmp_path / "test.db"))
+    monkeypatch.setattr(storage, "_initialized", False)
+    monkeypatch.setattr(storage._local, "conn", None, raising=False)
+    yield tmp_path
+    conn = getattr(storage._local, "conn", None)
+    if conn is not None:
+        conn.close()
+        storage._local.conn = None
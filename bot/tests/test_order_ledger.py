@@ -0,0 +1,126 @@
+import json
+
+import order_ledger
+import storage
+from order_ledger import (
+    OrderLedger, apply_event,
+    PLACED, PARTIALLY_FILLED, FILLED, CANCELLED, STOP_ARMED, STOP_RAISED, STOP_TRIGGERED,
+)
+
+
+def full_replay() -> dict:
+    """The state every stored event folds into, with no snapshot involved."""
+    state = {"orders": {}, "stops": {}}
+    for ev in storage.connect().execute("SELECT * FROM order_events ORDER BY seq"):
+        apply_event(state, ev["kind"], ev["user_id"], ev["ref"], json.loads(ev["data"]), ev["seq"], ev["ts"])
+    return state
+
+
+def place(ledger, user, order_id, type_="buy"):
+    ledger.record(PLACED, user, order_id, pair="btc_idr", type=type_, price=100.0, amount=2.0, total=200.0)
+
+
+def test_recovery_from_snapshot_and_tail_matches_full_replay(fresh_db, monkeypatch):
+    monkeypatch.setattr(order_ledger, "SNAPSHOT_EVERY", 9)
+    ledger = OrderLedger()
+    for i in range(6):
+        place(ledger, 1 + i % 2, f"o{i}", "buy" if i % 3 else "sell")
+    ledger.record(PARTIALLY_FILLED, 1, "o2", remain=0.5)
+    ledger.record(FILLED, 2, "o1", remain=0)
+    stop = ledger.record(STOP_ARMED, 1, coin="BTC", pair="btc_idr", stop_price=90.0, trail=5.0, hwm=95.0)
+    assert ledger.snapshot_seq == ledger.seq   # the 9th event forced a snapshot
+
+    # Tail events after the snapshot, including ones touching snapshotted state
+    ledger.record(STOP_RAISED, 1, stop, hwm=120.0)
+    ledger.record(CANCELLED, 1, "o4")
+    place(ledger, 3, "o6")
+    gone = ledger.record(STOP_ARMED, 3, coin="ETH", pair="eth_idr", stop_price=10.0)
+    ledger.record(STOP_TRIGGERED, 3, gone)
+
+    restarted = OrderLedger()
+    stats = restarted.recover()
+    assert stats["snapshot_seq"] == ledger.snapshot_seq
+    assert stats["replayed"] == 5
+    assert restarted.state == full_replay() == ledger.state
+    assert restarted.stop(stop)["hwm"] == 120.0
+    assert restarted.stop(gone) is None
+
+
+def test_finished_orders_leave_state_and_indexes(fresh_db):
+    ledger = OrderLedger()
+    for i in range(4):
+        place(ledger, 1, f"o{i}", "buy" if i % 2 else "sell")
+    place(ledger, 2, "p0")
+    ledger.record(PARTIALLY_FILLED, 1, "o1", remain=1.0)
+    ledger.record(FILLED, 1, "o2", remain=0)
+    ledger.record(CANCELLED, 2, "p0")
+
+    def ids(orders):
+        return sorted(o["order_id"] for o in orders)
+
+    assert ids(ledger.orders(user_id=1)) == ["o0", "o1", "o3"]
+    assert ids(ledger.orders(user_id=2)) == []
+    assert ids(ledger.orders(user_id=1, type_="buy")) == ["o1", "o3"]
+    assert ids(ledger.orders(statuses=("partial",))) == ["o1"]
+    assert ids(ledger.orders(statuses=("pending",))) == ["o0", "o3"]
+    assert ledger.order(1, "o2") is None
+    assert ledger.order(1, "o1")["remain"] == 1.0
+
+    # The same answers after rebuilding the indexes on recovery
+    restarted = OrderLedger()
+    restarted.recover()
+    assert ids(restarted.orders(user_id=1, type_="buy")) == ["o1", "o3"]
+    assert ids(restarted.orders(statuses=("partial",))) == ["o1"]
+
+
+def test_recovery_prunes_finished_orders_from_old_snapshots(fresh_db):
+    ledger = OrderLedger()
+    place(ledger, 1, "open")
+    place(ledger, 1, "done")
+    # A snapshot written before finished orders were dropped from the state
+    state = json.loads(json.dumps(ledger.state))
+    state["orders"]["1:done"]["status"] = "completed"
+    conn = storage.connect()
+    with conn:
+        conn.execute("INSERT INTO ledger_snapshots (seq, ts, state) VALUES (?, 0, ?)",
+                     (ledger.seq, json.dumps(state)))
+
+    restarted = OrderLedger()
+    restarted.recover()
+    assert [o["order_id"] for o in restarted.orders(user_id=1)] == ["open"]
+    assert restarted.orders(statuses=("completed",)) == []
+
+
+def test_legacy_json_is_migrated_once_into_the_ledger(fresh_db):
+    (fresh_db / storage.LEGACY_ALERTS).write_text(json.dumps({
+        "7": [{"pair": "btc_idr", "target": 100.0, "direction": "below"},
+              {"pair": "eth_idr", "target": 5.0, "percent": 2.0}],
+    }))
+    (fresh_db / storage.LEGACY_PENDING).write_text(json.dumps({
+        "7": [{"order_id": 11, "pair": "btc_idr", "type": "buy", "price": 90.0, "amount": 1.0, "total": 90.0},
+              {"order_id": 12, "pair": "btc_idr", "type": "sell", "price": 99.0, "amount": 1.0,
+               "total": 99.0, "status": "completed"}],
+        "stoploss": [{"user": 7, "coin": "BTC", "pair": "btc_idr", "stop_price": 80.0, "percent": 5.0},
+                     {"user": 7, "coin": "ETH", "pair": "eth_idr", "stop_price": 4.0, "active": False}],
+    }))
+    (fresh_db / storage.LEGACY_CREDENTIALS).write_text(json.dumps({
+        "YOUR_DISCORD_ID": {"api_key": "key", "api_secret": "secret"},
+        "7": {"api_key": "k7", "api_secret": "s7"},
+    }))
+
+    conn = storage.connect()
+    counts = json.loads(conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()[0])
+    assert counts == {"alerts": 2, "pending_orders": 2, "stoplosses": 2, "credentials": 1}
+    assert conn.execute("SELECT user_id FROM credentials").fetchall()[0]["user_id"] == "7"
+    assert storage.migrate_json(conn) == {}
+
+    ledger = OrderLedger()
+    ledger.recover()
+    assert [o["order_id"] for o in ledger.orders(user_id=7)] == ["11"]
+    assert [(s["coin"], s["stop_price"]) for s in ledger.active_stops()] == [("BTC", 80.0)]
+    # The staging tables are emptied, so a restart does not import them again
+    assert conn.execute("SELECT COUNT(*) FROM pending_orders").fetchone()[0] == 0
+    restarted = OrderLedger()
+    restarted.recover()
+    assert restarted.state == ledger.state
+    assert conn.execute("SELECT COUNT(*) FROM order_events").fetchone()[0] == 4
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import request_scheduler
+from request_scheduler import RequestScheduler, PUBLIC_BUCKET, CRITICAL, ACCOUNT, INTERACTIVE, POLLING
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock that only moves when the scheduler sleeps, and a one-token public bucket."""
+    clock = SimpleNamespace(now=1000.0)
+    real_sleep = asyncio.sleep
+
+    async def sleep(seconds):
+        clock.now += seconds
+        await real_sleep(0)
+
+    monkeypatch.setattr(request_scheduler, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    monkeypatch.setattr(request_scheduler, "asyncio", SimpleNamespace(
+        get_running_loop=asyncio.get_running_loop, ensure_future=asyncio.ensure_future, sleep=sleep,
+    ))
+    monkeypatch.setattr(request_scheduler, "PUBLIC_RATE", 1.0)
+    monkeypatch.setattr(request_scheduler, "PUBLIC_BURST", 1)
+    return clock
+
+
+async def queue_behind_empty_bucket(scheduler, callers):
+    """Spend the only token, then queue `callers` ([(name, priority, tag)]) in order; returns grant order."""
+    granted = []
+
+    async def caller(name, priority, tag):
+        await scheduler.acquire(PUBLIC_BUCKET, priority, tag)
+        granted.append(name)
+
+    await scheduler.acquire(PUBLIC_BUCKET, POLLING)
+    tasks = {name: asyncio.ensure_future(caller(name, priority, tag)) for name, priority, tag in callers}
+    await asyncio.sleep(0)   # every caller is queued before the drainer first runs
+    return granted, tasks
+
+
+def test_lanes_are_granted_by_priority_not_arrival(clock):
+    async def main():
+        scheduler = RequestScheduler()
+        granted, tasks = await queue_behind_empty_bucket(scheduler, [
+            ("polling", POLLING, None), ("interactive", INTERACTIVE, None),
+            ("account", ACCOUNT, None), ("critical", CRITICAL, None), ("polling2", POLLING, None),
+        ])
+        await asyncio.gather(*tasks.values())
+        return scheduler, granted
+
+    started = clock.now
+    scheduler, granted = asyncio.run(main())
+    assert granted == ["critical", "account", "interactive", "polling", "polling2"]
+    assert clock.now - started == pytest.approx(5.0)   # one token per second, none wasted
+    assert scheduler.stats()["lanes"]["polling"]["served"] == 3
+
+
+def test_promoted_caller_jumps_ahead_once(clock):
+    async def main():
+        scheduler = RequestScheduler()
+        granted, tasks = await queue_behind_empty_bucket(scheduler, [
+            ("shared", POLLING, "btc_idr"), ("interactive", INTERACTIVE, None),
+        ])
+        scheduler.promote("btc_idr", CRITICAL)
+        scheduler.promote("btc_idr", ACCOUNT)   # less urgent than its lane now: ignored
+        assert scheduler.stats()["buckets"][PUBLIC_BUCKET]["queued"] == 2
+        await asyncio.gather(*tasks.values())
+        return scheduler, granted
+
+    started = clock.now
+    scheduler, granted = asyncio.run(main())
+    assert granted == ["shared", "interactive"]
+    # The stale POLLING entry was skipped without spending a token
+    assert clock.now - started == pytest.approx(2.0)
+    assert scheduler._waiters[PUBLIC_BUCKET] == []
+    assert scheduler._tagged == {}
+
+
+def test_cancelled_waiter_is_skipped(clock):
+    async def main():
+        scheduler = RequestScheduler()
+        granted, tasks = await queue_behind_empty_bucket(scheduler, [
+            ("account", ACCOUNT, None), ("polling", POLLING, None),
+        ])
+        tasks["account"].cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return scheduler, granted, tasks
+
+    started = clock.now
+    scheduler, granted, tasks = asyncio.run(main())
+    assert granted == ["polling"]
+    assert tasks["account"].cancelled()
+    assert clock.now - started == pytest.approx(1.0)
+    assert scheduler.stats()["lanes"]["account"] == {"queued": 0, "served": 0, "avg_wait_ms": 0.0, "max_wait_ms": 0.0}
@@ -0,0 +1,119 @@
+import pytest
+
+import pending_storage
+from alert_index import ABOVE
+from order_ledger import OrderLedger
+from trigger_engine import TriggerEngine, TrailingBook, ALERT, STOP, TRAILING, TAKE_PROFIT
+
+
+def stop(id, stop_price, user=1, pair="btc_idr", **extra):
+    return {"id": id, "user": user, "pair": pair, "coin": "BTC", "stop_price": stop_price, **extra}
+
+
+def fired(events):
+    return [(kind, item["id"]) for kind, _, item in events]
+
+
+def test_fixed_stop_fires_once_at_or_below_its_price():
+    e = TriggerEngine()
+    e.load_stops([stop(1, 90.0), stop(2, 80.0)])
+
+    assert e.on_price("btc_idr", 95.0) == []
+    assert fired(e.on_price("btc_idr", 90.0)) == [(STOP, 1)]
+    assert e.on_price("btc_idr", 89.0) == []
+    assert fired(e.on_price("btc_idr", 10.0)) == [(STOP, 2)]
+    assert e.pairs() == []
+
+
+def test_take_profit_fires_at_or_above_its_price():
+    e = TriggerEngine()
+    e.load_stops([stop(1, 120.0, direction=ABOVE)])
+
+    assert e.on_price("btc_idr", 119.9) == []
+    events = e.on_price("btc_idr", 120.0)
+    assert fired(events) == [(TAKE_PROFIT, 1)]
+    assert events[0][1] == "1"
+    assert e.on_price("btc_idr", 130.0) == []
+
+
+def test_alerts_and_stops_share_a_price_update():
+    e = TriggerEngine()
+    e.load_alerts({"7": [{"id": 3, "pair": "btc_idr", "target": 80.0, "direction": "below"}]})
+    e.load_stops([stop(1, 85.0)])
+
+    assert sorted(fired(e.on_price("btc_idr", 79.0))) == [(ALERT, 3), (STOP, 1)]
+
+
+def test_trailing_stop_follows_new_highs():
+    e = TriggerEngine()
+    e.load_stops([stop(1, 95.0, trail=5.0, hwm=100.0)])
+
+    assert e.nearest("btc_idr", 100.0) == pytest.approx(95.0)
+    assert e.on_price("btc_idr", 120.0) == []
+    # The mark rose to 120, so the stop is now 5% under it
+    assert e.nearest("btc_idr", 120.0) == pytest.approx(114.0)
+    assert e.on_price("btc_idr", 114.5) == []
+    assert e.on_price("btc_idr", 110.0) != []
+
+
+def test_trailing_stop_fires_on_pullback_from_mark():
+    e = TriggerEngine()
+    e.load_stops([stop(1, 95.0, trail=5.0, hwm=100.0), stop(2, 90.0, user=2, trail=5.0, hwm=90.0)])
+
+    assert e.on_price("btc_idr", 104.0) == []
+    # Both marks merged at 104; one pullback fires both
+    assert sorted(fired(e.on_price("btc_idr", 98.0))) == [(TRAILING, 1), (TRAILING, 2)]
+    assert e.pairs() == []
+
+
+def test_raised_marks_reports_each_raise_once():
+    e = TriggerEngine()
+    e.load_stops([stop(1, 95.0, trail=5.0, hwm=100.0)])
+
+    assert e.raised_marks() == []
+    e.on_price("btc_idr", 99.0)
+    assert e.raised_marks() == []
+    e.on_price("btc_idr", 108.0)
+    assert [(s["id"], hwm) for s, hwm in e.raised_marks()] == [(1, 108.0)]
+    assert e.raised_marks() == []
+    e.on_price("btc_idr", 110.0)
+    assert [(s["id"], hwm) for s, hwm in e.raised_marks()] == [(1, 110.0)]
+
+
+def test_trailing_book_lifts_only_lower_marks():
+    book = TrailingBook(10.0)
+    book.add({"id": 1}, 200.0)
+    book.add({"id": 2}, 100.0)
+
+    assert book.on_price(185.0) == []
+    assert sorted((s["id"], hwm) for s, hwm in book.marks()) == [(1, 200.0), (2, 185.0)]
+    assert [s["id"] for s in book.on_price(170.0)] == [1]
+    assert book.highest_stop() == pytest.approx(166.5)
+
+
+def test_stops_reload_from_the_ledger(fresh_db, monkeypatch):
+    monkeypatch.setattr(pending_storage, "ledger", OrderLedger())
+    fixed = pending_storage.add_stoploss({"user": 1, "coin": "BTC", "pair": "btc_idr", "stop_price": 90.0})
+    trailing = pending_storage.add_stoploss({"user": 2, "coin": "BTC", "pair": "btc_idr", "stop_price": 95.0,
+                                             "trail": 5.0, "hwm": 100.0})
+    target = pending_storage.add_stoploss({"user": 3, "coin": "BTC", "pair": "btc_idr", "stop_price": 130.0,
+                                           "direction": ABOVE, "auto": True, "amount": 0.5})
+
+    e = TriggerEngine()
+    e.load_stops(pending_storage.get_active_stoplosses())
+    e.on_price("btc_idr", 120.0)
+    for s, hwm in e.raised_marks():
+        pending_storage.raise_stoploss(s["id"], hwm)
+    pending_storage.deactivate_stoploss(fixed, 89.0)
+
+    # A restart rebuilds the state from the stored events
+    monkeypatch.setattr(pending_storage, "ledger", OrderLedger())
+    e = TriggerEngine()
+    e.load_stops(pending_storage.get_active_stoplosses())
+
+    assert e.auto_users() == {"3"}
+    assert e.stats() == {"alerts": 0, "stops": 1, "trailing": 1}
+    # The raised mark survived: the trailing stop sits 5% under 120, not 100
+    assert e.nearest("btc_idr", 115.0) == pytest.approx(114.0)
+    assert fired(e.on_price("btc_idr", 113.0)) == [(TRAILING, trailing)]
+    assert fired(e.on_price("btc_idr", 131.0)) == [(TAKE_PROFIT, target)]
@@ -0,0 +1,174 @@
+import os
+import re
+import threading
+import time
+import numpy as np
+
+TAPE_DIR = "tape"
+RECORD_INTERVAL = 20        # seconds between polls of each active pair
+ACTIVE_TTL = 6 * 3600       # a pair stays recorded this long after its last use
+FRESH_FOR = 3 * RECORD_INTERVAL
+PAIR_NAME = re.compile(r"^[a-z0-9]+_[a-z]+$")   # pair names double as directory names
+
+# One file per column, so each can be memory-mapped as a flat NumPy array
+COLUMNS = {
+    "tid": np.dtype("<i8"),
+    "date": np.dtype("<f8"),
+    "price": np.dtype("<f8"),
+    "amount": np.dtype("<f8"),
+    "is_buy": np.dtype("u1"),
+}
+
+
+class TradeTape:
+    """
+    Append-only local record of public trades, stored per pair as
+    tape/<pair>/<column>.bin. Trades are deduplicated by trade id and
+    appended in id order, so every column is sorted by time and windows
+    can be sliced with searchsorted on the date column.
+    """
+
+    def __init__(self, root: str = TAPE_DIR):
+        self.root = root
+        self._last_tid = {}    # pair -> newest recorded trade id
+        self._active = {}      # pair -> last time a command or alert used it
+        self._polled = {}      # pair -> last time the recorder appended to it
+        self._listeners = []   # fn(pair, trades, after_tid) called for every append
+        self._lock = threading.Lock()   # one writer at a time keeps the id dedupe exact
+
+    def _path(self, pair: str, column: str) -> str:
+        if not PAIR_NAME.match(pair):
+            raise ValueError(f"Invalid pair name {pair!r}")
+        return os.path.join(self.root, pair, f"{column}.bin")
+
+    def _length(self, pair: str) -> int:
+        """Rows common to every column (a crash can leave one column longer)."""
+        sizes = []
+        for col, dtype in COLUMNS.items():
+            path = self._path(pair, col)
+            sizes.append(os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0)
+        return min(sizes)
+
+    def _open(self, pair: str):
+        """Load the tail of a pair's tape, repairing a torn append if needed."""
+        if pair in self._last_tid:
+            return
+        os.makedirs(os.path.dirname(self._path(pair, "tid")), exist_ok=True)
+        n = self._length(pair)
+        for col, dtype in COLUMNS.items():
+            path = self._path(pair, col)
+            if os.path.exists(path) and os.path.getsize(path) != n * dtype.itemsize:
+                with open(path, "r+b") as f:
+                    f.truncate(n * dtype.itemsize)
+        self._last_tid[pair] = int(self.load(pair)["tid"][-1]) if n else 0
+
+    def last_tid(self, pair: str) -> int:
+        self._open(pair)
+        return self._last_tid[pair]
+
+    def subscribe(self, fn):
+        """
+        Call `fn(pair, trades, after_tid)` with the trades of every append, in
+        id order, where `after_tid` is the newest id recorded before them.
+        Listeners run under the write lock, in the appending thread.
+        """
+        self._listeners.append(fn)
+
+    def append(self, pair: str, trades: list) -> int:
+        """Append trades newer than the last recorded id; returns rows written."""
+        with self._lock:
+            last = self.last_tid(pair)
+            self._polled[pair] = time.time()
+            new = [t for t in trades if int(t["tid"]) > last]
+            if not new:
+                return 0
+            new.sort(key=lambda t: int(t["tid"]))
+
+            cols = {
+                "tid": np.fromiter((int(t["tid"]) for t in new), COLUMNS["tid"], len(new)),
+                "date": np.fromiter((float(t["date"]) for t in new), COLUMNS["date"], len(new)),
+                "price": np.fromiter((float(t["price"]) for t in new), COLUMNS["price"], len(new)),
+                "amount": np.fromiter((float(t["amount"]) for t in new), COLUMNS["amount"], len(new)),
+                "is_buy": np.fromiter((t["type"] == "buy" for t in new), COLUMNS["is_buy"], len(new)),
+            }
+            for col, arr in cols.items():
+                with open(self._path(pair, col), "ab") as f:
+                    f.write(arr.tobytes())
+
+            self._last_tid[pair] = int(cols["tid"][-1])
+            for fn in self._listeners:
+                fn(pair, new, last)
+            return len(new)
+
+    def load(self, pair: str, since: float = None) -> dict:
+        """
+        Memory-map a pair's columns, optionally from `since` (epoch seconds).
+        Returns None if nothing has been recorded for the pair.
+        """
+        n = self._length(pair)
+        if not n:
+            return None
+        cols = {
+            col: np.memmap(self._path(pair, col), dtype=dtype, mode="r", shape=(n,))
+            for col, dtype in COLUMNS.items()
+        }
+        if since is not None:
+            start = int(np.searchsorted(cols["date"], since, side="left"))
+            cols = {col: arr[start:] for col, arr in cols.items()}
+        return cols
+
+    def tail(self, pair: str, count: int) -> dict:
+        """
+        The last `count` recorded trades of a pair (oldest first). Reads just
+        the tail bytes of each column; cheaper than mapping for small counts.
+        """
+        n = self._length(pair)
+        if not n:
+            return None
+        start = max(0, n - count)
+        return {
+            col: np.fromfile(self._path(pair, col), dtype=dtype, count=n - start, offset=start * dtype.itemsize)
+            for col, dtype in COLUMNS.items()
+        }
+
+    def recent_trades(self, pair: str, count: int) -> list:
+        """The last `count` trades as API-style dicts, newest first."""
+        cols = self.tail(pair, count)
+        if cols is None:
+            return []
+        return [
+            {
+                "tid": str(int(tid)),
+                "date": str(int(date)),
+                "price": str(price),
+                "amount": str(amount),
+                "type": "buy" if is_buy else "sell",
+            }
+            for tid, date, price, amount, is_buy in zip(
+                cols["tid"][::-1], cols["date"][::-1], cols["price"][::-1],
+                cols["amount"][::-1], cols["is_buy"][::-1]
+            )
+        ]
+
+    def touch(self, pair: str):
+        """Mark a pair as in use so the recorder keeps polling it."""
+        if not PAIR_NAME.match(pair):
+            raise ValueError(f"Invalid pair name {pair!r}")
+        self._active[pair] = time.time()
+
+    def active_pairs(self) -> list:
+        cutoff = time.time() - ACTIVE_TTL
+        for pair in [p for p, ts in self._active.items() if ts < cutoff]:
+            del self._active[pair]
+        return list(self._active)
+
+    def polled_at(self, pair: str) -> float:
+        """When trades were last fetched for `pair` this run (0.0 if never)."""
+        return self._polled.get(pair, 0.0)
+
+    def is_fresh(self, pair: str) -> bool:
+        """True if the recorder has kept this pair up to date recently."""
+        return self._polled.get(pair, 0.0) >= time.time() - FRESH_FOR
+
+
+tape = TradeTape()
@@ -0,0 +1,81 @@
+"""
+Local stand-in for Indodax's public WebSocket, for offline tests and benchmarks.
+
+Replays frames recorded by MarketStream(record_path=...) to every client that
+connects, preserving the original spacing scaled by --speed (0 = as fast as
+possible). Connect and subscribe requests are acknowledged like the real
+server so MarketStream runs unmodified against it.
+
+    python ws_replay_server.py frames.jsonl --port 8765 --speed 1
+"""
+import argparse
+import asyncio
+import json
+from aiohttp import web, WSMsgType
+
+
+def load_frames(path: str) -> list:
+    """Return [(seconds since first frame, raw frame)] from a recording."""
+    frames = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                frames.append((entry["t"], entry["frame"]))
+    if not frames:
+        return []
+    start = frames[0][0]
+    return [(t - start, raw) for t, raw in frames]
+
+
+def make_app(frames: list, speed: float = 1.0, loop_forever: bool = False) -> web.Application:
+    async def handle(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async def acknowledge():
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT or msg.data == "{}":
+                    continue
+                req = json.loads(msg.data)
+                if "method" not in req:
+                    await ws.send_json({"id": req.get("id"), "result": {"client": "replay", "version": "replay"}})
+                else:
+                    await ws.send_json({"id": req.get("id"), "result": {}})
+
+        acks = asyncio.ensure_future(acknowledge())
+        try:
+            while not ws.closed:
+                previous = 0.0
+                for offset, raw in frames:
+                    if speed > 0:
+                        await asyncio.sleep((offset - previous) / speed)
+                    previous = offset
+                    if ws.closed:
+                        break
+                    await ws.send_str(raw)
+                if not loop_forever:
+                    break
+            await ws.close()
+        finally:
+            acks.cancel()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/ws", handle)
+    app.router.add_get("/ws/", handle)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded Indodax WebSocket frames.")
+    parser.add_argument("recording", help="JSONL file written by MarketStream(record_path=...)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier, 0 = no delay")
+    parser.add_argument("--loop", action="store_true", help="restart the recording when it ends")
+    args = parser.parse_args()
+
+    frames = load_frames(args.recording)
+    print(f"Replaying {len(frames)} frames on ws://{args.host}:{args.port}/ws")
+    web.run_app(make_app(frames, args.speed, args.loop), host=args.host, port=args.port)